@@ -0,0 +1,53 @@
+"""Measures the speed of the numpy render engine, in plotted samples per
+second, for a few simple flames.
+
+Run from the repository root:
+
+    python benchmarks/bench_engine.py [quality]
+"""
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fr0stlib import Flame
+from fr0stlib.engine import numpy_render
+
+SIZE = 320, 240
+
+
+def sierpinski():
+    flame = Flame()
+    for i, offset in enumerate(((0, 0), (1, 0), (0, 1))):
+        flame.add_xform(coefs=(0.5, 0, 0, 0.5) + offset, linear=1, weight=1)
+        flame.xform[-1].color = i / 2.0
+    flame.center = 0.5, 0.5
+    return flame
+
+
+def swirly():
+    flame = Flame()
+    flame.add_xform(coefs=(0.6, 0.3, -0.3, 0.6, 0.2, 0), swirl=0.7, linear=0.3)
+    flame.add_xform(coefs=(0.5, 0, 0, 0.5, -0.4, 0.3), spherical=1, color=1)
+    flame.add_xform(coefs=(-0.4, 0.2, 0.3, 0.4, 0, -0.5), julia=1, color=0.5)
+    for x in flame.xform:
+        x.weight = 1
+    flame.add_final(coefs=(1, 0, 0, 1, 0, 0), linear=1)
+    flame.xform[0].chaos[:] = 1, 2, 0
+    return flame
+
+
+def measure(label, flame, quality):
+    start = time.time()
+    numpy_render(flame, SIZE, quality, fixed_seed=True)
+    seconds = time.time() - start
+    samples = quality * SIZE[0] * SIZE[1]
+    print("%-12s %8.2f s %10.0f samples/s" % (label, seconds, samples / seconds))
+
+
+def main(quality):
+    measure("sierpinski", sierpinski(), quality)
+    measure("swirly", swirly(), quality)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
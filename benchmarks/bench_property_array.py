@@ -0,0 +1,95 @@
+"""Micro-benchmark for property_array reads, as done by the canvas on every
+mouse event. Compares against the previous implementation, which built a new
+array and callback closure on every read.
+
+Run from the repository root:
+
+    python benchmarks/bench_property_array.py
+"""
+import os, sys, timeit, numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fr0stlib import Flame
+from fr0stlib.property_array import property_array
+
+
+class _legacy_array(numpy.ndarray):
+    def __new__(cls, parent, instance, data):
+        obj = numpy.asarray(data).view(cls)
+
+        def callback():
+            parent.fset(instance, obj)
+
+        obj.callback = callback
+        return obj
+
+    def __array_finalize__(self, obj):
+        if obj is None:
+            return
+        self.callback = getattr(obj, "callback", None)
+
+    def __setitem__(self, pos, val):
+        numpy.ndarray.__setitem__(self, pos, val)
+        self.callback()
+
+
+class legacy_property_array(property):
+    def __init__(self, fget, fset=None, fdel=None, fdoc=None):
+        fget = getattr(fget, "_fget", fget)
+
+        def _fget(instance):
+            return _legacy_array(self, instance, fget(instance))
+
+        _fget._fget = fget
+        property.__init__(self, _fget, fset)
+
+
+def make_classes(prop):
+    class Coefs(object):
+        def __init__(self):
+            self.a, self.d, self.b, self.e, self.c, self.f = 1.0, 0.0, 0.0, 1.0, 0, 0
+
+        @prop
+        def coefs(self):
+            return self.a, self.d, self.b, self.e, self.c, self.f
+
+        @coefs.setter
+        def coefs(self, v):
+            self.a, self.d, self.b, self.e, self.c, self.f = v
+
+        @prop
+        def points(self):
+            return (
+                (self.a + self.c, self.d + self.f),
+                (self.b + self.c, self.e + self.f),
+                (self.c, self.f),
+            )
+
+    return Coefs()
+
+
+def bench(label, func, number=20000):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print("%-28s %8.2f us" % (label, seconds / number * 1e6))
+
+
+def main():
+    for name, prop in ("legacy", legacy_property_array), ("cached", property_array):
+        obj = make_classes(prop)
+        bench("%s coefs read" % name, lambda: obj.coefs)
+        bench("%s points read" % name, lambda: obj.points)
+        bench("%s points[0][1] read" % name, lambda: obj.points[0][1])
+
+        def write():
+            obj.coefs[4] = 0.5
+
+        bench("%s coefs[4] write" % name, write)
+
+    x = Flame().add_xform()
+    bench("Xform.points read", lambda: x.points)
+    bench("Xform.polars read", lambda: x.polars)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Measures flame serialization throughput on the sample flames.
+
+Run from the repository root:
+
+    python benchmarks/bench_serialization.py [path/to/file.flame]
+"""
+import os, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fr0stlib import load_flames
+
+
+def bench(label, func, flames, number):
+    seconds = min(
+        timeit.repeat(lambda: [func(f) for f in flames], number=number, repeat=5)
+    )
+    per_flame = seconds / (number * len(flames))
+    print(
+        "%-26s %10.1f us/flame %10.0f flames/s"
+        % (label, per_flame * 1e6, 1 / per_flame)
+    )
+
+
+def palette_cold(flame):
+    # Drop any cached output so the formatting itself is measured.
+    flame.gradient.__dict__.pop("_string_cache", None)
+    return flame.gradient.to_string()
+
+
+def main(path):
+    flames = load_flames(path)
+    print("%s: %s flames" % (path, len(flames)))
+    bench("Flame.to_string", lambda f: f.to_string(), flames, 200)
+    bench("Palette.to_string", lambda f: f.gradient.to_string(), flames, 200)
+    bench("Palette.to_string (cold)", palette_cold, flames, 200)
+    bench("Palette.to_buffer", lambda f: f.gradient.to_buffer(), flames, 200)
+    bench("Xform.to_string", lambda f: [x.to_string() for x in f.xform], flames, 200)
+    bench("Flame.to_bytes", lambda f: f.to_bytes(), flames, 200)
+    bench("Flame.copy", lambda f: f.copy(), flames, 200)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "samples/parameters/samples.flame")
@@ -0,0 +1,54 @@
+"""Measures memory use and construction time of xforms, as created by batch
+scripts generating random flames.
+
+Run from the repository root:
+
+    python benchmarks/bench_xform.py [n]
+"""
+import os, sys, random, timeit, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fr0stlib import Flame, Xform
+
+
+def make_plain(flame):
+    return Xform(
+        flame, coefs=(1.0, 0.0, 0.0, 1.0, 0.0, 0.0), linear=1, color=0, weight=1
+    )
+
+
+def make_random(flame):
+    x = Xform.random(flame, n=2)
+    flame.xform.pop()
+    return x
+
+
+def measure(label, func, n):
+    flame = Flame()
+    random.seed(0)
+    tracemalloc.start()
+    lst = [func(flame) for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del lst
+    seconds = min(timeit.repeat(lambda: func(flame), number=n // 10, repeat=5))
+    print(
+        "%-16s %8.0f bytes/xform %8.2f us/xform"
+        % (label, size / n, seconds / (n // 10) * 1e6)
+    )
+
+
+def main(n):
+    measure("Xform()", make_plain, n)
+    measure("Xform.random", make_random, n)
+    flame = Flame()
+    random.seed(0)
+    for i in range(n // 100):
+        Xform.random(flame, n=2)
+    seconds = min(timeit.repeat(flame.to_string, number=10, repeat=3)) / 10
+    print("%-16s %8.2f us/xform" % ("to_string", seconds / len(flame.xform) * 1e6))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -20,8 +20,12 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-from fr0stlib.gui import Fr0stApp
+import multiprocessing
 
 if __name__ == "__main__":
+    # Render worker processes import this module too, but don't need the gui.
+    multiprocessing.freeze_support()
+    from fr0stlib.gui import Fr0stApp
+
     app = Fr0stApp()
     app.MainLoop()
@@ -20,12 +20,15 @@
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
 import os, sys, shutil, random, itertools, ctypes, collections, re, numpy, colorsys
+import io, json, hashlib, struct
 import xml.etree.cElementTree as etree
+from xml.sax.saxutils import unescape
 from math import *
 from functools import partial
 
 from fr0stlib.pyflam3 import (
     Genome,
+    genome_cache,
     RandomContext,
     flam3_nvariations,
     variable_list,
@@ -33,9 +36,10 @@ from fr0stlib.pyflam3 import (
     variations,
     variables,
     flam3_estimate_bounding_box,
+    libflam3_loaded,
 )
 from fr0stlib.compatibility import compatibilize
-from fr0stlib.property_array import property_array
+from fr0stlib.property_array import property_array, invalidate
 
 
 VERSION = "Fr0st 1.5"
@@ -46,6 +50,49 @@ class ParsingError(Exception):
     pass
 
 
+def _format_number(val):
+    """Formats a number for xml output, writing round numbers as integers."""
+    if type(val) is float:
+        return repr(int(val)) if val.is_integer() else repr(val)
+    if type(val) is int:
+        return repr(val)
+    # Assume number: some numpy type...
+    return str(val if val % 1 else int(val))
+
+
+def _copy_value(v):
+    """Copies the mutable values found in flame and xform attributes."""
+    if type(v) is list:
+        return [_copy_value(i) for i in v]
+    if isinstance(v, numpy.ndarray):
+        return v.copy()
+    return v
+
+
+def _canonical(v):
+    """Normalizes an attribute value for fingerprinting, so that ints and
+    floats, lists and tuples, or 0.0 and -0.0 compare equal."""
+    ty = type(v)
+    if ty is float or ty is int:
+        return v + 0.0
+    if ty is str:
+        return v
+    if hasattr(v, "__iter__"):
+        return tuple(_canonical(i) for i in v)
+    try:
+        return float(v) + 0.0
+    except (TypeError, ValueError):
+        return v
+
+
+def _format_coefs(vals):
+    """Formats a coefficient sequence the same way a numpy array built from
+    it would: all integers stay as they are, anything else is a float."""
+    if all(isinstance(i, (int, numpy.integer)) for i in vals):
+        return "%s %s %s %s %s %s" % tuple(vals)
+    return "%r %r %r %r %r %r" % tuple(map(float, vals))
+
+
 class Flame(object):
     _never_write = set(
         (
@@ -60,6 +107,16 @@ class Flame(object):
             "y_offset",
         )
     )
+    # Left out of fingerprints when asked to, as they don't affect rendering.
+    # The version is set on parsing, so it's always left out.
+    _cosmetic = set(("name", "nick", "url", "notes"))
+    # Attributes the property_arrays are made from.
+    _array_sources = frozenset(("width", "height", "x_offset", "y_offset"))
+
+    def __setattr__(self, name, v):
+        object.__setattr__(self, name, v)
+        if name in self._array_sources:
+            invalidate(self)
 
     def __init__(self, string=""):
         # Set minimum required attributes.
@@ -140,11 +197,9 @@ class Flame(object):
                 if isinstance(val, str):
                     pass
                 elif hasattr(val, "__iter__"):
-                    # Remember to convert round numbers to integer.
-                    val = " ".join(str(i if i % 1 else int(i)) for i in val)
+                    val = " ".join(map(_format_number, val))
                 else:
-                    # Assume number: int, float, some numpy type...
-                    val = val if val % 1 else int(val)
+                    val = _format_number(val)
                 lst.append('%s="%s" ' % (name, val))
             lst.append(">\n")
 
@@ -159,6 +214,60 @@ class Flame(object):
 
         return "".join(lst)
 
+    def fingerprint(self, cosmetic=True):
+        """Returns a 16 byte digest of the flame parameters, meant to be used
+        as a cache key or to detect changes. Attribute order, number
+        formatting and unset vs zero variations don't affect it. With
+        cosmetic=False, the name and other attributes with no effect on
+        the rendered image are left out."""
+        attrs = sorted(
+            (k, _canonical(v))
+            for k, v in self._iter_attributes()
+            if k != "version" and (cosmetic or k not in self._cosmetic)
+        )
+        h = hashlib.blake2b(repr(attrs).encode(), digest_size=16)
+        h.update(numpy.asarray(self.gradient.data, dtype=numpy.uint8).tobytes())
+        for x in self.iter_xforms():
+            h.update(x._fingerprint_data())
+        return h.digest()
+
+    def to_bytes(self):
+        """Returns a compact binary representation of the flame.
+
+        The result round-trips losslessly through from_bytes, and is much
+        cheaper to produce and read back than to_string. It depends on the
+        variation list of the running version, so it's meant for in-memory
+        use (undo history, caches, etc.); flames on disk should use XML."""
+        out = [_binary_magic]
+        _pack_dict(self.__dict__, ("xform", "final", "gradient"), out)
+        out.append(self.gradient.to_bytes())
+        out.append(struct.pack("<HB", len(self.xform), self.final is not None))
+        out.extend(x.to_bytes() for x in self.iter_xforms())
+        return b"".join(out)
+
+    def from_bytes(self, data):
+        r = _BinaryReader(data)
+        if r.read(len(_binary_magic)) != _binary_magic:
+            raise ParsingError("Not a binary flame")
+        d = _unpack_dict(r)
+        gradient = Palette().from_bytes(r.read(768))
+        nxforms, hasfinal = r.unpack("<HB")
+
+        self.__dict__.clear()
+        self.__dict__.update(d)
+        invalidate(self)
+        self.gradient = gradient
+        self.xform = [Xform.__new__(Xform) for i in range(nxforms)]
+        self.final = Xform.__new__(Xform) if hasfinal else None
+
+        # Chaos can only be set up once all xforms are in place.
+        chaos = [x._read_bytes(r, self) for x in self.iter_xforms()]
+        for x, lst in zip(self.iter_xforms(), chaos):
+            if lst:
+                x.chaos = Chaos(x, lst)
+
+        return self
+
     def __repr__(self):
         return '<flame "%s">' % self.name
 
@@ -189,7 +298,23 @@ class Flame(object):
         self.final = None
 
     def copy(self):
-        return Flame(string=self.to_string())
+        """Returns a deep copy of the flame, without going through xml."""
+        flame = Flame.__new__(Flame)
+        flame.__dict__.update((k, _copy_value(v)) for k, v in self.__dict__.items())
+        flame.gradient = self.gradient.copy()
+        flame.xform = [x._copy(flame) for x in self.xform]
+        flame.final = self.final._copy(flame) if self.final else None
+
+        # Chaos is keyed on xform objects, so it needs to be remapped once
+        # all copies are in place.
+        mapping = dict(zip(self.iter_xforms(), flame.iter_xforms()))
+        for old, new in mapping.items():
+            if old._chaos is not None:
+                items = old._chaos._dict.items()
+                new.chaos._dict.update(
+                    (mapping[k], v) for k, v in items if k in mapping
+                )
+        return flame
 
     def iter_xforms(self):
         for i in self.xform:
@@ -199,8 +324,8 @@ class Flame(object):
 
     def iter_posts(self):
         for i in self.iter_xforms():
-            if i.post.isactive():
-                yield i.post
+            if i._post is not None and i._post.isactive():
+                yield i._post
 
     @property
     def angle(self):
@@ -211,16 +336,20 @@ class Flame(object):
         self.rotate = degrees(v)
 
     def reframe(self):
-        TwoDoubles = ctypes.c_double * 2
-
-        b_min = TwoDoubles()
-        b_max = TwoDoubles()
         b_eps = 0.1
         nsamples = 10000
-        genome = Genome.from_string(self.to_string(False))[0]
-        flam3_estimate_bounding_box(
-            genome, b_eps, nsamples, b_min, b_max, RandomContext()
-        )
+        if libflam3_loaded:
+            TwoDoubles = ctypes.c_double * 2
+            b_min = TwoDoubles()
+            b_max = TwoDoubles()
+            genome = genome_cache.get(self.to_string(False))[0]
+            flam3_estimate_bounding_box(
+                genome, b_eps, nsamples, b_min, b_max, RandomContext()
+            )
+        else:
+            from fr0stlib.engine import bounding_box
+
+            b_min, b_max = bounding_box(self, b_eps, nsamples)
         bxoff = (b_min[0] + b_max[0]) / 2
         if abs(bxoff) < 5:
             self.x_offset = bxoff
@@ -317,9 +446,13 @@ class Flame(object):
 
 class Palette(object):
     _template = "%c%c%c" * 256
+    _string_template = "".join(
+        '   <color index="%s" rgb="%%d %%d %%d"/>\n' % idx for idx in range(256)
+    )
 
     def __init__(self, element=None):
         self.data = numpy.zeros((256, 3), dtype=numpy.uint8)
+        self._string_cache = None, None
         if element is not None:
             self.from_flame_element(element)
 
@@ -336,20 +469,33 @@ class Palette(object):
         return iter(self.data)
 
     def to_string(self):
-        return "".join(
-            [
-                '   <color index="%s" rgb="%s %s %s"/>\n'
-                % (
-                    idx,
-                    int(self.data[idx, 0]),
-                    int(self.data[idx, 1]),
-                    int(self.data[idx, 2]),
-                )
-                for idx in range(256)
-            ]
-        )
+        # Palettes rarely change between saves, so the output is cached and
+        # keyed on the raw contents of the data array.
+        data = numpy.asarray(self.data)
+        key = data.dtype.str, data.tobytes()
+        cached_key, string = self.__dict__.get("_string_cache", (None, None))
+        if key != cached_key:
+            string = self._string_template % tuple(data.ravel().tolist())
+            self._string_cache = key, string
+        return string
+
+    def copy(self):
+        palette = Palette.__new__(Palette)
+        palette.__dict__.update(self.__dict__)
+        palette.data = numpy.array(self.data, dtype=numpy.uint8)
+        return palette
+
+    def to_bytes(self):
+        return numpy.asarray(self.data, dtype=numpy.uint8).tobytes()
+
+    def from_bytes(self, data):
+        self.data = numpy.frombuffer(data, dtype=numpy.uint8).reshape(256, 3).copy()
+        return self
 
     def to_buffer(self):
+        data = numpy.asarray(self.data)
+        if data.dtype == numpy.uint8:
+            return data.tobytes().decode("latin-1")
         return self._template % tuple(int(i) for i in itertools.chain(*self))
 
     def from_flame_element(self, flame):
@@ -380,50 +526,35 @@ class Palette(object):
         self.data[:] = data
 
     def reverse(self):
-        self.data = numpy.array(self.data[::-1], dtype=numpy.uint8)
+        self.data[:] = self.data[..., ::-1, :]
 
     def rotate(self, index):
-        self.data = numpy.array(
-            list(self.data[-index:]) + list(self.data[:-index]), dtype=numpy.uint8
-        )
+        if abs(index) >= 256:
+            # Slicing semantics: out of range offsets leave the palette as is.
+            index = 0
+        self.data[:] = numpy.roll(self.data, index, axis=-2)
 
     def hue(self, value):
-        value = value / 360.0
-        for i in range(256):
-            h, l, s = rgb2hls(self.data[i])
-            h = (h + value) % 1
-            rgb = hls2rgb((h, l, s))
-            self.data[i] = hls2rgb((h, l, s))
+        hls = rgb2hls_array(self.data)
+        hls[..., 0] = (hls[..., 0] + value / 360.0) % 1
+        self.data[:] = hls2rgb_array(hls)
 
     def saturation(self, value):
-        value = value / 100.0
-        for i in range(256):
-            h, l, s = rgb2hls(self.data[i])
-            s = max(0, min(1, s + value))
-            self.data[i] = hls2rgb((h, l, s))
+        hls = rgb2hls_array(self.data)
+        hls[..., 2] = numpy.clip(hls[..., 2] + value / 100.0, 0, 1)
+        self.data[:] = hls2rgb_array(hls)
 
     def brightness(self, value):
-        value = value / 100.0
-        for i in range(256):
-            h, l, s = rgb2hls(self.data[i])
-            l = max(0, min(1, l + value))
-            self.data[i] = hls2rgb((h, l, s))
+        hls = rgb2hls_array(self.data)
+        hls[..., 1] = numpy.clip(hls[..., 1] + value / 100.0, 0, 1)
+        self.data[:] = hls2rgb_array(hls)
 
     def invert(self):
-        self.data = 255 - self.data
+        self.data[:] = 255 - self.data
 
     def from_seeds(self, seeds, curve="cos"):
-        ns = len(seeds)
-        d = 256 / ns
-        r = 256 % ns
-        gen = []
-        for i in range(ns):
-            ds = d + (i < r)
-            start, end = seeds[i - 1], seeds[i]
-            for j in range(ds):
-                hsv = pblend_color(start, end, j / float(ds), curve)
-                gen.append(hsv2rgb(hsv))
-        self.data = numpy.array(gen, dtype=numpy.uint8)
+        seeds = numpy.asarray(seeds, dtype=float)
+        self.data[:] = _gradient_from_seeds(seeds, len(seeds), curve)[0]
 
     def random(
         self, hue=(0, 1), saturation=(0, 1), value=(0, 1), nodes=(5, 5), curve="cos"
@@ -439,9 +570,87 @@ class Palette(object):
         self.from_seeds(seeds, curve)
 
 
+class PaletteBatch(object):
+    """A stack of palettes backed by a single (n, 256, 3) array, so color
+    adjustments are applied to all of them at once. Indexing returns a
+    Palette that shares memory with the batch."""
+
+    def __init__(self, palettes=(), n=None):
+        if n is not None:
+            self.data = numpy.zeros((n, 256, 3), dtype=numpy.uint8)
+        else:
+            data = [numpy.asarray(getattr(p, "data", p)) for p in palettes]
+            self.data = numpy.array(data, dtype=numpy.uint8).reshape(-1, 256, 3)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            batch = PaletteBatch(n=0)
+            batch.data = self.data[key]
+            return batch
+        palette = Palette()
+        palette.data = self.data[key]
+        return palette
+
+    def __setitem__(self, key, value):
+        self.data[key] = getattr(value, "data", value)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    # These are written to work on any number of leading axes.
+    reverse = Palette.reverse
+    rotate = Palette.rotate
+    hue = Palette.hue
+    saturation = Palette.saturation
+    brightness = Palette.brightness
+    invert = Palette.invert
+
+    def random(
+        self, hue=(0, 1), saturation=(0, 1), value=(0, 1), nodes=(5, 5), curve="cos"
+    ):
+        """Fills every palette in the batch with a random gradient. Takes the
+        same arguments as Palette.random."""
+        n = len(self)
+        h1, h2 = hue
+        if h1 > h2:
+            hue = h1, h2 + 1
+        counts = numpy.random.uniform(nodes[0], nodes[1], n).astype(int)
+        size = n, max(counts.max(initial=0), 1)
+        seeds = numpy.stack(
+            [numpy.random.uniform(lo, hi, size) for lo, hi in (hue, saturation, value)],
+            axis=-1,
+        )
+        self.data = _gradient_from_seeds(seeds, counts, curve)
+
+
 class Xform(object):
     """Container for transform parameters."""
 
+    # The fields every xform has are kept in slots. Variations, variables and
+    # anything else go in the instance dict, so only the ones actually set
+    # take up space. Chaos and post are only created when first accessed.
+    __slots__ = (
+        "_parent",
+        "_chaos",
+        "_post",
+        "a",
+        "b",
+        "c",
+        "d",
+        "e",
+        "f",
+        "opacity",
+        "color",
+        "color_speed",
+        "animate",
+        "__dict__",
+        "__weakref__",
+    )
+    _slot_attributes = "opacity", "color", "color_speed", "animate"
+
     # Control behavoir of certain attributes:
     # _always_write: is written to disk even if set at 0
     # _never write: is never written to disk directly.
@@ -449,22 +658,59 @@ class Xform(object):
     _always_write = set(
         ("opacity", "color", "color_speed", "animate", "symmetry", "weight")
     ).union(i[0] for i in variable_list)
-    _never_write = set(("_parent", "a", "b", "c", "d", "e", "f", "chaos", "post"))
+    _never_write = set(
+        ("_parent", "_store", "_row", "a", "b", "c", "d", "e", "f", "chaos", "post")
+    )
     _default = set(("weight", "a", "b", "c", "d", "e", "f")).union(variation_list)
 
     def __init__(self, parent, chaos=(), post=(1.0, 0.0, 0.0, 1.0, 0.0, 0.0), **kwds):
-        self._parent = parent
+        # Nothing is cached for a new xform, so the coefficients are set
+        # through their slots directly instead of invalidating.
+        init = object.__setattr__
+        init(self, "_parent", parent)
 
         if not isinstance(self, PostXform):
-            self.opacity = 1.0
-            self.color = 0.0
-            self.color_speed = 0.5
-            self.animate = 1.0
-            self.chaos = Chaos(self, chaos)
-            self.post = PostXform(self, screen_coefs=post)
+            init(self, "opacity", 1.0)
+            init(self, "color", 0.0)
+            init(self, "color_speed", 0.5)
+            init(self, "animate", 1.0)
+            init(self, "_chaos", Chaos(self, chaos) if chaos else None)
+            post = tuple(post)
+            if post == (1, 0, 0, 1, 0, 0):
+                init(self, "_post", None)
+            else:
+                init(self, "_post", PostXform(self, screen_coefs=post))
+
+        coefs = kwds.pop("coefs", None)
+        if coefs is not None:
+            a, d, b, e, c, f = coefs
+            for k, v in zip("abcdef", (a, b, c, d, e, f)):
+                _xform_slots[k].__set__(self, v)
+        for k, v in kwds.items():
+            setattr(self, k, v)
 
-        if kwds:
-            list(map(self.__setattr__, *list(zip(*iter(list(kwds.items()))))))
+    @property
+    def chaos(self):
+        if self._chaos is None:
+            self._chaos = Chaos(self)
+        return self._chaos
+
+    @chaos.setter
+    def chaos(self, v):
+        self._chaos = v
+
+    @property
+    def post(self):
+        if self._post is None:
+            self._post = PostXform(self, screen_coefs=(1.0, 0.0, 0.0, 1.0, 0.0, 0.0))
+            store = self.__dict__.get("_store")
+            if store is not None:
+                store._attach(self._post, _StoredPostXform, self._row, copy=False)
+        return self._post
+
+    @post.setter
+    def post(self, v):
+        self._post = v
 
     @classmethod
     def random(
@@ -561,13 +807,73 @@ class Xform(object):
     def to_string(self):
         lst = ["   <%sxform " % ("final" if self.isfinal() else "")]
         lst.extend('%s="%s" ' % i for i in self._iter_attributes())
-        lst.append('coefs="%s %s %s %s %s %s" ' % tuple(self.screen_coefs))
-        lst.append(self.post.to_string())
-        lst.append(self.chaos.to_string())
+        lst.append(
+            'coefs="%s" '
+            % _format_coefs((self.a, -self.d, -self.b, self.e, self.c, -self.f))
+        )
+        if self._post is not None:
+            lst.append(self._post.to_string())
+        if self._chaos is not None:
+            lst.append(self._chaos.to_string())
         lst.append("/>\n")
 
         return "".join(lst)
 
+    def _fingerprint_data(self):
+        attrs = sorted((k, _canonical(v)) for k, v in self._iter_attributes())
+        coefs = [getattr(self, k) for k in "abcdef"]
+        post = self._post
+        if post is not None:
+            post = _canonical([getattr(post, k) for k in "abcdef"])
+        if post == (1, 0, 0, 1, 0, 0):
+            post = None
+        chaos = [] if self._chaos is None else list(self._chaos)
+        while chaos and chaos[-1] == 1:
+            chaos.pop()
+        data = self.isfinal(), attrs, _canonical(coefs), post, _canonical(chaos)
+        return repr(data).encode()
+
+    def to_bytes(self):
+        """Returns a compact binary representation of the xform. See
+        Flame.to_bytes for details."""
+        out = []
+        _pack_dict(dict(self._items()), _xform_packed, out)
+        post = self._post
+        _pack_floats([getattr(self, i) for i in "abcdef"], out)
+        if post is None:
+            _pack_floats([1.0, 0.0, 0.0, 1.0, 0.0, 0.0], out)
+        else:
+            _pack_floats([getattr(post, i) for i in "abcdef"], out)
+        _pack_floats([] if self._chaos is None else list(self._chaos), out)
+        return b"".join(out)
+
+    def from_bytes(self, data):
+        """Reads an xform from the output of to_bytes. The xform must already
+        belong to a flame, e.g. by creating it through Flame.add_xform."""
+        chaos = self._read_bytes(_BinaryReader(data), self._parent)
+        if chaos:
+            self.chaos = Chaos(self, chaos[: len(self._parent.xform)])
+        return self
+
+    def _read_bytes(self, r, parent):
+        d = _unpack_dict(r)
+        coefs = _unpack_floats(r)
+        post = _unpack_floats(r)
+        chaos = _unpack_floats(r)
+        self.__dict__.clear()
+        self._parent = parent
+        self._chaos = self._post = None
+        self.a, self.b, self.c, self.d, self.e, self.f = coefs
+        for k, v in d.items():
+            if k not in _xform_packed:
+                setattr(self, k, v)
+        if post != [1, 0, 0, 1, 0, 0]:
+            self._post = PostXform.__new__(PostXform)
+            self._post._parent = self
+            self._post.a, self._post.b, self._post.c = post[:3]
+            self._post.d, self._post.e, self._post.f = post[3:]
+        return chaos
+
     def __repr__(self):
         try:
             index = self.index
@@ -615,10 +921,18 @@ class Xform(object):
     def list_variations(self):
         return [i for i in variation_list if i in self.__dict__]
 
+    def _items(self):
+        for k in self._slot_attributes:
+            try:
+                yield k, getattr(self, k)
+            except AttributeError:
+                pass
+        yield from self.__dict__.items()
+
     def _iter_attributes(self):
         return (
             (k, v)
-            for (k, v) in list(self.__dict__.items())
+            for (k, v) in list(self._items())
             if k not in self._never_write and v or k in self._always_write
         )
 
@@ -803,8 +1117,24 @@ class Xform(object):
     def copy(self):
         if self.isfinal():
             return self
-        xf = self._parent.add_xform(linear=0)
-        xf.from_element(etree.fromstring(self.to_string()))
+        xf = self._copy(self._parent)
+        if self._chaos is not None:
+            xf.chaos._dict.update(self._chaos._dict)
+        self._parent.xform.append(xf)
+        return xf
+
+    def _copy(self, parent):
+        """Copies all attributes and the post transform into a new xform
+        belonging to parent. Chaos is left to the caller, as it depends on
+        which xforms the copy ends up next to."""
+        xf = Xform.__new__(Xform)
+        xf._parent = parent
+        xf._chaos = None
+        xf._post = None if self._post is None else self._post._copy(xf)
+        for k in "abcdef":
+            setattr(xf, k, getattr(self, k))
+        for k, v in self._items():
+            setattr(xf, k, _copy_value(v))
         return xf
 
     def delete(self):
@@ -814,6 +1144,32 @@ class Xform(object):
             self._parent.xform.remove(self)
 
 
+# The descriptors of Xform's slots, before the coefficients are wrapped below.
+_xform_slots = dict(
+    (k, v) for k, v in vars(Xform).items() if k in Xform.__slots__ and k[:2] != "__"
+)
+
+
+def _coef_property(slot):
+    """Wraps the slot of an affine coefficient, so that setting or deleting
+    it drops the property_arrays cached for the xform. Reads go straight to
+    the slot."""
+
+    def fset(self, v):
+        slot.__set__(self, v)
+        invalidate(self)
+
+    def fdel(self):
+        slot.__delete__(self)
+        invalidate(self)
+
+    return property(slot.__get__, fset, fdel)
+
+
+for _name in "abcdef":
+    setattr(Xform, _name, _coef_property(_xform_slots[_name]))
+
+
 class PostXform(Xform):
     _allowed = set(
         (
@@ -837,6 +1193,7 @@ class PostXform(Xform):
             "op",
         )
     )
+    _slot_attributes = ()
     index = None
     animate = 0
 
@@ -846,23 +1203,32 @@ class PostXform(Xform):
     def __setattr__(self, name, v):
         if name not in self._allowed:
             raise AttributeError('Can\'t assign "%s" to %s' % (name, self))
-        object.__setattr__(self, name, v)
+        Xform.__setattr__(self, name, v)
 
     def copy(self):
         raise TypeError("Can't copy a post transform")
 
+    def _copy(self, parent):
+        post = PostXform.__new__(PostXform)
+        post._parent = parent
+        for k in "abcdef":
+            setattr(post, k, getattr(self, k))
+        return post
+
     def delete(self):
         raise TypeError("Can't delete a post transform")
 
     def isactive(self):
-        return self.coefs != (1, 0, 0, 1, 0, 0)
+        return (self.a, self.d, self.b, self.e, self.c, self.f) != (1, 0, 0, 1, 0, 0)
 
     def isfinal(self):
         return False
 
     def to_string(self):
         if self.isactive():
-            return 'post="%s %s %s %s %s %s" ' % tuple(self.screen_coefs)
+            return 'post="%s" ' % _format_coefs(
+                (self.a, -self.d, -self.b, self.e, self.c, -self.f)
+            )
         return ""
 
 
@@ -916,6 +1282,17 @@ class Chaos(object):
             return
         self._dict[self._parent._parent.xform[pos]] = val
 
+    def to_bytes(self):
+        out = []
+        _pack_floats(list(self), out)
+        return b"".join(out)
+
+    def from_bytes(self, data):
+        lst = _unpack_floats(_BinaryReader(data))
+        self._dict.clear()
+        self._dict.update(zip(self._parent._parent.xform, lst))
+        return self
+
     def to_string(self):
         lst = list(self)
         for i in reversed(lst):
@@ -925,7 +1302,361 @@ class Chaos(object):
         return 'chaos="%s " ' % " ".join(str(i) for i in lst) if lst else ""
 
 
-def save_flames(path, *flames):
+class XformStore(object):
+    """Keeps the numeric parameters of all xforms in a flame in numpy arrays,
+    so whole-flame operations can be done in bulk instead of looping over
+    xforms in python.
+
+    While the store is attached, the xforms act as views into it: reading or
+    setting an attribute such as x.a, x.linear or x.post.c goes through the
+    arrays, so both ways of accessing the data can be mixed freely. Values
+    are stored as floats, but read back as ints where they were set as ints
+    and still hold round numbers. Xforms added to the flame after the store
+    was created are not tracked. Post transforms are attached when they're
+    first accessed, so the store doesn't create one for every xform. Call
+    detach (or use the store as a context manager) to move the values back
+    into the xforms:
+
+        with XformStore(flame) as store:
+            store.rotate(15, store.animate != 0)
+            store.normalize_weights()
+    """
+
+    _scalars = "weight", "color", "color_speed", "opacity", "animate"
+
+    def __init__(self, flame):
+        self.flame = flame
+        self.xforms = list(flame.iter_xforms())
+        n = len(self.xforms)
+        self.coefs = numpy.zeros((n, 6))
+        self.post = numpy.tile((1.0, 0.0, 0.0, 1.0, 0.0, 0.0), (n, 1))
+        self.variations = numpy.zeros((n, flam3_nvariations))
+        self.params = numpy.zeros((n, len(variable_list)))
+        for name in self._scalars:
+            setattr(self, name, numpy.zeros(n))
+        self.final = numpy.array([x.isfinal() for x in self.xforms], dtype=bool)
+        for row, x in enumerate(self.xforms):
+            self._attach(x, _StoredXform, row)
+            if x._post is not None:
+                self._attach(x._post, _StoredPostXform, row)
+
+    def __len__(self):
+        return len(self.xforms)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    def _attach(self, x, cls, row, copy=True):
+        """Turns x into a view of the given row. Its values are copied into
+        the arrays, unless copy is false, in which case the arrays keep
+        theirs."""
+        for attr in cls._stored_attributes:
+            v = attr.raw(x)
+            if v is not None:
+                if copy:
+                    attr.set(self, row, v)
+                attr.mark(x, _stored_marker(v))
+        x.__dict__.update(_store=self, _row=row)
+        object.__setattr__(x, "__class__", cls)
+        invalidate(x)
+
+    def _detach(self, x, cls):
+        d = x.__dict__
+        if d.get("_store") is not self:
+            return
+        for attr in type(x)._stored_attributes:
+            marker = attr.raw(x)
+            if marker is not None:
+                attr.mark(x, attr.get(self, d["_row"], marker))
+        del d["_store"], d["_row"]
+        object.__setattr__(x, "__class__", cls)
+        invalidate(x)
+
+    def detach(self):
+        """Writes all values back into the xforms, which stop being views."""
+        identity = 1.0, 0.0, 0.0, 1.0, 0.0, 0.0
+        for row, x in enumerate(self.xforms):
+            attached = x.__dict__.get("_store") is self
+            if attached and x._post is None and tuple(self.post[row]) != identity:
+                # The post was only changed through the array, so it has to
+                # be created to take the values back.
+                x.post
+            if x._post is not None:
+                self._detach(x._post, PostXform)
+            self._detach(x, Xform)
+
+    def rotate(self, deg, mask=None):
+        """Rotates the x and y axes of the selected xforms (all by default)
+        around their origin, same as Xform.rotate."""
+        s = numpy.s_[:] if mask is None else mask
+        theta = radians(deg)
+        rot = numpy.array(((cos(theta), sin(theta)), (-sin(theta), cos(theta))))
+        coefs = self.coefs[s]
+        coefs[:, :4] = (coefs[:, :4].reshape(-1, 2, 2) @ rot).reshape(-1, 4)
+        self.coefs[s] = coefs
+
+    def scale(self, v, mask=None):
+        """Scales the x and y axes of the selected xforms, same as
+        Xform.scale."""
+        s = numpy.s_[:] if mask is None else mask
+        self.coefs[s, :4] *= v
+
+    def move_pos(self, v, mask=None):
+        """Moves the origin of the selected xforms, same as Xform.move_pos."""
+        s = numpy.s_[:] if mask is None else mask
+        self.coefs[s, 4:] += v
+
+    def normalize_weights(self, norm=1.0):
+        """Scales xform weights so they total norm. The final xform is not
+        affected."""
+        self.weight[~self.final] *= norm / self.weight[~self.final].sum()
+
+
+class _StoredValue(object):
+    """Placeholder left on an xform for values that live in an XformStore.
+    Keeps the attribute order and tells which ones are set."""
+
+    def __init__(self, ty):
+        self.type = ty
+
+    def __repr__(self):
+        return "<stored %s>" % self.type.__name__
+
+
+_stored_float = _StoredValue(float)
+_stored_int = _StoredValue(int)
+
+
+def _stored_marker(v):
+    return _stored_int if type(v) is int else _stored_float
+
+
+class _stored_attribute(object):
+    """Data descriptor redirecting an xform attribute to a store array."""
+
+    def __init__(self, name, array, col=None):
+        self.name = name
+        self.array = array
+        self.col = col
+        # Attributes with a slot keep their placeholder there instead of in
+        # the instance dict.
+        self.slot = _xform_slots.get(name)
+
+    def raw(self, instance):
+        """Returns what's actually set on the instance, or None."""
+        if self.slot is None:
+            return instance.__dict__.get(self.name)
+        try:
+            return self.slot.__get__(instance, type(instance))
+        except AttributeError:
+            return None
+
+    def mark(self, instance, v):
+        if self.slot is None:
+            instance.__dict__[self.name] = v
+        else:
+            self.slot.__set__(instance, v)
+
+    def _index(self, row):
+        return row if self.col is None else (row, self.col)
+
+    def get(self, store, row, marker=_stored_float):
+        v = float(getattr(store, self.array)[self._index(row)])
+        return v if marker is _stored_float or v % 1 else int(v)
+
+    def set(self, store, row, v):
+        getattr(store, self.array)[self._index(row)] = v
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        marker = self.raw(instance)
+        if marker is None:
+            # Let __getattr__ handle defaults.
+            raise AttributeError(self.name)
+        d = instance.__dict__
+        return self.get(d["_store"], d["_row"], marker)
+
+    def __set__(self, instance, v):
+        d = instance.__dict__
+        self.set(d["_store"], d["_row"], v)
+        self.mark(instance, _stored_marker(v))
+
+    def __delete__(self, instance):
+        if self.raw(instance) is None:
+            raise AttributeError(self.name)
+        d = instance.__dict__
+        self.set(d["_store"], d["_row"], 0.0)
+        if self.slot is None:
+            del d[self.name]
+        else:
+            self.slot.__delete__(instance)
+
+
+class _StoredXform(Xform):
+    def _items(self):
+        cls = type(self)
+        for k, v in list(Xform._items(self)):
+            if k in ("_store", "_row"):
+                continue
+            if isinstance(v, _StoredValue):
+                v = getattr(cls, k).__get__(self, cls)
+            yield k, v
+
+
+class _StoredPostXform(PostXform):
+    _items = _StoredXform._items
+
+
+for _i, _name in enumerate("adbecf"):
+    setattr(_StoredXform, _name, _stored_attribute(_name, "coefs", _i))
+    setattr(_StoredPostXform, _name, _stored_attribute(_name, "post", _i))
+for _name in XformStore._scalars:
+    setattr(_StoredXform, _name, _stored_attribute(_name, _name))
+for _i, _name in enumerate(variation_list):
+    if _name is not None:
+        setattr(_StoredXform, _name, _stored_attribute(_name, "variations", _i))
+for _i, (_name, _, _, _) in enumerate(variable_list):
+    setattr(_StoredXform, _name, _stored_attribute(_name, "params", _i))
+for _cls in _StoredXform, _StoredPostXform:
+    _cls._stored_attributes = [
+        v for v in vars(_cls).values() if isinstance(v, _stored_attribute)
+    ]
+
+
+# Binary serialization helpers, used by the to_bytes and from_bytes methods.
+# Attribute names are stored as one byte codes wherever possible, and values
+# are tagged with their type so they can be restored exactly.
+
+_binary_magic = b"FR0\x01"
+_binary_keys = (
+    variation_list
+    + [i[0] for i in variable_list]
+    + ["weight", "color", "color_speed", "animate", "opacity", "symmetry"]
+)
+_binary_codes = dict((k, i) for i, k in enumerate(_binary_keys))
+# These are stored in dedicated sections instead of as regular attributes.
+_xform_packed = set(("_parent", "chaos", "post", "a", "b", "c", "d", "e", "f"))
+
+
+class _BinaryReader(object):
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, n):
+        start = self.pos
+        self.pos += n
+        return self.data[start : self.pos]
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+
+def _pack_value(v, out):
+    ty = type(v)
+    if ty is float:
+        out.append(struct.pack("<cd", b"f", v))
+    elif ty is int:
+        out.append(struct.pack("<cq", b"i", v))
+    elif ty is str:
+        data = v.encode()
+        out.append(struct.pack("<cI", b"s", len(data)))
+        out.append(data)
+    elif ty is bool:
+        out.append(struct.pack("<c?", b"b", v))
+    elif ty is list or ty is tuple:
+        out.append(struct.pack("<cI", b"l" if ty is list else b"t", len(v)))
+        for i in v:
+            _pack_value(i, out)
+    elif v is None:
+        out.append(b"n")
+    elif isinstance(v, (numpy.ndarray, numpy.generic)):
+        _pack_value(v.tolist(), out)
+    else:
+        raise TypeError("Can't serialize %r" % (v,))
+
+
+def _unpack_value(r):
+    tag = r.read(1)
+    if tag == b"f":
+        return r.unpack("<d")[0]
+    if tag == b"i":
+        return r.unpack("<q")[0]
+    if tag == b"s":
+        return bytes(r.read(r.unpack("<I")[0])).decode()
+    if tag == b"b":
+        return r.unpack("<?")[0]
+    if tag == b"l":
+        return [_unpack_value(r) for i in range(r.unpack("<I")[0])]
+    if tag == b"t":
+        return tuple(_unpack_value(r) for i in range(r.unpack("<I")[0]))
+    if tag in (b"n", b"_"):
+        return None
+    raise ParsingError("Invalid type tag in binary data: %r" % tag)
+
+
+def _pack_dict(d, packed, out):
+    """Packs a dict, preserving key order. Keys in packed are only recorded
+    by name, their values are restored separately."""
+    out.append(struct.pack("<H", len(d)))
+    for k, v in d.items():
+        code = _binary_codes.get(k)
+        if code is None:
+            data = k.encode()
+            out.append(struct.pack("<BB", 255, len(data)))
+            out.append(data)
+        else:
+            out.append(struct.pack("<B", code))
+        if k in packed:
+            out.append(b"_")
+        else:
+            _pack_value(v, out)
+
+
+def _unpack_dict(r):
+    d = {}
+    for i in range(r.unpack("<H")[0]):
+        code = r.unpack("<B")[0]
+        if code == 255:
+            k = bytes(r.read(r.unpack("<B")[0])).decode()
+        else:
+            k = _binary_keys[code]
+        d[k] = _unpack_value(r)
+    return d
+
+
+def _pack_floats(values, out):
+    """Packs a sequence of numbers as doubles, with a bitmask recording which
+    of them are ints."""
+    n = len(values)
+    mask = sum(1 << i for i, v in enumerate(values) if type(v) is int)
+    out.append(struct.pack("<I", n))
+    out.append(mask.to_bytes((n + 7) // 8, "little"))
+    out.append(struct.pack("<%sd" % n, *values))
+
+
+def _unpack_floats(r):
+    n = r.unpack("<I")[0]
+    mask = int.from_bytes(r.read((n + 7) // 8), "little")
+    values = list(r.unpack("<%sd" % n))
+    if mask:
+        for i in range(n):
+            if mask >> i & 1:
+                values[i] = int(values[i])
+    return values
+
+
+def save_flames(path, *flames, index=None):
+    """Writes flames to a file.
+
+    If index is True, a sidecar FlameIndex is written along with the file. If
+    it's None (the default), an existing index is kept up to date."""
     lst = [f.to_string() if isinstance(f, Flame) else f for f in flames]
     head, ext = os.path.splitext(path)
     if os.path.exists(path) and ext == ".flame":
@@ -933,25 +1664,226 @@ def save_flames(path, *flames):
     dirname = os.path.dirname(path)
     if dirname and not os.path.exists(dirname):
         os.makedirs(dirname)
-    with open(path, "w") as f:
-        f.write("""<flames version="%s">\n""" % VERSION)
-        f.write("\n".join(lst))
-        f.write("""</flames>""")
+    if index is None:
+        index = os.path.exists(FlameIndex.sidecar_path(path))
+    entries = []
+    with open(path, "wb") as f:
+        f.write(_encode_text("""<flames version="%s">\n""" % VERSION))
+        for i, s in enumerate(lst):
+            if i:
+                f.write(_encode_text("\n"))
+            data = _encode_text(s)
+            if index:
+                # Offsets are known as the file is written, so the index
+                # never needs to rescan it.
+                pos = f.tell()
+                entries.extend(
+                    FlameIndex.make_entry(pos + offset, d)
+                    for offset, d in scan_flames(io.BytesIO(data))
+                )
+            f.write(data)
+        f.write(_encode_text("""</flames>"""))
+    if index:
+        FlameIndex(path, entries).save()
+
+
+def _encode_text(s):
+    # Write the same bytes a file opened in text mode would.
+    data = s.encode()
+    if os.linesep != "\n":
+        data = data.replace(b"\n", os.linesep.encode())
+    return data
 
 
 def split_flamestrings(string):
     return re.findall(r"<flame .*?</flame>", string, re.DOTALL)
 
 
+_flame_start = b"<flame "
+_flame_end = b"</flame>"
+
+
+def scan_flames(fileobj, chunksize=1 << 16):
+    """Scans a binary file object for flames without reading it all at once.
+
+    Yields (offset, data) tuples, where offset is the byte position of the
+    flame inside the file and data is the raw bytes of that flame. Matching
+    follows split_flamestrings. Only the flame currently being scanned is kept
+    in memory."""
+    buf = bytearray()
+    pos = 0  # file offset of buf[0]
+    keep = len(_flame_start) - 1
+    for chunk in iter(partial(fileobj.read, chunksize), b""):
+        buf += chunk
+        while True:
+            start = buf.find(_flame_start)
+            if start == -1:
+                # Only keep what could be the beginning of a start tag.
+                drop = max(0, len(buf) - keep)
+                del buf[:drop]
+                pos += drop
+                break
+            end = buf.find(_flame_end, start + len(_flame_start))
+            if end == -1:
+                del buf[:start]
+                pos += start
+                break
+            end += len(_flame_end)
+            yield pos + start, bytes(buf[start:end])
+            del buf[:end]
+            pos += end
+
+
+def _decode_flame(data):
+    # Mimic what reading the file in text mode would return.
+    s = data.decode()
+    if "\r" in s:
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
+    return s
+
+
+def iter_flamestrings(filename):
+    """Reads a flame file lazily, yielding one flame string at a time."""
+    with open(filename, "rb") as f:
+        for _, data in scan_flames(f):
+            yield _decode_flame(data)
+
+
+def iter_flames(filename):
+    """Reads a flame file lazily, yielding one flame object at a time.
+
+    The file is parsed incrementally, and each flame element is discarded as
+    soon as it has been converted, so memory usage doesn't grow with the size
+    of the file."""
+    with open(filename, "rb") as f:
+        context = etree.iterparse(f, events=("start", "end"))
+        try:
+            _, root = next(context)
+        except StopIteration:
+            return
+        depth = 0
+        for event, element in context:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth:
+                continue
+            if element.tag == "flame":
+                yield Flame().from_element(element)
+            root.clear()
+
+
 def load_flamestrings(filename):
     """Reads a flame file and returns a list of flame strings."""
-    return split_flamestrings(open(filename).read())
+    return list(iter_flamestrings(filename))
 
 
 def load_flames(filename):
     """Reads a flame file and returns a list of flame objects."""
-    tree = etree.parse(open(filename))
-    return [Flame().from_element(e) for e in tree.findall("flame")]
+    return list(iter_flames(filename))
+
+
+class FlameIndex(object):
+    """Byte offset index of a flame file, stored in a sidecar file next to it.
+
+    Each entry holds the name, byte offset, byte length and md5 hash of a
+    flame, so flames can be listed and read individually without parsing the
+    whole file. The sidecar records the size and modification time of the
+    flame file; if they don't match, the index is rebuilt by scanning. A
+    rebuilt index is only written back if save is true and the directory of
+    the flame file is writable."""
+
+    _version = 2
+
+    def __init__(self, path, entries=None, save=True):
+        self.path = path
+        self._positions = None
+        self.entries = entries
+        if entries is None:
+            self.entries = self._load()
+        if self.entries is None:
+            self.entries = self._build()
+            dirname = os.path.dirname(os.path.abspath(path))
+            if save and os.access(dirname, os.W_OK):
+                try:
+                    self.save()
+                except (IOError, OSError):
+                    # The index is optional, failing to write it is no problem.
+                    pass
+
+    @staticmethod
+    def sidecar_path(path):
+        return path + ".idx"
+
+    @staticmethod
+    def make_entry(offset, data):
+        match = re.search(b' name="(.*?)"', data)
+        name = _decode_flame(match.group(1)) if match else ""
+        name = unescape(name, {"&quot;": '"', "&apos;": "'"})
+        return name, offset, len(data), hashlib.md5(data).hexdigest()
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def _load(self):
+        try:
+            with open(self.sidecar_path(self.path)) as f:
+                d = json.load(f)
+            if d["version"] != self._version or d["stamp"] != self._stamp():
+                return None
+            return [tuple(i) for i in d["entries"]]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _build(self):
+        with open(self.path, "rb") as f:
+            return [self.make_entry(*i) for i in scan_flames(f)]
+
+    def save(self):
+        d = dict(version=self._version, stamp=self._stamp(), entries=self.entries)
+        with open(self.sidecar_path(self.path), "w") as f:
+            json.dump(d, f, separators=(",", ":"))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, pos):
+        """Returns the flame string at the given position."""
+        return self.read(pos)
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            for _, offset, length, _ in self.entries:
+                f.seek(offset)
+                yield _decode_flame(f.read(length))
+
+    def names(self):
+        return [i[0] for i in self.entries]
+
+    def position(self, name):
+        """Returns the position of the first flame with the given name."""
+        if self._positions is None:
+            self._positions = {}
+            for i, entry in enumerate(self.entries):
+                self._positions.setdefault(entry[0], i)
+        return self._positions[name]
+
+    def read(self, pos, verify=False):
+        _, offset, length, md5 = self.entries[pos]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if verify and hashlib.md5(data).hexdigest() != md5:
+            raise ParsingError("Flame %s doesn't match index of %s" % (pos, self.path))
+        return _decode_flame(data)
+
+    def get(self, name):
+        return self.read(self.position(name))
+
+    def flame(self, pos):
+        return Flame(self.read(pos))
 
 
 def show_status(s):
@@ -1012,6 +1944,130 @@ def hsv2rgb(hsv):
     return tuple(int(x * 255) for x in colorsys.hsv_to_rgb(h, s, v))
 
 
+def rgb2hls_array(rgb):
+    """Vectorized rgb2hls. Takes an array of rgb values (0-255) with the
+    channels along the last axis and returns an array of hls values."""
+    r, g, b = numpy.moveaxis(numpy.asarray(rgb) / 255.0, -1, 0)
+    maxc = numpy.maximum(numpy.maximum(r, g), b)
+    minc = numpy.minimum(numpy.minimum(r, g), b)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0
+    gray = minc == maxc
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        s = numpy.where(l <= 0.5, rangec / sumc, rangec / (2.0 - maxc - minc))
+        h = _hue_array(r, g, b, maxc, rangec)
+    return numpy.stack(
+        (numpy.where(gray, 0.0, h), l, numpy.where(gray, 0.0, s)), axis=-1
+    )
+
+
+def hls2rgb_array(hls):
+    """Vectorized hls2rgb. Returns an int array of rgb values."""
+    h, l, s = numpy.moveaxis(numpy.asarray(hls, dtype=float), -1, 0)
+    m2 = numpy.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+    rgb = numpy.stack(
+        [_hls_channel(m1, m2, h + i) for i in (1.0 / 3.0, 0.0, -1.0 / 3.0)], axis=-1
+    )
+    rgb[s == 0.0] = l[s == 0.0, None]
+    return (rgb * 255).astype(int)
+
+
+def rgb2hsv_array(rgb):
+    """Vectorized rgb2hsv."""
+    r, g, b = numpy.moveaxis(numpy.asarray(rgb) / 255.0, -1, 0)
+    maxc = numpy.maximum(numpy.maximum(r, g), b)
+    minc = numpy.minimum(numpy.minimum(r, g), b)
+    rangec = maxc - minc
+    gray = minc == maxc
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        s = rangec / maxc
+        h = _hue_array(r, g, b, maxc, rangec)
+    return numpy.stack(
+        (numpy.where(gray, 0.0, h), numpy.where(gray, 0.0, s), maxc), axis=-1
+    )
+
+
+def hsv2rgb_array(hsv):
+    """Vectorized hsv2rgb. Returns an int array of rgb values."""
+    h, s, v = numpy.moveaxis(numpy.asarray(hsv, dtype=float), -1, 0)
+    i = (h * 6.0).astype(int)
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    # Each sector of the hue circle picks a different permutation of v, t, p
+    # and q. With s == 0 these are all equal to v, so no special case needed.
+    sectors = numpy.array(
+        ((0, 1, 2), (3, 0, 2), (2, 0, 1), (2, 3, 0), (1, 2, 0), (0, 2, 3))
+    )
+    rgb = numpy.take_along_axis(
+        numpy.stack((v, t, p, q), axis=-1), sectors[i % 6], axis=-1
+    )
+    return (rgb * 255).astype(int)
+
+
+def _hue_array(r, g, b, maxc, rangec):
+    rc = (maxc - r) / rangec
+    gc = (maxc - g) / rangec
+    bc = (maxc - b) / rangec
+    h = numpy.where(
+        r == maxc, bc - gc, numpy.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc)
+    )
+    return (h / 6.0) % 1.0
+
+
+def _hls_channel(m1, m2, hue):
+    hue = hue % 1.0
+    return numpy.select(
+        (hue < 1.0 / 6.0, hue < 0.5, hue < 2.0 / 3.0),
+        (m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0),
+        m1,
+    )
+
+
+def _gradient_from_seeds(seeds, counts, curve="cos"):
+    """Blends hsv seeds into 256 entry gradients, same as looping over
+    pblend_color. seeds has shape ([n,] nodes, 3) and counts gives the
+    number of seeds actually used by each gradient. Returns an (n, 256, 3)
+    uint8 array."""
+    seeds = seeds.reshape((-1,) + seeds.shape[-2:])
+    ns = numpy.asarray(counts).reshape(-1, 1)
+    d, r = 256 // ns, 256 % ns
+
+    # Work out which seed segment each entry falls in, and where. The first
+    # r segments have one entry more than the rest.
+    j = numpy.arange(256)
+    long = j < r * (d + 1)
+    seg = numpy.where(long, j // (d + 1), r + (j - r * (d + 1)) // d)
+    ds = d + long
+    pos = numpy.where(long, j - seg * ds, j - r * (d + 1) - (seg - r) * ds)
+
+    rows = numpy.arange(len(seeds))[:, None]
+    start = seeds[rows, seg - 1 + ns * (seg == 0)]
+    end = seeds[rows, seg]
+    h1, h2 = start[..., 0], end[..., 0]
+    h1 = h1 + (h1 < h2 - 0.5)
+    h2 = h2 + ((h2 < h1 - 0.5) & ~(start[..., 0] < h2 - 0.5))
+    start[..., 0], end[..., 0] = h1, h2
+
+    t = pblend_curve(pos / ds, curve)[..., None]
+    return hsv2rgb_array(start + (end - start) * t).astype(numpy.uint8)
+
+
+def pblend_curve(i, curve="linear"):
+    """Maps normalized positions (scalar or array) along the given curve."""
+    if curve == "linear":
+        return i
+    elif curve == "cos":
+        return 0.5 * (numpy.cos((i + 1) * pi) + 1)
+    elif curve == "cubic":
+        return 3 * i * i - 2 * i * i * i
+    else:
+        raise ValueError("invalid curve")
+
+
 def pblend(s, e, i, curve="linear"):
     """
     s = starting value
@@ -0,0 +1,524 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""A render engine written in numpy, which works straight from Flame objects
+and doesn't need libflam3.
+
+It follows flam3's algorithm: the chaos game is played with a large batch
+of points side by side, the points are binned into a histogram, which is
+log scaled and smoothed by density estimation, then run through the spatial
+filter. The variations are in fr0stlib.engine.variations, the choice of xform
+in fr0stlib.engine.selection, density estimation in fr0stlib.engine.density
+and the tone mapping in fr0stlib.engine.tonemap."""
+import time, math
+
+import numpy
+
+from fr0stlib.engine.density import density_estimator
+from fr0stlib.engine.selection import transition_table
+from fr0stlib.engine.tonemap import PREFILTER_WHITE, WHITE_LEVEL, tone_map
+from fr0stlib.engine.variations import Scratch, compose, flam3_coefs
+
+# Number of points iterated side by side.
+BATCH_SIZE = 1 << 16
+# Iterations each point runs before it's plotted, so it can settle on the
+# attractor.
+FUSE = 15
+# Points further out than this are considered to have escaped, and are
+# restarted, same as flam3's bad values.
+BAD_VALUE = 1e10
+# Support of flam3's gaussian spatial filter.
+GAUSSIAN_SUPPORT = 1.5
+
+
+def adjust_percentage(v):
+    """Maps an xform's opacity to the weight its points are plotted with,
+    the same way flam3 does."""
+    if v <= 0:
+        return 0.0
+    return 10 ** (-math.log(1.0 / v) / math.log(2))
+
+
+def _affine(coefs, x, y):
+    a, b, c, d, e, f = coefs
+    return a * x + b * y + c, d * x + e * y + f
+
+
+class CompiledXform(object):
+    """The parameters of an xform, in the form the engine uses them."""
+
+    def __init__(self, xform):
+        self.coefs = flam3_coefs(xform)
+        post = xform._post
+        if post is not None and post.isactive():
+            self.post = flam3_coefs(post)
+        else:
+            self.post = None
+        self.color = xform.color
+        self.color_speed = xform.color_speed
+        self.opacity = adjust_percentage(xform.opacity)
+        self.variations = compose(xform)
+
+    def apply(self, points, colors, rng, scratch=None):
+        """Returns the points and colors after applying the xform."""
+        x, y = _affine(self.coefs, points[:, 0], points[:, 1])
+        out = self.variations(x, y, rng, scratch)
+        if self.post is not None:
+            out[:, 0], out[:, 1] = _affine(self.post, out[:, 0], out[:, 1])
+        s = self.color_speed
+        return out, s * self.color + (1.0 - s) * colors
+
+
+class CompiledFlame(object):
+    """Everything the iteration needs from a flame."""
+
+    def __init__(self, flame):
+        xforms = flame.xform
+        self.xforms = [CompiledXform(x) for x in xforms]
+        self.final = CompiledXform(flame.final) if flame.final else None
+        self.opacity = numpy.array([x.opacity for x in self.xforms])
+        self.transitions = transition_table(flame)
+
+        self.palette = numpy.asarray(flame.gradient.data, dtype=float)
+        self.scratch = Scratch()
+        self.step_palette = getattr(flame, "palette_mode", "linear") == "step"
+
+    def choose_xforms(self, prev, rng):
+        """Picks the next xform for each point, given the last one."""
+        return self.transitions.choose(prev, rng)
+
+    def colors(self, color):
+        """Looks up palette colors (0-255) for color indices."""
+        color = numpy.clip(color, 0.0, 1.0) * 256
+        index = color.astype(int)
+        if self.step_palette:
+            return self.palette[numpy.minimum(index, 255)]
+        frac = color - index
+        top = index >= 255
+        index[top] = 254
+        frac[top] = 1.0
+        frac = frac[:, None]
+        return self.palette[index] * (1.0 - frac) + self.palette[index + 1] * frac
+
+
+class Histogram(object):
+    """Accumulates plotted points into buckets holding the summed rgb and
+    alpha values. Binning with numpy.bincount costs a pass over every
+    bucket, so points are collected until there are about as many of them
+    as buckets first."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.buckets = numpy.zeros((height, width, 4))
+        self._pending = []
+        self._npending = 0
+
+    def add(self, index, rgb, weight):
+        self._pending.append((index, rgb, weight))
+        self._npending += len(index)
+        if self._npending >= self.width * self.height:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        index, rgb, weight = (numpy.concatenate(i) for i in zip(*self._pending))
+        self._pending = []
+        self._npending = 0
+        flat = self.buckets.reshape(-1, 4)
+        n = len(flat)
+        for i in range(3):
+            flat[:, i] += numpy.bincount(index, rgb[:, i] * weight, n)
+        flat[:, 3] += numpy.bincount(index, weight, n) * WHITE_LEVEL
+
+
+class Camera(object):
+    """Maps flame coordinates to histogram buckets, the same way flam3 lays
+    out its buckets, including the gutter needed by the spatial filter."""
+
+    def __init__(self, flame, size, oversample, gutter, aspect=1.0):
+        width, height = self.size = size
+        self.oversample = oversample
+        self.gutter = gutter
+        self.scale = 2.0 ** getattr(flame, "zoom", 0)
+        # Flame.scale is relative to the width of the flame.
+        self.ppux = flame.scale * width / 100.0 * self.scale
+        self.ppuy = self.ppux / aspect
+        cx, cy = flame.center
+        self.center = cx, cy
+        self.corner = cx - width / self.ppux / 2.0, cy - height / self.ppuy / 2.0
+        self.hist_size = (
+            width * oversample + 2 * gutter,
+            height * oversample + 2 * gutter,
+        )
+        theta = math.radians(flame.rotate)
+        self.rotate = (math.cos(theta), math.sin(theta)) if flame.rotate else None
+
+    @property
+    def area(self):
+        """The area of the image in flame units."""
+        width, height = self.size
+        return width * height / (self.ppux * self.ppuy)
+
+    def buckets(self, points):
+        """Returns the flat bucket index of each point, and a mask of the
+        points that land inside the histogram."""
+        x, y = points[:, 0], points[:, 1]
+        if self.rotate is not None:
+            c, s = self.rotate
+            cx, cy = self.center
+            x, y = x - cx, y - cy
+            x, y = x * c - y * s + cx, x * s + y * c + cy
+        o = self.oversample
+        ix = numpy.floor((x - self.corner[0]) * self.ppux * o) + self.gutter
+        iy = numpy.floor((y - self.corner[1]) * self.ppuy * o) + self.gutter
+        w, h = self.hist_size
+        inside = (ix >= 0) & (ix < w) & (iy >= 0) & (iy < h)
+        return (iy[inside] * w + ix[inside]).astype(numpy.intp), inside
+
+
+def gaussian_filter(radius, oversample):
+    """Returns flam3's gaussian spatial filter as a 1d kernel, which is
+    applied along both axes."""
+    fw = 2.0 * GAUSSIAN_SUPPORT * oversample * radius
+    width = int(fw) + 1
+    # The kernel needs the same parity as the oversampling.
+    if (width ^ oversample) & 1:
+        width += 1
+    adjust = GAUSSIAN_SUPPORT * width / fw if fw > 0 else 1.0
+    t = ((2.0 * numpy.arange(width) + 1.0) / width - 1.0) * adjust
+    kernel = numpy.exp(-2.0 * t * t)
+    return kernel / kernel.sum()
+
+
+def spatial_filter(accum, kernel, oversample, size):
+    """Filters and downsamples the log scaled histogram to the output
+    size."""
+    width, height = size
+    stop_x, stop_y = oversample * width, oversample * height
+    rows = numpy.zeros((accum.shape[0], width, 4))
+    for i, k in enumerate(kernel):
+        rows += k * accum[:, i : i + stop_x : oversample]
+    out = numpy.zeros((height, width, 4))
+    for i, k in enumerate(kernel):
+        out += k * rows[i : i + stop_y : oversample]
+    return out
+
+
+def log_scale(buckets, k1, k2):
+    """Scales the buckets by the log of their density."""
+    a = buckets[..., 3]
+    ls = numpy.zeros_like(a)
+    hit = a > 0
+    ls[hit] = k1 * numpy.log1p(a[hit] * k2) / a[hit]
+    return buckets * ls[..., None]
+
+
+def output_array(buffer, shape, dtype):
+    """Returns an array of the given shape to write the image into, using
+    buffer if one is given."""
+    if buffer is None:
+        return numpy.empty(shape, dtype)
+    if (
+        isinstance(buffer, numpy.ndarray)
+        and buffer.shape == shape
+        and buffer.dtype == dtype
+    ):
+        return buffer
+    count = shape[0] * shape[1] * shape[2]
+    return numpy.frombuffer(buffer, dtype=dtype, count=count).reshape(shape)
+
+
+def _report(progress_func, fraction, eta):
+    """Passes progress on to progress_func, waiting while it asks for a
+    pause. Returns True if the render should be aborted."""
+    while True:
+        ret = progress_func(None, fraction * 100.0, 0, eta)
+        if ret != 2:
+            return ret == 1
+        time.sleep(0.1)
+
+
+def iterate(
+    cflame, camera, hist, nsamples, rng, progress_func=None, offset=0, total=None
+):
+    """Plays the chaos game until nsamples points have been plotted into
+    hist. Returns False if the render was aborted. For a render made of
+    several calls, offset is the number of points plotted before this one
+    and total the number plotted in all, so the progress reported covers
+    the whole render."""
+    if total is None:
+        total = offset + nsamples
+    start = time.time()
+    for plotted, plot_colors, weight, done in chaos_game(cflame, nsamples, rng):
+        index, inside = camera.buckets(plotted)
+        keep = weight[inside] > 0
+        hist.add(
+            index[keep],
+            cflame.colors(plot_colors[inside][keep]),
+            weight[inside][keep],
+        )
+
+        if progress_func is not None:
+            fraction = min(1.0, (offset + done) / float(total))
+            elapsed = time.time() - start
+            eta = max(0.0, elapsed * (total - offset - done) / done)
+            if _report(progress_func, fraction, eta):
+                return False
+    hist.flush()
+    return True
+
+
+def chaos_game(cflame, nsamples, rng):
+    """Plays the chaos game with a batch of points side by side, until
+    nsamples points have been produced. Once the points have settled, yields
+    (points, colors, weight, done) for each batch: the points and color
+    indices after the final xform, the weight they're plotted with (0 for
+    points that escaped) and the number of points produced so far."""
+    n = max(1, min(BATCH_SIZE, nsamples))
+    points = rng.uniform(-1.0, 1.0, (n, 2))
+    colors = rng.random(n)
+    xf_index = numpy.full(n, cflame.transitions.start, dtype=numpy.intp)
+    done = -FUSE * n
+    while done < nsamples:
+        xf_index = cflame.choose_xforms(xf_index, rng)
+        new_points = numpy.empty_like(points)
+        new_colors = numpy.empty_like(colors)
+        for i, xf in enumerate(cflame.xforms):
+            sel = numpy.flatnonzero(xf_index == i)
+            if len(sel):
+                new_points[sel], new_colors[sel] = xf.apply(
+                    points[sel], colors[sel], rng, cflame.scratch
+                )
+        points, colors = new_points, new_colors
+        bad = ~numpy.isfinite(points).all(axis=1) | (abs(points) > BAD_VALUE).any(1)
+        nbad = numpy.count_nonzero(bad)
+        if nbad:
+            points[bad] = rng.uniform(-1.0, 1.0, (nbad, 2))
+            colors[bad] = rng.random(nbad)
+        done += n
+        if done <= 0:
+            continue
+
+        plotted, plot_colors = points, colors
+        weight = cflame.opacity[xf_index]
+        if cflame.final is not None:
+            plotted, plot_colors = cflame.final.apply(
+                points, colors, rng, cflame.scratch
+            )
+            weight = weight * cflame.final.opacity
+        yield plotted, plot_colors, numpy.where(bad, 0.0, weight), done
+
+
+class Accumulation(object):
+    """The histogram of a render, together with everything needed to keep
+    plotting into it. Samples can be added in several steps, and the
+    accumulation buffer taken at any point in between, which is how
+    progressive renders refine the same image instead of starting over.
+    Takes the same keywords as numpy_render."""
+
+    def __init__(
+        self,
+        flame,
+        size,
+        spatial_oversample=1,
+        filter_radius=1,
+        estimator=9,
+        estimator_curve=0.4,
+        estimator_minimum=0,
+        aspect=1.0,
+        fixed_seed=False,
+        **kwds
+    ):
+        width, height = self.size = size
+        if not width or not height:
+            raise ZeroDivisionError("Size passed to render function is 0.")
+        self.oversample = oversample = int(spatial_oversample)
+        self.kernel = gaussian_filter(filter_radius, oversample)
+        gutter = (len(self.kernel) - oversample) // 2
+        self.de = None
+        if estimator > 0:
+            self.de = density_estimator(
+                estimator, estimator_minimum, estimator_curve, oversample
+            )
+            # Density estimation spreads points over the spatial filter's
+            # gutter.
+            gutter += self.de.radius
+
+        self.cflame = CompiledFlame(flame)
+        self.camera = Camera(flame, size, oversample, gutter, aspect)
+        self.hist = Histogram(*self.camera.hist_size)
+        self.rng = numpy.random.default_rng(0 if fixed_seed else None)
+        self.density = 0.0
+        self.nsamples = 0
+
+    def samples(self, quality):
+        """The number of points plotted by a render at quality."""
+        density = quality * self.camera.scale**2
+        return int(density * self.hist.width * self.hist.height / self.oversample**2)
+
+    def iterate(self, quality, progress_func=None, total=None):
+        """Adds points until there are as many as in a render at quality.
+        total is passed on to iterate. Returns False if the render was
+        aborted."""
+        nsamples = self.samples(quality) - self.nsamples
+        if nsamples > 0:
+            with numpy.errstate(all="ignore"):
+                if not iterate(
+                    self.cflame,
+                    self.camera,
+                    self.hist,
+                    nsamples,
+                    self.rng,
+                    progress_func,
+                    self.nsamples,
+                    total,
+                ):
+                    return False
+            self.nsamples += nsamples
+        self.density = quality * self.camera.scale**2
+        return True
+
+    def result(self):
+        """Returns the accumulation buffer for the points plotted so far,
+        which tone_map turns into an image. The histogram isn't modified."""
+        oversample, camera = self.oversample, self.camera
+        # Brightness is left to tone_map.
+        k1 = PREFILTER_WHITE * 268.0 / 256.0
+        k2 = oversample**2 / (camera.area * WHITE_LEVEL * self.density)
+        with numpy.errstate(all="ignore"):
+            if self.de is None:
+                accum = log_scale(self.hist.buckets, k1, k2)
+            else:
+                r = self.de.radius
+                accum = self.de.apply(self.hist.buckets, k1, k2)
+                accum = accum[r : accum.shape[0] - r, r : accum.shape[1] - r]
+        return spatial_filter(accum, self.kernel, oversample, self.size)
+
+
+def accumulate(flame, size, quality, progress_func=None, **kwds):
+    """Iterates a Flame object and returns its accumulation buffer, which
+    tone_map turns into an image. Takes the same arguments as numpy_render,
+    and returns None if the render was aborted."""
+    from fr0stlib import Flame
+
+    if not isinstance(flame, Flame):
+        flame = Flame(flame)
+    acc = Accumulation(flame, size, **kwds)
+    if not acc.iterate(quality, progress_func):
+        return None
+    return acc.result()
+
+
+def numpy_render(
+    flame,
+    size,
+    quality,
+    transparent=0,
+    buffer=None,
+    dtype=numpy.uint8,
+    progress_func=None,
+    passes=1,
+    pass_func=None,
+    **kwds
+):
+    """Renders a Flame object, taking the same arguments as flam3_render.
+    Settings that only make sense for flam3, such as nthreads, are ignored.
+    The image is returned as a (height, width, channels) array of the given
+    dtype: uint8, uint16 or float32 (from 0 to 1).
+
+    With more than one pass, the image is tone mapped and handed to
+    pass_func after each pass but the last, each one stopping at a quarter
+    of the samples of the next. All passes plot into the same histogram,
+    so they cost no more samples than a single render. pass_func gets the
+    output array, which the next pass overwrites.
+
+    If progress_func aborts the render, the image of the last finished pass
+    is returned, or a black one if there wasn't any."""
+    from fr0stlib import Flame
+
+    if not isinstance(flame, Flame):
+        flame = Flame(flame)
+    dtype = numpy.dtype(dtype)
+    width, height = size
+    channels = transparent + 3
+    output = output_array(buffer, (height, width, channels), dtype)
+    acc = Accumulation(flame, size, **kwds)
+    total = acc.samples(quality)
+    for i in reversed(range(passes)):
+        if not acc.iterate(quality / 4.0**i, progress_func, total):
+            if i == passes - 1:
+                output.fill(0)
+            return output
+        if i:
+            tone_map(acc.result(), flame, transparent, output)
+            if pass_func is not None:
+                pass_func(output)
+    return tone_map(acc.result(), flame, transparent, output)
+
+
+def colorhist(flame, nsamples=30000, rng=None):
+    """Returns the fraction of points landing on each of the 256 palette
+    entries, like flam3_colorhist."""
+    if rng is None:
+        rng = numpy.random.default_rng()
+    cflame = CompiledFlame(flame)
+    hist = numpy.zeros(256)
+    with numpy.errstate(all="ignore"):
+        for points, colors, weight, done in chaos_game(cflame, nsamples, rng):
+            index = (numpy.clip(colors, 0.0, 1.0) * 256).astype(int)
+            hist += numpy.bincount(numpy.minimum(index, 255), minlength=256)
+    return hist / max(1.0, hist.sum())
+
+
+def bounding_box(flame, eps=0.1, nsamples=10000, rng=None):
+    """Returns the corners (min, max) of the box holding all but a fraction
+    eps of the points on either side, like flam3_estimate_bounding_box."""
+    if rng is None:
+        rng = numpy.random.default_rng()
+    cflame = CompiledFlame(flame)
+    batches = []
+    with numpy.errstate(all="ignore"):
+        for points, colors, weight, done in chaos_game(cflame, nsamples, rng):
+            batches.append(points[numpy.isfinite(points).all(axis=1)])
+    points = numpy.concatenate(batches)
+    if not len(points):
+        return (0.0, 0.0), (0.0, 0.0)
+    low, high = numpy.quantile(points, (eps, 1.0 - eps), axis=0)
+    return tuple(map(float, low)), tuple(map(float, high))
+
+
+def xform_preview(xform, extent, numvals, depth, rng=None):
+    """Applies xform depth times to a grid of points spanning -extent to
+    extent on both axes, with numvals steps on either side of 0. Returns an
+    (N, 2) array in the same order as flam3_xform_preview."""
+    if rng is None:
+        rng = numpy.random.default_rng()
+    ticks = numpy.arange(-numvals, numvals + 1) * (extent / max(1.0, numvals))
+    x, y = numpy.meshgrid(ticks, ticks, indexing="ij")
+    points = numpy.column_stack((x.ravel(), y.ravel()))
+    colors = numpy.zeros(len(points))
+    cxform = CompiledXform(xform)
+    with numpy.errstate(all="ignore"):
+        for i in range(depth):
+            points, colors = cxform.apply(points, colors, rng)
+    return points
@@ -0,0 +1,168 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""flam3's density estimation, see create_de_filters in filters.c and
+de_thread in rect.c.
+
+Every histogram bucket is log scaled and spread over its neighbours with a
+gaussian kernel, which gets narrower the more points the bucket holds, so
+sparse areas are smoothed while dense detail stays sharp. The kernels are
+worked out once into a bank, with one kernel per density bucket. Buckets
+are handled a tile at a time: they are sorted by their kernel, widest
+first, so the buckets a given kernel offset reaches are always the first
+few. Each offset is then a single vectorized scatter over those."""
+import collections, math
+
+import numpy
+
+from fr0stlib.engine.tonemap import WHITE_LEVEL
+
+# Densities up to this many hits each get their own kernel, above it the
+# kernels are spaced further apart.
+DE_THRESH = 100
+# flam3 refuses to build more kernels than this.
+MAX_FILTERS = 1e7
+# Support of the gaussian kernels.
+GAUSSIAN_SUPPORT = 1.5
+# Roughly the number of buckets handled in one go.
+TILE_SIZE = 1 << 16
+# Number of kernel banks kept around.
+CACHE_SIZE = 8
+
+_estimators = collections.OrderedDict()
+
+
+class DensityEstimator(object):
+    """A bank of density estimation kernels for the given estimator
+    radius, minimum radius and curve, at the given oversampling."""
+
+    def __init__(self, max_radius, min_radius=0, curve=0.4, oversample=1):
+        if curve <= 0:
+            raise ValueError("Estimator curve must be positive.")
+        if min_radius > max_radius:
+            raise ValueError("Estimator minimum can't exceed the radius.")
+        comp_max = max_radius * oversample + 1.0
+        comp_min = min_radius * oversample + 1.0
+        if (comp_max / comp_min) ** (1.0 / curve) > MAX_FILTERS:
+            raise ValueError("Too many density estimation filters.")
+        self.curve = curve
+        self.oversample = oversample
+
+        widths = []
+        while True:
+            i = len(widths)
+            if i >= DE_THRESH:
+                i = (i - DE_THRESH) ** (1.0 / curve) + DE_THRESH
+            width = comp_max / (i + 1.0) ** curve
+            if width <= comp_min:
+                widths.append(comp_min)
+                break
+            widths.append(width)
+        self.widths = numpy.array(widths)
+
+        # Offsets are sorted by their distance from the center, which the
+        # kernels reach in order, widest first.
+        self.radius = half = int(math.ceil(comp_max))
+        dy, dx = numpy.mgrid[-half : half + 1, -half : half + 1]
+        dist = numpy.sqrt(dy * dy + dx * dx).ravel()
+        order = numpy.argsort(dist, kind="stable")
+        self.offsets = dy.ravel()[order], dx.ravel()[order]
+        d = dist[order] / self.widths[:, None]
+        inside = d <= 1.0
+        bank = numpy.where(inside, numpy.exp(-2.0 * (GAUSSIAN_SUPPORT * d) ** 2), 0)
+        self.kernels = bank / bank.sum(axis=1)[:, None]
+        # The number of kernels, counting from the widest, that reach each
+        # offset.
+        self.reach = inside.sum(axis=0)
+
+    def select(self, counts):
+        """Returns the index of the kernel used for buckets holding the
+        given number of hits, which must be positive."""
+        above = numpy.maximum(counts - DE_THRESH, 0.0)
+        index = numpy.where(
+            counts <= DE_THRESH,
+            numpy.ceil(counts) - 1,
+            DE_THRESH + numpy.floor(numpy.power(above, self.curve)),
+        )
+        return numpy.clip(index, 0, len(self.widths) - 1).astype(numpy.intp)
+
+    def counts(self, buckets):
+        """The hits that decide each bucket's kernel. With oversampling,
+        those of the whole oversample x oversample block are added up."""
+        hits = buckets[..., 3] / WHITE_LEVEL
+        ss = self.oversample
+        if ss <= 1:
+            return hits
+        height, width = hits.shape
+        padded = numpy.zeros((height + ss - 1, width + ss - 1))
+        padded[:height, :width] = hits
+        out = numpy.zeros_like(hits)
+        for i in range(ss):
+            for j in range(ss):
+                out += padded[i : i + height, j : j + width]
+        return out
+
+    def apply(self, buckets, k1, k2):
+        """Log scales the buckets as log_scale does, and spreads each over
+        its kernel. Returns a new array of the same shape. What spreads past
+        the edges is lost, so the histogram needs a gutter of radius."""
+        height, width = buckets.shape[:2]
+        r = self.radius
+        stride = width + 2 * r
+        out = numpy.zeros((height + 2 * r, stride, 4))
+        flat = out.reshape(-1, 4)
+        counts = self.counts(buckets)
+        dy, dx = self.offsets
+        shifts = dy * stride + dx
+        rows = max(1, TILE_SIZE // width)
+        for start in range(0, height, rows):
+            tile = buckets[start : start + rows]
+            ys, xs = numpy.nonzero(tile[..., 3] > 0)
+            if not len(ys):
+                continue
+            index = self.select(counts[start : start + rows][ys, xs])
+            order = numpy.argsort(index, kind="stable")
+            ys, xs, index = ys[order], xs[order], index[order]
+            c = tile[ys, xs]
+            ls = k1 * numpy.log1p(c[:, 3] * k2) / c[:, 3]
+            values = c * ls[:, None]
+            src = (ys + start + r) * stride + xs + r
+            for j, reach in enumerate(self.reach):
+                n = numpy.searchsorted(index, reach)
+                if not n:
+                    break
+                coefs = self.kernels[index[:n], j]
+                flat[src[:n] + shifts[j]] += coefs[:, None] * values[:n]
+        return out[r : r + height, r : r + width]
+
+
+def density_estimator(max_radius, min_radius=0, curve=0.4, oversample=1):
+    """Returns a DensityEstimator, reusing the kernel bank of an earlier call
+    with the same settings."""
+    key = float(max_radius), float(min_radius), float(curve), int(oversample)
+    de = _estimators.get(key)
+    if de is None:
+        de = _estimators[key] = DensityEstimator(*key)
+        while len(_estimators) > CACHE_SIZE:
+            _estimators.popitem(last=False)
+    else:
+        _estimators.move_to_end(key)
+    return de
@@ -0,0 +1,104 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Picks the next xform for a whole batch of points at once.
+
+The weights and chaos values of a flame are turned into a transition table:
+row i holds the cumulative distribution of the xform that follows xform i,
+and an extra last row the distribution of the first pick, which only goes by
+the weights. Each row is shifted up by its index, so the table can be
+flattened and searched in one go, with the previous xform's index added to
+the uniform draws."""
+import collections
+
+import numpy
+
+# Number of tables kept around, keyed on the weights and chaos they were
+# built from.
+CACHE_SIZE = 16
+
+_tables = collections.OrderedDict()
+
+
+class TransitionTable(object):
+    """The cumulative distributions of the xform chosen next, for each
+    xform it's chosen after."""
+
+    def __init__(self, weights, chaos=None):
+        weights = numpy.asarray(weights, dtype=float)
+        n = len(weights)
+        if not weights.sum() > 0:
+            raise ValueError("The flame has no xforms with a weight.")
+        if chaos is None:
+            chaos = numpy.ones((n, n))
+        chaos = numpy.asarray(chaos, dtype=float).reshape(n, n)
+        self.size = n
+        self.start = n
+        self.chaos = bool((chaos != 1.0).any())
+
+        probs = numpy.empty((n + 1, n))
+        probs[:n] = weights * chaos
+        probs[n] = weights
+        # Chaos can rule out every xform, flam3 falls back to the weights.
+        probs[probs.sum(axis=1) == 0] = weights
+        self.cdf = numpy.cumsum(probs, axis=1) / probs.sum(axis=1)[:, None]
+        self._flat = (self.cdf + numpy.arange(n + 1)[:, None]).ravel()
+
+    def choose(self, prev, rng):
+        """Picks the next xform for each point, given the index of the last
+        one. Pass start as the index for points that have none yet."""
+        prev = numpy.asarray(prev, dtype=numpy.intp)
+        n = self.size
+        u = rng.random(len(prev))
+        if not self.chaos:
+            out = numpy.searchsorted(self.cdf[n], u, side="right")
+        else:
+            u += prev
+            out = numpy.searchsorted(self._flat, u, side="right")
+            out -= prev * n
+        # u can round up to the end of a row.
+        return numpy.minimum(out, n - 1, out=out)
+
+
+def flame_key(flame):
+    """The weights and chaos matrix of a flame, as a hashable key."""
+    xforms = flame.xform
+    weights = tuple(float(x.weight) for x in xforms)
+    chaos = tuple(
+        tuple(x._chaos) if x._chaos is not None else (1.0,) * len(xforms)
+        for x in xforms
+    )
+    return weights, chaos
+
+
+def transition_table(flame):
+    """Returns the transition table of a flame. Tables are cached, so one is
+    only built again when the weights or chaos have changed."""
+    key = flame_key(flame)
+    table = _tables.get(key)
+    if table is None:
+        weights, chaos = key
+        table = _tables[key] = TransitionTable(weights, chaos)
+        while len(_tables) > CACHE_SIZE:
+            _tables.popitem(last=False)
+    else:
+        _tables.move_to_end(key)
+    return table
@@ -0,0 +1,138 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Turns an accumulation buffer into an image, following flam3's rect.c.
+
+The buffer holds the filtered rgb values and the density of each pixel, as
+an (height, width, 4) array. It's log scaled with a brightness of 1, and
+brightness is applied here, since it only scales the buffer. That way a
+buffer can be toned again with different brightness, gamma, vibrancy,
+highlight power or background without iterating the flame again. The image
+is worked out a few rows at a time, so the temporary arrays stay small no
+matter the image size."""
+import numpy
+
+# The white levels flam3 works with, see rect.c.
+PREFILTER_WHITE = 255.0
+WHITE_LEVEL = 255.0
+# Roughly the number of pixels toned in one go.
+CHUNK_SIZE = 1 << 16
+
+
+def calc_alpha(density, gamma, linrange):
+    """flam3's gamma curve, which is linear below linrange."""
+    alpha = numpy.power(density, gamma)
+    low = density < linrange
+    frac = density[low] / linrange
+    funcval = linrange**gamma
+    alpha[low] = (1.0 - frac) * density[low] * (funcval / linrange) + (
+        frac * alpha[low]
+    )
+    return alpha
+
+
+def calc_newrgb(rgb, ls, highpow):
+    """Scales the colors by ls, as flam3's calc_newrgb. Where a channel
+    goes past white and highpow isn't negative, the color is instead scaled
+    until its brightest channel is white and then desaturated, so the hue
+    doesn't shift. A negative highpow blends the scale that makes the
+    brightest channel white with ls, leaving ls alone from -1 down."""
+    out = rgb * ls[..., None]
+    if highpow <= -1:
+        return out
+    maxc = rgb.max(axis=-1)
+    over = ls * maxc > 255.0
+    if not over.any():
+        return out
+    c = rgb[over]
+    newls = 255.0 / maxc[over]
+    if highpow < 0:
+        adjhlp = -highpow
+        out[over] = c * ((1.0 - adjhlp) * newls + adjhlp * ls[over])[:, None]
+        return out
+    lsratio = numpy.power(newls / ls[over], highpow)
+    full = c * newls[:, None]
+    # Keeping hue and value, each channel is linear in the saturation, so
+    # scaling the saturation is the same as moving the channels towards
+    # the value (white in this case). This skips flam3's trip through hsv.
+    out[over] = 255.0 - (255.0 - full) * lsratio[:, None]
+    return out
+
+
+def _tone_chunk(t, brightness, g, linrange, vibrancy, highpow, background):
+    """Tones a flat (n, 4) piece of the buffer. Returns the rgb values from
+    0 to 255 and the alpha from 0 to 1. background is None for transparent
+    images."""
+    density = t[:, 3] * (brightness / PREFILTER_WHITE)
+    alpha = calc_alpha(density, g, linrange)
+    ls = numpy.zeros_like(density)
+    hit = density > 0
+    ls[hit] = vibrancy * 256.0 * alpha[hit] / density[hit]
+    alpha = numpy.clip(alpha, 0.0, 1.0, out=alpha)
+    rgb = t[:, :3] * (brightness / PREFILTER_WHITE)
+    out = calc_newrgb(rgb, ls, highpow)
+    if vibrancy != 1:
+        out += (1.0 - vibrancy) * 256.0 * numpy.power(rgb, g)
+    if background is None:
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            out = numpy.where(alpha[:, None] > 0, out / alpha[:, None], 0.0)
+    else:
+        out += (1.0 - alpha)[:, None] * background
+    return numpy.clip(out, 0.0, 255.0, out=out), alpha
+
+
+def tone_map(accum, flame, transparent=0, output=None, dtype=numpy.uint8):
+    """Applies brightness, gamma, vibrancy, highlight power and the
+    background of flame to the accumulation buffer. Writes the image into
+    output if given, and returns it. dtype can be uint8, uint16 or float32
+    (from 0 to 1)."""
+    dtype = numpy.dtype(output.dtype if output is not None else dtype)
+    height, width = accum.shape[:2]
+    if output is None:
+        output = numpy.empty((height, width, 3 + bool(transparent)), dtype)
+    if dtype.kind == "f":
+        scale = 1.0 / 255.0
+    else:
+        scale = numpy.iinfo(dtype).max / 255.0
+
+    if transparent:
+        background = None
+    else:
+        background = numpy.asarray(flame.background, dtype=float) * WHITE_LEVEL
+    args = (
+        flame.brightness,
+        1.0 / flame.gamma,
+        flame.gamma_threshold,
+        flame.vibrancy,
+        getattr(flame, "highlight_power", -1),
+        background,
+    )
+    rows = max(1, CHUNK_SIZE // width)
+    with numpy.errstate(all="ignore"):
+        for start in range(0, height, rows):
+            chunk = slice(start, start + rows)
+            t = accum[chunk].reshape(-1, 4)
+            rgb, alpha = _tone_chunk(t, *args)
+            shape = len(t) // width, width
+            output[chunk][..., :3] = (rgb * scale).reshape(shape + (3,))
+            if transparent:
+                output[chunk][..., 3] = (alpha * (255.0 * scale)).reshape(shape)
+    return output
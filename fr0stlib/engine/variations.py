@@ -0,0 +1,1070 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Numpy kernels for every variation in variation_list, following flam3's
+variations.c.
+
+A kernel is called as kernel(p, out, weight, **params), where p is the
+Precalc of a batch of affine-transformed points, out the (N, 2) array the
+result is added to in place, and params the variables the variation takes,
+named as in pyflam3.variables (e.g. power and dist for julian). Kernels are
+registered by name in kernels, and compose() fuses the active variations of
+an xform into one evaluation."""
+import math
+
+import numpy
+from numpy import pi, sqrt, arctan2, where
+
+from fr0stlib.pyflam3.variations import variable_list, variation_list
+
+EPS = 1e-10
+
+kernels = {}
+
+# Variations that change the point the others see, instead of adding to the
+# result. They run first.
+PRE_VARIATIONS = set(("pre_blur",))
+
+# flam3's values for variables an xform doesn't set, see initialize_xforms.
+DEFAULTS = {
+    "blob_waves": 1.0,
+    "blob_high": 1.0,
+    "julian_power": 1.0,
+    "julian_dist": 1.0,
+    "juliascope_power": 1.0,
+    "juliascope_dist": 1.0,
+    "pie_slices": 6.0,
+    "pie_thickness": 0.5,
+    "ngon_sides": 5.0,
+    "ngon_power": 3.0,
+    "ngon_circle": 1.0,
+    "ngon_corners": 2.0,
+    "curl_c1": 1.0,
+    "rectangles_x": 1.0,
+    "rectangles_y": 1.0,
+    "super_shape_n1": 1.0,
+    "super_shape_n2": 1.0,
+    "super_shape_n3": 1.0,
+    "conic_eccentricity": 1.0,
+    "bent2_x": 1.0,
+    "bent2_y": 1.0,
+    "cell_size": 1.0,
+    "cpow_r": 1.0,
+    "cpow_power": 1.0,
+    "curve_xlength": 1.0,
+    "curve_ylength": 1.0,
+    "oscilloscope_separation": 1.0,
+    "oscilloscope_frequency": pi,
+    "oscilloscope_amplitude": 1.0,
+    "wedge_count": 1.0,
+    "wedge_julia_count": 1.0,
+    "wedge_julia_power": 1.0,
+    "wedge_sph_count": 1.0,
+    "auger_weight": 0.5,
+    "auger_freq": 5.0,
+    "auger_scale": 0.1,
+}
+
+
+def kernel(func):
+    kernels[func.__name__] = func
+    return func
+
+
+def flam3_coefs(xform):
+    """Returns the affine coefficients of an xform (or post xform) as
+    (a, b, c, d, e, f), with x' = a*x + b*y + c and y' = d*x + e*y + f in
+    flam3's orientation. fr0st stores b, d and f with the y axis flipped,
+    and negates them on the way to flam3, as in Xform.to_string."""
+    return xform.a, -xform.b, xform.c, -xform.d, xform.e, -xform.f
+
+
+class Scratch(object):
+    """Work arrays kept from one batch to the next, so the kernels don't
+    allocate new ones every time. Arrays are handed out by key, and grown
+    when a larger batch comes along."""
+
+    def __init__(self):
+        self._arrays = {}
+
+    def get(self, key, n):
+        a = self._arrays.get(key)
+        if a is None or len(a) < n:
+            a = self._arrays[key] = numpy.empty(max(n, 1))
+        return a[:n]
+
+
+class Precalc(object):
+    """A batch of affine-transformed points, together with the values
+    derived from them that many variations share, as flam3's precalc_*
+    fields. These are only worked out when first used, and live in scratch
+    arrays."""
+
+    _derived = "sumsq", "sqrt", "atan", "atanyx", "sina", "cosa"
+
+    def __init__(self, x, y, coefs=(1, 0, 0, 0, 1, 0), rng=None, scratch=None):
+        self.x = x
+        self.y = y
+        self.n = len(x)
+        self.coefs = coefs
+        self.rng = rng if rng is not None else numpy.random.default_rng()
+        self.scratch = scratch if scratch is not None else Scratch()
+
+    def tmp(self, key):
+        """Returns a scratch array for the batch."""
+        return self.scratch.get(key, self.n)
+
+    def random(self, key="random"):
+        """Returns uniform random numbers from 0 to 1 for the batch."""
+        return self.rng.random(out=self.tmp(key))
+
+    def moved(self):
+        """Forgets the derived values after the points were changed."""
+        for name in self._derived:
+            self.__dict__.pop(name, None)
+
+    def __getattr__(self, name):
+        if name not in self._derived:
+            raise AttributeError(name)
+        out = self.tmp(name)
+        x, y = self.x, self.y
+        if name == "sumsq":
+            numpy.multiply(x, x, out=out)
+            out += y * y
+        elif name == "sqrt":
+            numpy.sqrt(self.sumsq, out=out)
+        elif name == "atan":
+            numpy.arctan2(x, y, out=out)
+        elif name == "atanyx":
+            numpy.arctan2(y, x, out=out)
+        elif name == "sina":
+            numpy.divide(x, self.sqrt, out=out)
+        else:
+            numpy.divide(y, self.sqrt, out=out)
+        self.__dict__[name] = out
+        return out
+
+
+def _add(out, dx, dy):
+    out[:, 0] += dx
+    out[:, 1] += dy
+
+
+def _gaussian(p, w):
+    """flam3's pseudo-gaussian: the sum of 4 uniform numbers, centered."""
+    g = p.random("gauss")
+    for i in range(3):
+        g += p.random()
+    g -= 2.0
+    g *= w
+    return g
+
+
+# -----------------------------------------------------------------------------
+# Variations without parameters.
+
+
+@kernel
+def linear(p, out, w):
+    _add(out, w * p.x, w * p.y)
+
+
+@kernel
+def sinusoidal(p, out, w):
+    _add(out, w * numpy.sin(p.x), w * numpy.sin(p.y))
+
+
+@kernel
+def spherical(p, out, w):
+    r = numpy.add(p.sumsq, EPS, out=p.tmp("r"))
+    numpy.divide(w, r, out=r)
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def swirl(p, out, w):
+    c1, c2 = numpy.sin(p.sumsq), numpy.cos(p.sumsq)
+    _add(out, w * (c1 * p.x - c2 * p.y), w * (c2 * p.x + c1 * p.y))
+
+
+@kernel
+def horseshoe(p, out, w):
+    r = w / (p.sqrt + EPS)
+    _add(out, (p.x - p.y) * (p.x + p.y) * r, 2.0 * p.x * p.y * r)
+
+
+@kernel
+def polar(p, out, w):
+    _add(out, w / pi * p.atan, w * (p.sqrt - 1.0))
+
+
+@kernel
+def handkerchief(p, out, w):
+    a, r = p.atan, p.sqrt
+    _add(out, w * r * numpy.sin(a + r), w * r * numpy.cos(a - r))
+
+
+@kernel
+def heart(p, out, w):
+    a = p.sqrt * p.atan
+    r = w * p.sqrt
+    _add(out, r * numpy.sin(a), -r * numpy.cos(a))
+
+
+@kernel
+def disc(p, out, w):
+    a = p.atan / pi
+    r = pi * p.sqrt
+    _add(out, w * numpy.sin(r) * a, w * numpy.cos(r) * a)
+
+
+@kernel
+def spiral(p, out, w):
+    r = p.sqrt + EPS
+    r1 = w / r
+    _add(out, r1 * (p.cosa + numpy.sin(r)), r1 * (p.sina - numpy.cos(r)))
+
+
+@kernel
+def hyperbolic(p, out, w):
+    r = p.sqrt + EPS
+    _add(out, w * p.sina / r, w * p.cosa * r)
+
+
+@kernel
+def diamond(p, out, w):
+    r = p.sqrt
+    _add(out, w * p.sina * numpy.cos(r), w * p.cosa * numpy.sin(r))
+
+
+@kernel
+def ex(p, out, w):
+    a, r = p.atan, p.sqrt
+    m0 = numpy.sin(a + r) ** 3 * r
+    m1 = numpy.cos(a - r) ** 3 * r
+    _add(out, w * (m0 + m1), w * (m0 - m1))
+
+
+@kernel
+def julia(p, out, w):
+    a = 0.5 * p.atan
+    a += pi * (p.random() < 0.5)
+    r = w * sqrt(p.sqrt)
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def bent(p, out, w):
+    x = where(p.x < 0, 2.0 * p.x, p.x)
+    y = where(p.y < 0, 0.5 * p.y, p.y)
+    _add(out, w * x, w * y)
+
+
+@kernel
+def waves(p, out, w):
+    a, b, c, d, e, f = p.coefs
+    dx2 = 1.0 / (c * c + EPS)
+    dy2 = 1.0 / (f * f + EPS)
+    dx = p.x + b * numpy.sin(p.y * dx2)
+    dy = p.y + e * numpy.sin(p.x * dy2)
+    _add(out, w * dx, w * dy)
+
+
+@kernel
+def fisheye(p, out, w):
+    # flam3 swaps x and y here.
+    r = 2.0 * w / (p.sqrt + 1.0)
+    _add(out, r * p.y, r * p.x)
+
+
+@kernel
+def popcorn(p, out, w):
+    c, f = p.coefs[2], p.coefs[5]
+    dx = numpy.tan(3.0 * p.y)
+    dy = numpy.tan(3.0 * p.x)
+    _add(out, w * (p.x + c * numpy.sin(dx)), w * (p.y + f * numpy.sin(dy)))
+
+
+@kernel
+def exponential(p, out, w):
+    dx = w * numpy.exp(p.x - 1.0)
+    dy = pi * p.y
+    _add(out, dx * numpy.cos(dy), dx * numpy.sin(dy))
+
+
+@kernel
+def power(p, out, w):
+    r = w * p.sqrt**p.sina
+    _add(out, r * p.cosa, r * p.sina)
+
+
+@kernel
+def cosine(p, out, w):
+    a = p.x * pi
+    _add(out, w * numpy.cos(a) * numpy.cosh(p.y), -w * numpy.sin(a) * numpy.sinh(p.y))
+
+
+@kernel
+def rings(p, out, w):
+    c = p.coefs[2]
+    dx = c * c + EPS
+    r = p.sqrt
+    r = w * (numpy.fmod(r + dx, 2 * dx) - dx + r * (1.0 - dx))
+    _add(out, r * p.cosa, r * p.sina)
+
+
+@kernel
+def fan(p, out, w):
+    c, f = p.coefs[2], p.coefs[5]
+    dx = pi * (c * c + EPS)
+    dx2 = 0.5 * dx
+    a = p.atan
+    a = a + where(numpy.fmod(a + f, dx) > dx2, -dx2, dx2)
+    r = w * p.sqrt
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def eyefish(p, out, w):
+    r = 2.0 * w / (p.sqrt + 1.0)
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def bubble(p, out, w):
+    r = w / (0.25 * p.sumsq + 1.0)
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def cylinder(p, out, w):
+    _add(out, w * numpy.sin(p.x), w * p.y)
+
+
+@kernel
+def noise(p, out, w):
+    a = p.random("a") * (2 * pi)
+    r = w * p.random()
+    _add(out, p.x * r * numpy.cos(a), p.y * r * numpy.sin(a))
+
+
+@kernel
+def blur(p, out, w):
+    a = p.random("a") * (2 * pi)
+    r = w * p.random()
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def gaussian_blur(p, out, w):
+    a = p.random("a") * (2 * pi)
+    r = _gaussian(p, w)
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def arch(p, out, w):
+    a = p.random() * (w * pi)
+    s = numpy.sin(a)
+    _add(out, w * s, w * s * s / numpy.cos(a))
+
+
+@kernel
+def tangent(p, out, w):
+    _add(out, w * numpy.sin(p.x) / numpy.cos(p.y), w * numpy.tan(p.y))
+
+
+@kernel
+def square(p, out, w):
+    _add(out, w * (p.random("a") - 0.5), w * (p.random() - 0.5))
+
+
+@kernel
+def rays(p, out, w):
+    a = p.random() * (w * pi)
+    r = w / (p.sumsq + EPS)
+    t = w * numpy.tan(a) * r
+    _add(out, t * numpy.cos(p.x), t * numpy.sin(p.y))
+
+
+@kernel
+def blade(p, out, w):
+    r = p.random() * w * p.sqrt
+    s, c = numpy.sin(r), numpy.cos(r)
+    _add(out, w * p.x * (c + s), w * p.x * (c - s))
+
+
+@kernel
+def secant2(p, out, w):
+    c = numpy.cos(w * p.sqrt)
+    icr = 1.0 / c
+    _add(out, w * p.x, w * where(c < 0, icr + 1.0, icr - 1.0))
+
+
+@kernel
+def twintrian(p, out, w):
+    r = p.random() * w * p.sqrt
+    s, c = numpy.sin(r), numpy.cos(r)
+    diff = numpy.log10(s * s) + c
+    diff[~numpy.isfinite(diff)] = -30.0
+    _add(out, w * p.x * diff, w * p.x * (diff - s * pi))
+
+
+@kernel
+def cross(p, out, w):
+    s = p.x * p.x - p.y * p.y
+    r = w * sqrt(1.0 / (s * s + EPS))
+    _add(out, p.x * r, p.y * r)
+
+
+@kernel
+def butterfly(p, out, w):
+    wx = w * 1.3029400317411197908970256609023
+    y2 = 2.0 * p.y
+    r = wx * sqrt(abs(p.y * p.x) / (EPS + p.x * p.x + y2 * y2))
+    _add(out, r * p.x, r * y2)
+
+
+@kernel
+def edisc(p, out, w):
+    tmp = p.sumsq + 1.0
+    tmp2 = 2.0 * p.x
+    xmax = (sqrt(tmp + tmp2) + sqrt(tmp - tmp2)) * 0.5
+    a1 = numpy.log(xmax + sqrt(xmax - 1.0))
+    a2 = -numpy.arccos(p.x / xmax)
+    w = w / 11.57034632
+    snv = where(p.y > 0, -numpy.sin(a1), numpy.sin(a1))
+    _add(out, w * numpy.cosh(a2) * numpy.cos(a1), w * numpy.sinh(a2) * snv)
+
+
+@kernel
+def elliptic(p, out, w):
+    tmp = p.sumsq + 1.0
+    x2 = 2.0 * p.x
+    xmax = 0.5 * (sqrt(tmp + x2) + sqrt(tmp - x2))
+    a = p.x / xmax
+    b = sqrt(numpy.maximum(1.0 - a * a, 0.0))
+    ssx = sqrt(numpy.maximum(xmax - 1.0, 0.0))
+    w = w / (pi / 2)
+    y = w * numpy.log(xmax + ssx)
+    _add(out, w * arctan2(a, b), where(p.y > 0, y, -y))
+
+
+@kernel
+def foci(p, out, w):
+    expx = numpy.exp(p.x) * 0.5
+    expnx = 0.25 / expx
+    s, c = numpy.sin(p.y), numpy.cos(p.y)
+    t = w / (expx + expnx - c)
+    _add(out, t * (expx - expnx), t * s)
+
+
+@kernel
+def loonie(p, out, w):
+    r2 = p.sumsq
+    w2 = w * w
+    r = where(r2 < w2, w * sqrt(w2 / r2 - 1.0), w)
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def pre_blur(p, out, w):
+    a = p.random("a") * (2 * pi)
+    g = _gaussian(p, w)
+    p.x += g * numpy.cos(a)
+    p.y += g * numpy.sin(a)
+    p.moved()
+
+
+@kernel
+def polar2(p, out, w):
+    v = w / pi
+    _add(out, v * p.atan, 0.5 * v * numpy.log(p.sumsq))
+
+
+@kernel
+def exp(p, out, w):
+    e = w * numpy.exp(p.x)
+    _add(out, e * numpy.cos(p.y), e * numpy.sin(p.y))
+
+
+@kernel
+def log(p, out, w):
+    _add(out, w * 0.5 * numpy.log(p.sumsq), w * p.atanyx)
+
+
+@kernel
+def sin(p, out, w):
+    x, y = p.x, p.y
+    _add(out, w * numpy.sin(x) * numpy.cosh(y), w * numpy.cos(x) * numpy.sinh(y))
+
+
+@kernel
+def cos(p, out, w):
+    x, y = p.x, p.y
+    _add(out, w * numpy.cos(x) * numpy.cosh(y), -w * numpy.sin(x) * numpy.sinh(y))
+
+
+@kernel
+def tan(p, out, w):
+    den = w / (numpy.cos(2 * p.x) + numpy.cosh(2 * p.y))
+    _add(out, den * numpy.sin(2 * p.x), den * numpy.sinh(2 * p.y))
+
+
+@kernel
+def sec(p, out, w):
+    x, y = p.x, p.y
+    den = 2.0 * w / (numpy.cos(2 * x) + numpy.cosh(2 * y))
+    _add(out, den * numpy.cos(x) * numpy.cosh(y), den * numpy.sin(x) * numpy.sinh(y))
+
+
+@kernel
+def csc(p, out, w):
+    x, y = p.x, p.y
+    den = 2.0 * w / (numpy.cosh(2 * y) - numpy.cos(2 * x))
+    _add(out, den * numpy.sin(x) * numpy.cosh(y), -den * numpy.cos(x) * numpy.sinh(y))
+
+
+@kernel
+def cot(p, out, w):
+    den = w / (numpy.cosh(2 * p.y) - numpy.cos(2 * p.x))
+    _add(out, den * numpy.sin(2 * p.x), -den * numpy.sinh(2 * p.y))
+
+
+@kernel
+def sinh(p, out, w):
+    x, y = p.x, p.y
+    _add(out, w * numpy.sinh(x) * numpy.cos(y), w * numpy.cosh(x) * numpy.sin(y))
+
+
+@kernel
+def cosh(p, out, w):
+    x, y = p.x, p.y
+    _add(out, w * numpy.cosh(x) * numpy.cos(y), w * numpy.sinh(x) * numpy.sin(y))
+
+
+@kernel
+def tanh(p, out, w):
+    den = w / (numpy.cos(2 * p.y) + numpy.cosh(2 * p.x))
+    _add(out, den * numpy.sinh(2 * p.x), den * numpy.sin(2 * p.y))
+
+
+@kernel
+def sech(p, out, w):
+    x, y = p.x, p.y
+    den = 2.0 * w / (numpy.cos(2 * y) + numpy.cosh(2 * x))
+    _add(out, den * numpy.cos(y) * numpy.cosh(x), -den * numpy.sin(y) * numpy.sinh(x))
+
+
+@kernel
+def csch(p, out, w):
+    x, y = p.x, p.y
+    den = 2.0 * w / (numpy.cosh(2 * x) - numpy.cos(2 * y))
+    _add(out, den * numpy.sinh(x) * numpy.cos(y), -den * numpy.cosh(x) * numpy.sin(y))
+
+
+@kernel
+def coth(p, out, w):
+    den = w / (numpy.cosh(2 * p.x) - numpy.cos(2 * p.y))
+    _add(out, den * numpy.sinh(2 * p.x), den * numpy.sin(2 * p.y))
+
+
+# -----------------------------------------------------------------------------
+# Variations with parameters.
+
+
+@kernel
+def blob(p, out, w, low, high, waves):
+    r = p.sqrt * (low + (high - low) * (0.5 + 0.5 * numpy.sin(waves * p.atan)))
+    _add(out, w * p.sina * r, w * p.cosa * r)
+
+
+@kernel
+def pdj(p, out, w, a, b, c, d):
+    nx1 = numpy.cos(b * p.x)
+    nx2 = numpy.sin(c * p.x)
+    ny1 = numpy.sin(a * p.y)
+    ny2 = numpy.cos(d * p.y)
+    _add(out, w * (ny1 - nx1), w * (nx2 - ny2))
+
+
+@kernel
+def fan2(p, out, w, x, y):
+    dx = pi * (x * x + EPS)
+    dx2 = 0.5 * dx
+    a = p.atan
+    t = a + y - dx * numpy.trunc((a + y) / dx)
+    a = where(t > dx2, a - dx2, a + dx2)
+    r = w * p.sqrt
+    _add(out, r * numpy.sin(a), r * numpy.cos(a))
+
+
+@kernel
+def rings2(p, out, w, val):
+    dx = val * val + EPS
+    r = p.sqrt
+    r = r - 2.0 * dx * numpy.trunc((r + dx) / (2.0 * dx)) + r * (1.0 - dx)
+    _add(out, w * p.sina * r, w * p.cosa * r)
+
+
+@kernel
+def perspective(p, out, w, angle, dist):
+    ang = angle * pi / 2.0
+    vsin = math.sin(ang)
+    vfcos = dist * math.cos(ang)
+    t = 1.0 / (dist - p.y * vsin)
+    _add(out, w * dist * p.x * t, w * vfcos * p.y * t)
+
+
+@kernel
+def julian(p, out, w, power, dist):
+    rn = abs(power)
+    cn = dist / power / 2.0
+    t = numpy.trunc(rn * p.random())
+    a = (p.atanyx + 2 * pi * t) / power
+    r = w * p.sumsq**cn
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def juliascope(p, out, w, power, dist):
+    rn = abs(power)
+    cn = dist / power / 2.0
+    t = numpy.trunc(rn * p.random())
+    # Every other branch is mirrored.
+    sign = where(t % 2 == 0, 1.0, -1.0)
+    a = (2 * pi * t + sign * p.atanyx) / power
+    r = w * p.sumsq**cn
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def radial_blur(p, out, w, angle):
+    spin = math.sin(angle * pi / 2)
+    zoom = math.cos(angle * pi / 2)
+    g = _gaussian(p, w)
+    a = p.atanyx + spin * g
+    rz = zoom * g - 1.0
+    ra = p.sqrt
+    _add(out, ra * numpy.cos(a) + rz * p.x, ra * numpy.sin(a) + rz * p.y)
+
+
+@kernel
+def pie(p, out, w, slices, rotation, thickness):
+    sl = numpy.trunc(p.random("a") * slices + 0.5)
+    a = rotation + 2.0 * pi * (sl + p.random("b") * thickness) / slices
+    r = w * p.random()
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def ngon(p, out, w, sides, power, circle, corners):
+    r_factor = p.sumsq ** (power / 2.0)
+    b = 2 * pi / sides
+    phi = p.atanyx - b * numpy.floor(p.atanyx / b)
+    phi = where(phi > b / 2, phi - b, phi)
+    amp = corners * (1.0 / (numpy.cos(phi) + EPS) - 1.0) + circle
+    amp /= r_factor + EPS
+    _add(out, w * p.x * amp, w * p.y * amp)
+
+
+@kernel
+def curl(p, out, w, c1, c2):
+    re = 1.0 + c1 * p.x + c2 * (p.x * p.x - p.y * p.y)
+    im = c1 * p.y + 2.0 * c2 * p.x * p.y
+    r = w / (re * re + im * im)
+    _add(out, (p.x * re + p.y * im) * r, (p.y * re - p.x * im) * r)
+
+
+@kernel
+def rectangles(p, out, w, x, y):
+    if x == 0:
+        dx = w * p.x
+    else:
+        dx = w * ((2 * numpy.floor(p.x / x) + 1) * x - p.x)
+    if y == 0:
+        dy = w * p.y
+    else:
+        dy = w * ((2 * numpy.floor(p.y / y) + 1) * y - p.y)
+    _add(out, dx, dy)
+
+
+@kernel
+def disc2(p, out, w, rot, twist):
+    timespi = rot * pi
+    sinadd, cosadd = math.sin(twist), math.cos(twist) - 1.0
+    if twist > 2 * pi:
+        k = 1.0 + twist - 2 * pi
+        cosadd *= k
+        sinadd *= k
+    if twist < -2 * pi:
+        k = 1.0 + twist + 2 * pi
+        cosadd *= k
+        sinadd *= k
+    t = timespi * (p.x + p.y)
+    r = w * p.atan / pi
+    _add(out, (numpy.sin(t) + cosadd) * r, (numpy.cos(t) + sinadd) * r)
+
+
+@kernel
+def super_shape(p, out, w, rnd, m, n1, n2, n3, holes):
+    theta = m / 4.0 * p.atanyx + pi / 4
+    t1 = abs(numpy.cos(theta)) ** n2
+    t2 = abs(numpy.sin(theta)) ** n3
+    r = w * ((rnd * p.random() + (1.0 - rnd) * p.sqrt) - holes)
+    r *= (t1 + t2) ** (-1.0 / n1) / p.sqrt
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def flower(p, out, w, petals, holes):
+    r = w * (p.random() - holes) * numpy.cos(petals * p.atanyx) / p.sqrt
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def conic(p, out, w, eccentricity, holes):
+    ct = p.x / p.sqrt
+    r = w * (p.random() - holes) * eccentricity / (1.0 + eccentricity * ct)
+    r /= p.sqrt
+    _add(out, r * p.x, r * p.y)
+
+
+@kernel
+def parabola(p, out, w, height, width):
+    sr, cr = numpy.sin(p.sqrt), numpy.cos(p.sqrt)
+    _add(out, height * w * sr * sr * p.random("a"), width * w * cr * p.random())
+
+
+@kernel
+def bent2(p, out, w, x, y):
+    nx = where(p.x < 0, p.x * x, p.x)
+    ny = where(p.y < 0, p.y * y, p.y)
+    _add(out, w * nx, w * ny)
+
+
+@kernel
+def bipolar(p, out, w, shift):
+    t = p.sumsq + 1.0
+    x2 = 2.0 * p.x
+    ps = -pi / 2 * shift
+    y = 0.5 * arctan2(2.0 * p.y, p.sumsq - 1.0) + ps
+    y = where(y > pi / 2, -pi / 2 + numpy.fmod(y + pi / 2, pi), y)
+    y = where(y < -pi / 2, pi / 2 - numpy.fmod(pi / 2 - y, pi), y)
+    f = t + x2
+    g = t - x2
+    ok = (g != 0) & (f / g > 0)
+    dx = where(ok, w * 0.25 * (2 / pi) * numpy.log(f / g), 0.0)
+    _add(out, dx, where(ok, w * (2 / pi) * y, 0.0))
+
+
+@kernel
+def boarders(p, out, w):
+    rx, ry = numpy.rint(p.x), numpy.rint(p.y)
+    ox, oy = p.x - rx, p.y - ry
+    x = ox * 0.5 + rx
+    y = oy * 0.5 + ry
+    # Points are pushed a quarter out towards the nearest edge of their cell,
+    # except for a quarter of them which stay in the middle.
+    xside = abs(ox) >= abs(oy)
+    sx = where(ox >= 0, 0.25, -0.25)
+    sy = where(oy >= 0, 0.25, -0.25)
+    bx = where(xside, x + sx, x + ox / oy * sy)
+    by = where(xside, y + oy / ox * sx, y + sy)
+    middle = p.random() >= 0.75
+    _add(out, w * where(middle, x, bx), w * where(middle, y, by))
+
+
+@kernel
+def cell(p, out, w, size):
+    inv = 1.0 / size
+    x = numpy.floor(p.x * inv)
+    y = numpy.floor(p.y * inv)
+    dx = p.x - x * size
+    dy = p.y - y * size
+    x = where(x >= 0, 2 * x, -(2 * x + 1))
+    y = where(y >= 0, 2 * y, -(2 * y + 1))
+    _add(out, w * (dx + x * size), -w * (dy + y * size))
+
+
+@kernel
+def cpow(p, out, w, r, i, power):
+    a = p.atanyx
+    lnr = 0.5 * numpy.log(p.sumsq)
+    va = 2 * pi / power
+    vc = r / power
+    vd = i / power
+    ang = vc * a + vd * lnr + va * numpy.floor(power * p.random())
+    m = w * numpy.exp(vc * lnr - vd * a)
+    _add(out, m * numpy.cos(ang), m * numpy.sin(ang))
+
+
+@kernel
+def curve(p, out, w, xamp, yamp, xlength, ylength):
+    xlen = max(xlength * xlength, 1e-20)
+    ylen = max(ylength * ylength, 1e-20)
+    dx = p.x + xamp * numpy.exp(-p.y * p.y / xlen)
+    dy = p.y + yamp * numpy.exp(-p.x * p.x / ylen)
+    _add(out, w * dx, w * dy)
+
+
+@kernel
+def escher(p, out, w, beta):
+    a = p.atanyx
+    lnr = 0.5 * numpy.log(p.sumsq)
+    vc = 0.5 * (1.0 + math.cos(beta))
+    vd = 0.5 * math.sin(beta)
+    m = w * numpy.exp(vc * lnr - vd * a)
+    n = vc * a + vd * lnr
+    _add(out, m * numpy.cos(n), m * numpy.sin(n))
+
+
+@kernel
+def lazysusan(p, out, w, spin, space, twist, x, y):
+    px = p.x - x
+    py = p.y + y
+    r = numpy.sqrt(px * px + py * py)
+    inside = r < w
+    a = arctan2(py, px) + spin + twist * (w - r)
+    ri = w * r
+    ro = w * (1.0 + space / r)
+    dx = where(inside, ri * numpy.cos(a), ro * px)
+    dy = where(inside, ri * numpy.sin(a), ro * py)
+    _add(out, dx + x, dy - y)
+
+
+@kernel
+def modulus(p, out, w, x, y):
+    def mod(v, m):
+        r = 2.0 * m
+        return where(
+            v > m,
+            -m + numpy.fmod(v + m, r),
+            where(v < -m, m - numpy.fmod(m - v, r), v),
+        )
+
+    _add(out, w * mod(p.x, x), w * mod(p.y, y))
+
+
+@kernel
+def oscilloscope(p, out, w, separation, frequency, amplitude, damping):
+    tpf = 2 * pi * frequency
+    t = amplitude * numpy.cos(tpf * p.x)
+    if damping != 0:
+        t *= numpy.exp(-abs(p.x) * damping)
+    t += separation
+    _add(out, w * p.x, where(abs(p.y) <= t, -w * p.y, w * p.y))
+
+
+@kernel
+def popcorn2(p, out, w, x, y, c):
+    dx = p.x + x * numpy.sin(numpy.tan(p.y * c))
+    dy = p.y + y * numpy.sin(numpy.tan(p.x * c))
+    _add(out, w * dx, w * dy)
+
+
+@kernel
+def scry(p, out, w):
+    r = 1.0 / (p.sqrt * (p.sumsq + 1.0 / (w + EPS)))
+    _add(out, p.x * r, p.y * r)
+
+
+@kernel
+def separation(p, out, w, x, xinside, y, yinside):
+    sx = numpy.sqrt(p.x * p.x + x * x)
+    sy = numpy.sqrt(p.y * p.y + y * y)
+    dx = where(p.x > 0, sx - p.x * xinside, -(sx + p.x * xinside))
+    dy = where(p.y > 0, sy - p.y * yinside, -(sy + p.y * yinside))
+    _add(out, w * dx, w * dy)
+
+
+@kernel
+def split(p, out, w, xsize, ysize):
+    dx = where(numpy.cos(p.y * ysize * pi) >= 0, w * p.x, -w * p.x)
+    dy = where(numpy.cos(p.x * xsize * pi) >= 0, w * p.y, -w * p.y)
+    _add(out, dx, dy)
+
+
+@kernel
+def splits(p, out, w, x, y):
+    dx = where(p.x >= 0, p.x + x, p.x - x)
+    dy = where(p.y >= 0, p.y + y, p.y - y)
+    _add(out, w * dx, w * dy)
+
+
+@kernel
+def stripes(p, out, w, space, warp):
+    rx = numpy.floor(p.x + 0.5)
+    ox = p.x - rx
+    _add(out, w * (ox * (1.0 - space) + rx), w * (p.y + ox * ox * warp))
+
+
+@kernel
+def wedge(p, out, w, angle, hole, count, swirl):
+    r = p.sqrt
+    a = p.atanyx + swirl * r
+    c = numpy.floor((count * a + pi) / pi * 0.5)
+    comp_fac = 1.0 - angle * count / pi * 0.5
+    a = a * comp_fac + c * angle
+    r = w * (r + hole)
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def wedge_julia(p, out, w, angle, count, power, dist):
+    cf = 1.0 - angle * count / pi * 0.5
+    rn = abs(power)
+    cn = dist / power / 2.0
+    r = w * p.sumsq**cn
+    t = numpy.trunc(rn * p.random())
+    a = (p.atanyx + 2 * pi * t) / power
+    c = numpy.floor((count * a + pi) / pi * 0.5)
+    a = a * cf + c * angle
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def wedge_sph(p, out, w, angle, count, hole, swirl):
+    r = 1.0 / (p.sqrt + EPS)
+    a = p.atanyx + swirl * r
+    c = numpy.floor((count * a + pi) / pi * 0.5)
+    comp_fac = 1.0 - angle * count / pi * 0.5
+    a = a * comp_fac + c * angle
+    r = w * (r + hole)
+    _add(out, r * numpy.cos(a), r * numpy.sin(a))
+
+
+@kernel
+def whorl(p, out, w, inside, outside):
+    r = p.sqrt
+    a = p.atanyx + where(r < w, inside, outside) / (w - r)
+    _add(out, w * r * numpy.cos(a), w * r * numpy.sin(a))
+
+
+@kernel
+def waves2(p, out, w, freqx, scalex, freqy, scaley):
+    dx = p.x + scalex * numpy.sin(p.y * freqx)
+    dy = p.y + scaley * numpy.sin(p.x * freqy)
+    _add(out, w * dx, w * dy)
+
+
+@kernel
+def auger(p, out, w, freq, scale, sym, weight):
+    s = numpy.sin(freq * p.x)
+    t = numpy.sin(freq * p.y)
+    dy = p.y + weight * (scale * s / 2.0 + abs(p.y) * s)
+    dx = p.x + weight * (scale * t / 2.0 + abs(p.x) * t)
+    _add(out, w * (p.x + sym * (dx - p.x)), w * dy)
+
+
+@kernel
+def flux(p, out, w, spread):
+    xpw = p.x + w
+    xmw = p.x - w
+    y2 = p.y * p.y
+    avgr = numpy.sqrt(numpy.sqrt(y2 + xpw * xpw) / numpy.sqrt(y2 + xmw * xmw))
+    avgr *= w * (2.0 + spread)
+    avga = (arctan2(p.y, xmw) - arctan2(p.y, xpw)) * 0.5
+    _add(out, avgr * numpy.cos(avga), avgr * numpy.sin(avga))
+
+
+@kernel
+def mobius(p, out, w, re_a, im_a, re_b, im_b, re_c, im_c, re_d, im_d):
+    x, y = p.x, p.y
+    re_u = re_a * x - im_a * y + re_b
+    im_u = re_a * y + im_a * x + im_b
+    re_v = re_c * x - im_c * y + re_d
+    im_v = re_c * y + im_c * x + im_d
+    rad_v = w / (re_v * re_v + im_v * im_v)
+    _add(out, rad_v * (re_u * re_v + im_u * im_v), rad_v * (im_u * re_v - re_u * im_v))
+
+
+# -----------------------------------------------------------------------------
+
+
+def variable_names(name):
+    """Returns the short names of the variables of a variation (e.g. power
+    and dist for julian). Unlike pyflam3.variables, this also works for
+    names with underscores, such as mobius_re_a."""
+    prefix = name + "_"
+    longer = [v for v in variation_list if v.startswith(prefix)]
+    return [
+        k[len(prefix) :]
+        for k, lo, hi, ty in variable_list
+        if k.startswith(prefix) and not any(k.startswith(v + "_") for v in longer)
+    ]
+
+
+def params(xform, name):
+    """Returns the variables of a variation as set on xform, by their short
+    name."""
+    d = {}
+    for var in variable_names(name):
+        attr = "%s_%s" % (name, var)
+        d[var] = float(getattr(xform, attr, DEFAULTS.get(attr, 0.0)))
+    return d
+
+
+class Variations(object):
+    """The active variations of an xform, fused into one evaluation: the
+    shared values are worked out once per batch, and every kernel adds its
+    share to the same output array. An xform that is only linear is just
+    scaled, without going through the kernels."""
+
+    def __init__(self, xform):
+        # Variations such as waves and popcorn read the affine coefficients,
+        # as flam3 sees them.
+        self.coefs = flam3_coefs(xform)
+        self.pre = []
+        self.terms = []
+        for name in xform.list_variations():
+            weight = getattr(xform, name)
+            if not weight:
+                continue
+            func = kernels.get(name)
+            if func is None:
+                raise ValueError("The numpy engine doesn't support %s." % name)
+            term = func, weight, params(xform, name)
+            (self.pre if name in PRE_VARIATIONS else self.terms).append(term)
+        self.linear = None
+        if not self.pre and all(t[0] is linear for t in self.terms):
+            self.linear = sum(t[1] for t in self.terms)
+
+    def __call__(self, x, y, rng=None, scratch=None):
+        """Evaluates the variations at the affine-transformed points x, y.
+        Returns a new (N, 2) array."""
+        out = numpy.empty((len(x), 2))
+        if self.linear is not None:
+            numpy.multiply(x, self.linear, out=out[:, 0])
+            numpy.multiply(y, self.linear, out=out[:, 1])
+            return out
+        out.fill(0.0)
+        p = Precalc(x, y, self.coefs, rng, scratch)
+        for func, weight, kwds in self.pre:
+            func(p, out, weight, **kwds)
+        for func, weight, kwds in self.terms:
+            func(p, out, weight, **kwds)
+        return out
+
+
+def compose(xform):
+    """Returns the fused Variations of an xform."""
+    return Variations(xform)
@@ -341,7 +341,7 @@ John Miller"""
         if self.tree.CheckForChanges() == wx.ID_CANCEL:
             return
 
-        self.renderer.exitflag = True
+        self.renderer.Exit()
 
         self.fh.SaveToConfig()
         self.editor.fh.SaveToConfig()
@@ -540,10 +540,13 @@ John Miller"""
             # reducing the size of the tree.
             self.tree.SelectItem(self.tree.itemparent)
 
+        index = None
         if os.path.exists(path):
-            # scan the file to see if it's valid
-            flamestrings = fr0stlib.load_flamestrings(path)
-            if not flamestrings:
+            # The index only lists the flames, they are read when needed. An
+            # empty index means the file isn't valid.
+            index = fr0stlib.FlameIndex(path, save=config["Flame-Index"])
+            flamestrings = ()
+            if not len(index):
                 ErrorMessage(
                     self,
                     "%s is not a valid flame file."
@@ -555,7 +558,7 @@ John Miller"""
             flamestrings = (self.MakeFlame().to_string(),)
 
         # Add flames to the tree
-        item = self.tree.SetFlames(path, *flamestrings)
+        item = self.tree.SetFlames(path, *flamestrings, index=index)
         self.fh.AddFileToHistory(path)
         config["flamepath"] = path
 
@@ -631,11 +634,10 @@ John Miller"""
 
         data = self.tree.itemdata
 
-        # Check if flame has changed. to_string is needed to detect identical
-        # flames saved in different apps. This comparison takes about 5ms.
-        string = self.flame.to_string()
-        if Flame(data[-1]).to_string() != string:
-            data.append(string)
+        # Check if flame has changed. Fingerprints don't depend on formatting,
+        # so identical flames saved in different apps compare equal.
+        if data.fingerprint() != self.flame.fingerprint():
+            data.append(self.flame.to_string())
             self.tree.SetItemText(self.tree.item, data.name)
 
             self.DumpChanges()
@@ -680,6 +682,7 @@ John Miller"""
         def new_save_flames(path, *flames, **kwds):
             refresh = kwds.pop("refresh", True)
             confirm = kwds.pop("confirm", True)
+            index = kwds.pop("index", None)
             if kwds:
                 raise TypeError("Got unexpected keyword argument: %s" % tuple(kwds)[0])
             if not flames:
@@ -696,7 +699,7 @@ John Miller"""
                     return
 
             lst = [s if isinstance(s, str) else s.to_string() for s in flames]
-            save_flames(path, *lst)
+            save_flames(path, *lst, index=index)
             if refresh:
                 self.tree.SetFlames(path, *lst)
 
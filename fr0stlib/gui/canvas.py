@@ -28,7 +28,9 @@ from wx.lib.floatcanvas.Utilities import BBox
 from fr0stlib.decorators import Bind, BindEvents
 from fr0stlib import polar, rect, Xform
 from fr0stlib import pyflam3
-from fr0stlib.pyflam3 import Genome, c_double, RandomContext, flam3_xform_preview
+from fr0stlib.pyflam3 import genome_cache, c_double, RandomContext, flam3_xform_preview
+from fr0stlib.pyflam3 import libflam3_loaded
+from fr0stlib.engine import xform_preview
 from fr0stlib.gui.config import config
 
 
@@ -47,11 +49,13 @@ def angle_helper(*points):
 
 class VarPreview(object):
     def __init__(self, xform, Color):
-        self.genome = Genome.from_string(xform._parent.to_string(True))[0][0]
         xform = xform._parent if xform.ispost() else xform
-        self.index = xform.index
-        if self.index is None:
-            self.index = self.genome.final_xform_index
+        self.xform = xform
+        if libflam3_loaded:
+            self.genome = genome_cache.get(xform._parent.to_string(True))[0][0]
+            self.index = xform.index
+            if self.index is None:
+                self.index = self.genome.final_xform_index
 
         kwds = config["Xform-Preview-Settings"].copy()
         depth = kwds.pop("depth")
@@ -65,6 +69,9 @@ class VarPreview(object):
 
     def var_preview(self, range, numvals, depth):
         numvals = int(numvals * range)
+        if not libflam3_loaded:
+            result = xform_preview(self.xform, range, numvals, depth)
+            return [(x, -y) for x, y in result.tolist()]
         result = (c_double * (2 * (2 * numvals + 1) ** 2))()
         flam3_xform_preview(
             self.genome, self.index, range, numvals, depth, result, RandomContext()
@@ -21,6 +21,7 @@
 ##############################################################################
 import os, atexit, wx, pprint, functools
 
+from fr0stlib.pyflam3 import libflam3_loaded
 from fr0stlib.pyflam3.cuda import is_cuda_capable
 
 
@@ -94,8 +95,12 @@ def init_config(path):
             "Img-Dir": wx.GetApp().RendersDir,
             "Img-Type": ".png",
             "jpg-quality": 95,
+            "Flame-Index": True,
             "Bits": 0,
             "renderer": "flam3",
+            "Progress-Interval": 250,
+            "Preview-Passes": 3,
+            "Render-Processes": 2,
             "Rect-Main": None,
             "Rect-Editor": None,
             "Rect-Preview": None,
@@ -134,5 +139,7 @@ def init_config(path):
     # Make sure no illegal renderer is selected.
     if config["renderer"] == "flam4" and not is_cuda_capable():
         config["renderer"] = "flam3"
+    if config["renderer"].startswith("flam3") and not libflam3_loaded:
+        config["renderer"] = "numpy"
 
     atexit.register(functools.partial(dump_config, path=path))
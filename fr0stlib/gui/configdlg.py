@@ -24,6 +24,7 @@ import wx, copy
 from fr0stlib.decorators import *
 from fr0stlib.gui.config import config, update_dict
 from fr0stlib.gui.utils import NumberTextCtrl, Box
+from fr0stlib.pyflam3 import libflam3_loaded
 from fr0stlib.pyflam3.cuda import is_cuda_capable
 
 
@@ -68,7 +69,7 @@ class RenderPanel(wx.Panel):
         self.parent = parent.Parent
         wx.Panel.__init__(self, parent, -1)
 
-        choices = ["flam3", "flam4"]
+        choices = ["flam3", "flam3-process", "flam4", "numpy"]
 
         self.rb = wx.RadioBox(
             self, -1, label="Renderer", choices=choices, style=wx.RA_VERTICAL
@@ -76,7 +77,10 @@ class RenderPanel(wx.Panel):
         self.rb.SetStringSelection(self.parent.local_config["renderer"])
 
         if not is_cuda_capable():
-            self.rb.EnableItem(1, False)
+            self.rb.EnableItem(choices.index("flam4"), False)
+        if not libflam3_loaded:
+            self.rb.EnableItem(choices.index("flam3"), False)
+            self.rb.EnableItem(choices.index("flam3-process"), False)
 
         szr = wx.BoxSizer(wx.VERTICAL)
         szr.Add(self.rb)
@@ -276,8 +280,18 @@ class MiscPanel(wx.Panel):
             is_int=True,
         )
 
+        # Index files speed up opening large flame files again, but are
+        # written next to them.
+        cb = wx.CheckBox(self, -1, "Write index files next to opened flame files")
+        cb.SetValue(self.parent.local_config["Flame-Index"])
+        cb.Bind(wx.EVT_CHECKBOX, self.OnIndex)
+        gbs.Add(cb, (1, 0), (1, 2))
+
         self.SetSizerAndFit(gbs)
 
+    def OnIndex(self, e):
+        self.parent.local_config["Flame-Index"] = e.IsChecked()
+
 
 def number_text(
     panel,
@@ -27,6 +27,7 @@ from fr0stlib import Flame, save_flames
 from fr0stlib.decorators import *
 from fr0stlib.gui.constants import ID
 from fr0stlib.gui.itemdata import ItemData, ParentData
+from fr0stlib.gui.preview import ImageCache
 from fr0stlib.gui.utils import IsInvalidPath
 
 
@@ -165,9 +166,20 @@ class FlameTree(treemixin.DragAndDrop, treemixin.VirtualTree, wx.TreeCtrl):
         self.flamefiles = []
         self._dragging = False
         self._render_thumbnails = True
-
-    def SetFlames(self, path, *flamestrings):
-        lst = [(ItemData(s), ()) for s in flamestrings]
+        self.thumbcache = ImageCache(maxmb=5, penalty=0.01)
+
+    def SetFlames(self, path, *flamestrings, index=None):
+        """Shows the given flames. Alternatively, a FlameIndex of the file
+        can be passed, so only the names are needed up front and each flame
+        is read from the file when it's first used."""
+        if index is not None:
+            flamestrings = index.names()
+            lst = [
+                (ItemData(partial(index.read, i, verify=True), name), ())
+                for i, name in enumerate(flamestrings)
+            ]
+        else:
+            lst = [(ItemData(s), ()) for s in flamestrings]
         self.flamefiles = [(ParentData(path), lst)]
 
         self.RefreshItems()
@@ -203,9 +215,14 @@ class FlameTree(treemixin.DragAndDrop, treemixin.VirtualTree, wx.TreeCtrl):
         if child is None:
             child = self.item
             data = self.GetFlameData(child)
+        key = data.fingerprint(cosmetic=False)
+        bmp = self.thumbcache.get(key, self.isz)
+        if bmp is not None:
+            self.UpdateThumbnail(bmp, child, data, flag)
+            return
         req = self.parent.parent.renderer.ThumbnailRequest
         req(
-            partial(self.UpdateThumbnail, child=child, data=data, flag=flag),
+            partial(self.UpdateThumbnail, child=child, data=data, flag=flag, key=key),
             data[-1],
             self.isz,
             quality=10,
@@ -213,8 +230,10 @@ class FlameTree(treemixin.DragAndDrop, treemixin.VirtualTree, wx.TreeCtrl):
             filter_radius=0,
         )
 
-    def UpdateThumbnail(self, bmp, child, data, flag):
+    def UpdateThumbnail(self, bmp, child, data, flag, key=None):
         """Callback function to process rendered thumbnails."""
+        if key is not None:
+            self.thumbcache.put(key, self.isz, bmp)
         if flag and flag != self.flag:
             # This means the current thumbnail was for a file that is no longer
             # open. Trying to update with this itemid would cause a crash.
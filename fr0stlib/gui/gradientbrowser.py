@@ -3,7 +3,7 @@ import xml.etree.cElementTree as etree
 import wx.adv
 from wx.lib.filebrowsebutton import FileBrowseButton
 
-from fr0stlib import Palette, load_flamestrings, hsv2rgb, rgb2hsv
+from fr0stlib import Palette, iter_flamestrings, hsv2rgb, rgb2hsv
 from fr0stlib.gui.utils import Box, ErrorMessage
 from fr0stlib.gui.config import config
 
@@ -166,7 +166,7 @@ class GradientBrowser(wx.Panel):
                     re.search(' name="(.*?)"', string).group(1),
                     Palette(etree.fromstring(string)),
                 )
-                for string in load_flamestrings(path)
+                for string in iter_flamestrings(path)
             )
         elif ext == ".map":
             with open(path, "r") as mf:
@@ -20,6 +20,9 @@
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
 import os, re
+from xml.sax.saxutils import unescape
+
+from fr0stlib import Flame
 
 
 class ParentData(object):
@@ -30,16 +33,52 @@ class ParentData(object):
 
 
 class ItemData(list):
-    def __init__(self, s):
-        self.append(s if isinstance(s, str) else s.to_string())
+    def __init__(self, s, name=None):
+        """s is a flame string or Flame object. Alternatively, it can be a
+        function returning the flame string, in which case the name needs to
+        be passed as well, and the string is only read when first needed."""
         self.redo = []
-        self.UpdateName()
         self.imgindex = -1
+        self._fingerprints = None, {}
+        if name is None:
+            self.append(s if isinstance(s, str) else s.to_string())
+            self.UpdateName()
+        else:
+            self._read = s
+            self._name = name
+
+    def _load(self):
+        read = self.__dict__.pop("_read", None)
+        if read is not None:
+            list.append(self, read())
+
+    def __getitem__(self, key):
+        self._load()
+        return list.__getitem__(self, key)
+
+    def __len__(self):
+        self._load()
+        return list.__len__(self)
+
+    def __iter__(self):
+        self._load()
+        return list.__iter__(self)
 
     def append(self, v):
+        self._load()
         list.append(self, v)
         self.redo = []
 
+    def fingerprint(self, cosmetic=True):
+        """Returns the fingerprint of the current flame string, which is only
+        parsed once."""
+        string, cache = self._fingerprints
+        if string is not self[-1]:
+            string, cache = self._fingerprints = self[-1], {}
+        if cosmetic not in cache:
+            cache[cosmetic] = Flame(string).fingerprint(cosmetic)
+        return cache[cosmetic]
+
     def HasChanged(self):
         return self.undo
 
@@ -47,7 +86,8 @@ class ItemData(list):
         del self[:-1], self.redo[:]
 
     def UpdateName(self):
-        self._name = re.search(' name="(.*?)"', self[-1]).group(1)
+        name = re.search(' name="(.*?)"', self[-1]).group(1)
+        self._name = unescape(name, {"&quot;": '"', "&apos;": "'"})
 
     def Undo(self):
         if self.undo:
@@ -81,7 +121,9 @@ class ItemData(list):
 
     @property
     def name(self):
-        return ("* " if self.undo else "") + self._name
+        # Flames that haven't been read yet can't have changed, so this
+        # doesn't read them.
+        return ("* " if list.__len__(self) > 1 else "") + self._name
 
     @name.setter
     def name(self, v):
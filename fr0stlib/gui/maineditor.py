@@ -35,7 +35,9 @@ from fr0stlib.gui.utils import (
 from fr0stlib.gui.config import config
 from fr0stlib.gui.gradientbrowser import GradientBrowser
 from fr0stlib.gui.constants import ID
-from fr0stlib.pyflam3 import flam3_colorhist, Genome, RandomContext
+from fr0stlib.pyflam3 import flam3_colorhist, genome_cache, RandomContext
+from fr0stlib.pyflam3 import libflam3_loaded
+from fr0stlib.engine import colorhist
 from ctypes import c_double
 
 
@@ -362,8 +364,11 @@ class Gradient(wx.Panel):
         self.bmp = wx.BitmapFromImage(img)
 
         # Calculate the color histogram
-        genome = Genome.from_string(flame.to_string(omit_details=True))[0]
-        flam3_colorhist(genome, 3, RandomContext(), self.colorhist_array)
+        if libflam3_loaded:
+            genome = genome_cache.get(flame.to_string(omit_details=True))[0]
+            flam3_colorhist(genome, 3, RandomContext(), self.colorhist_array)
+        else:
+            self.colorhist_array[:] = colorhist(flame).tolist()
 
         self.Refresh()
 
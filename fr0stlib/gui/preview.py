@@ -23,6 +23,7 @@ import wx, sys, numpy as N, time
 from functools import partial
 
 from fr0stlib.decorators import *
+from fr0stlib.pyflam3 import ProgressChannel
 from .config import config
 from ._events import InMainFast
 
@@ -90,6 +91,8 @@ class PreviewFrame(wx.Frame):
 
         self.rendering = False
         self.idlefunc = None
+        self.channel = None
+        self.timer = wx.Timer(self)
 
         self.SetSize((520, 413))
         self.SetMinSize((128, 119))  # This makes for a 120x90 bitmap
@@ -148,48 +151,61 @@ class PreviewFrame(wx.Frame):
         ratio = min(pw / fw, ph / fh)
         size = int(fw * ratio), int(fh * ratio)
 
-        # Remove name so that cache will hit if that's the only difference.
-        oldname, flame.name = flame.name, ""
-        flamestr = flame.to_string()
-        flame.name = oldname
+        # Leave out the name so that cache will hit if that's the only
+        # difference.
+        key = flame.fingerprint(cosmetic=False)
 
-        bmp = self.cache.get(flamestr, size)
+        bmp = self.cache.get(key, size)
         if bmp is not None:
-            self.idlefunc = partial(self.RenderCallback, flamestr, bmp, fromcache=True)
+            self.idlefunc = partial(self.RenderCallback, key, bmp, fromcache=True)
             return
 
         self.rendering = True
+        self.channel = ProgressChannel()
         req = self.parent.renderer.LargePreviewRequest
         req(
-            partial(self.RenderCallback, flamestr),
+            partial(self.RenderCallback, key),
             flame,
             size,
-            progress_func=self.prog,
+            progress_func=self.channel,
             cancel_func=self.CancelCallback,
+            passes=config["Preview-Passes"],
+            pass_func=self.PassCallback,
             **config["Large-Preview-Settings"]
         )
         self.SetTitle("Rendering - Flame Preview")
+        if not self.timer.IsRunning():
+            self.timer.Start(config["Progress-Interval"])
 
     def CancelCallback(self):
         self.rendering = False
 
-    def RenderCallback(self, flamestr, bmp, fromcache=False):
+    def PassCallback(self, bmp):
+        """Shows the image of a progressive render while it keeps
+        improving."""
+        self.image.UpdateBitmap(bmp)
+
+    def RenderCallback(self, key, bmp, fromcache=False):
         self.image.UpdateBitmap(bmp)
         self.SetTitle("%s - Flame Preview" % self.parent.flame.name)
         if fromcache:
             self.SetStatusText("rendering: retrieved from cache")
         else:
             self.rendering = False
-            self.cache.put(flamestr, tuple(bmp.Size), bmp)
+            self.cache.put(key, tuple(bmp.Size), bmp)
             self.SetStatusText("rendering: 100.00 %")
 
-    def prog(self, *a):
-        self._prog(*a)
-        return int(not self.IsShown())
-
-    @InMainFast
-    def _prog(self, py_object, fraction, stage, eta):
-        self.SetStatusText("rendering: %.2f %%" % fraction)
+    @Bind(wx.EVT_TIMER)
+    def OnTimer(self, e):
+        """Polls the progress channel of the current render, instead of
+        having the render thread call into the gui on every update."""
+        if not self.rendering:
+            self.timer.Stop()
+        elif not self.IsShown():
+            self.channel.cancel()
+        else:
+            fraction, stage, eta = self.channel.poll()
+            self.SetStatusText("rendering: %.2f %%" % fraction)
 
 
 class PreviewBase(wx.Panel):
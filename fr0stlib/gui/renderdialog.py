@@ -22,7 +22,6 @@
 
 import wx, os, time, sys, itertools
 from collections import defaultdict
-from functools import partial
 
 from wx.lib.filebrowsebutton import FileBrowseButton
 
@@ -39,57 +38,36 @@ from fr0stlib.gui.utils import (
 )
 from fr0stlib.gui.config import config
 from fr0stlib.gui.constants import ID
-from fr0stlib.gui._events import InMainFast
 from fr0stlib.decorators import *
+from fr0stlib.pyflam3 import Genome, ProgressChannel, libflam3_loaded
 from fr0stlib.render import save_image
+from fr0stlib.memory import plan_render, plan_engine_render
 
 
 class FreeMemoryPanel(wx.Panel):
     def __init__(self, parent):
         wx.Panel.__init__(self, parent, -1)
-        self.depth = parent.GetParent().dict["buffer_depth"]
         self.fgs = wx.FlexGridSizer(2, 2, 1, 1)
         self.SetSizer(self.fgs)
 
     def UpdateView(self, e=None, tempsave=None):
+        plan = self.GetParent().GetParent().PlanMemory()
         self.fgs.Clear(True)
-        s = "%.2f MB "
+        required = available = "- "
+        if plan is not None:
+            required = "%.2f MB " % (plan.required / 1024.0**2)
+            if plan.available is not None:
+                available = "%.2f MB " % (plan.available / 1024.0**2)
         lst = (
             (" Required Memory: ", 0),
-            (s % self.GetRequired(), wx.ALIGN_RIGHT),
+            (required, wx.ALIGN_RIGHT),
             (" Free Memory: ", 0),
-            (s % self.GetFree(), wx.ALIGN_RIGHT),
+            (available, wx.ALIGN_RIGHT),
         )
         self.fgs.AddMany((wx.StaticText(self, -1, str(i)), 0, fl) for i, fl in lst)
         self.fgs.Layout()
         self.fgs.Fit(self)
 
-    def GetFree(self):
-        """Generic Implementation."""
-        return wx.GetFreeMemory() / 1024.0**2
-
-    def GetMemWindows(self):
-        return 0  # TODO: implement this.
-
-    def GetMemLinux(self):
-        with open("/proc/meminfo") as f:
-            # TODO: not sure if this is entirely correct.
-            total, free, buff, cached = (int(f.readline().split()[1]) for i in range(4))
-            return (free + cached) / 1024.0
-
-    if "win" in sys.platform:
-        GetFree = GetMemWindows
-    elif "linux" in sys.platform:
-        GetFree = GetMemLinux
-
-    def GetRequired(self):
-        w, h = self.GetParent().GetParent().sizepanel.Size
-        os = self.GetParent().GetParent().dict["spatial_oversample"].GetFloat()
-        depth = int(self.depth.GetStringSelection().split("-")[0]) / 8
-        # the *9 is for: 5 in bucket (RGBA+density) + 4 in abucket (RGBA)
-        # the 4 + is for the output image itself, assuming RGBA 8-bit
-        return w * h * (4 + os**2 * depth * 9) / 1024.0**2
-
 
 class RenderDialog(wx.Frame):
     buffer_depth_dict = {"32-bit int": 32, "32-bit float": 33, "64-bit double": 64}
@@ -112,6 +90,10 @@ class RenderDialog(wx.Frame):
         self.dict = {}
         self.progflag = 0
         self.rendering = False
+        self.channel = None
+        self.progname = ""
+        self._plan = None
+        self.timer = wx.Timer(self)
 
         # NOTE: On windows, all child controls must not have a frame as their direct
         # NOTE: parent if you want to use tab traversal. There MUST be a panel between
@@ -289,6 +271,36 @@ class RenderDialog(wx.Frame):
             parent, *((i, getattr(self, i + "_dict"), self.config[i]) for i in a), **k
         )
 
+    def PlanMemory(self, transparent=0, cached=True):
+        """Plans the render of the first selected flame with the current
+        settings, worked out for the numpy engine if it's the selected
+        renderer or libflam3 isn't available. Returns None if no flame is
+        selected. The plan is reused while the settings and renderer stay the
+        same, unless cached is false."""
+        selections = self.lb.GetSelections()
+        if not selections:
+            return None
+        kwds = dict((k, v.Get()) for k, v in list(self.dict.items()))
+        del kwds["quality"]
+        kwds["earlyclip"] = self.earlyclip
+        string = self.choices[selections[0]][-1]
+        size = tuple(self.sizepanel.Size)
+        key = (
+            config["renderer"],
+            string,
+            size,
+            int(transparent),
+            tuple(sorted(kwds.items())),
+        )
+        if not cached or self._plan is None or self._plan[0] != key:
+            if libflam3_loaded and config["renderer"] != "numpy":
+                frame = Genome.load(string, **kwds)
+                plan = plan_render(frame, size, int(transparent))
+            else:
+                plan = plan_engine_render(size, int(transparent), **kwds)
+            self._plan = key, plan
+        return self._plan[1]
+
     def OnEarly(self, e):
         self.earlyclip = e.GetInt()
 
@@ -336,7 +348,8 @@ class RenderDialog(wx.Frame):
             if res == wx.ID_NO:
                 return res
 
-        self.progflag = 1
+        self.Abort()
+        self.timer.Stop()
         self.parent.renderdialog = None
         # HACK: for some reason, EVT_LISTBOX is sent once for each item
         # selected when closing the dialog, causing the app to freeze when
@@ -347,7 +360,7 @@ class RenderDialog(wx.Frame):
 
     @Bind(wx.EVT_BUTTON, id=ID.CLOSE)
     def OnClose(self, e):
-        self.progflag = 1
+        self.Abort()
         if self.close.Label == "Close":
             self.OnExit()
 
@@ -357,11 +370,15 @@ class RenderDialog(wx.Frame):
             self.render.Label = "Resume"
             self.Title = "Paused - " + self.Title
             self.progflag = 2
+            if self.channel is not None:
+                self.channel.pause()
             return
         elif self.render.Label == "Resume":
             self.render.Label = "Pause"
             self.Title = self.Title.lstrip("Paused - ")
             self.progflag = 0
+            if self.channel is not None:
+                self.channel.resume()
             return
 
         destination = self.fbb.GetValue()
@@ -375,13 +392,28 @@ class RenderDialog(wx.Frame):
             ErrorMessage(self, "You must select at least 1 flame.")
             return
 
-        if self.mem.GetRequired() > self.mem.GetFree() + 0.5:
-            # TODO: offer between slicing and cancel
-            ErrorMessage(
-                self,
-                "Not enough memory for render. " "Try reducing size and/or oversample.",
-            )
-            return
+        plan = self.PlanMemory(ty == ".png" and self.transp, cached=False)
+        strips = 1
+        if not plan.fits:
+            if plan.buffer_depth is None and plan.strips and ty == ".png":
+                msg = (
+                    "Not enough memory to render the image in one go.\n"
+                    "Do you want to render it in %s strips?" % plan.strips
+                )
+                dlg = wx.MessageDialog(self, msg, "Fr0st", wx.YES_NO)
+                if dlg.ShowModal() == wx.ID_NO:
+                    return
+                strips = plan.strips
+            else:
+                if plan.buffer_depth is not None:
+                    names = dict((v, k) for k, v in self.buffer_depth_dict.items())
+                    hint = "Try a %s buffer depth." % names[plan.buffer_depth]
+                elif plan.strips:
+                    hint = "Render to a png file to split the render into strips."
+                else:
+                    hint = "Try reducing size and/or oversample."
+                ErrorMessage(self, "Not enough memory for render. " + hint)
+                return
 
         try:
             paths = [destination.format(name=data._name) for data in selections]
@@ -438,10 +470,16 @@ class RenderDialog(wx.Frame):
         config["Img-Dir"] = os.path.dirname(destination)
         config["Img-Type"] = ty
 
-        self._gen = self.render_gen(selections, paths, kwds)
+        self._gen = self.render_gen(selections, paths, kwds, strips)
         next(self._gen)
+        self.timer.Start(config["Progress-Interval"])
+
+    def Abort(self):
+        self.progflag = 1
+        if self.channel is not None:
+            self.channel.cancel()
 
-    def render_gen(self, selections, paths, kwds):
+    def render_gen(self, selections, paths, kwds, strips=1):
         size = self.sizepanel.Size
         len_ = len(selections)
         old_title = self.Title
@@ -450,22 +488,42 @@ class RenderDialog(wx.Frame):
 
         for i, (data, path) in enumerate(zip(selections, paths)):
             str_name = "Rendering flame %s/%s" % (i + 1, len_)
-            req(
-                self._gen.send,
-                data[-1],
-                size,
-                progress_func=partial(self.prog, str_name),
-                **kwds
-            )
+            self.progname = str_name
+            self.channel = ProgressChannel()
+            if self.progflag == 2:
+                self.channel.pause()
+            if strips > 1:
+                self.parent.renderer.StripRenderRequest(
+                    self._gen.send,
+                    data[-1],
+                    size,
+                    path=path,
+                    strips=strips,
+                    progress_func=self.channel,
+                    error_func=self.OnRenderError,
+                    **kwds
+                )
+            else:
+                req(
+                    self._gen.send,
+                    data[-1],
+                    size,
+                    progress_func=self.channel,
+                    error_func=self.OnRenderError,
+                    **kwds
+                )
             backup.write(data[-1] + "\n")
             self.Title = str_name + " (%s)" % data.name
             bmp = yield
             if self.progflag == 1:
                 self.progflag = 0
                 break
-            save_image(path, bmp, config["jpg-quality"])
+            if bmp is not None:
+                save_image(path, bmp, config["jpg-quality"])
 
         backup.close()
+        self.timer.Stop()
+        self.channel = None
         self.Title = old_title
         self.gauge.SetValue(0)
         self.SetStatusText("")
@@ -475,12 +533,23 @@ class RenderDialog(wx.Frame):
         self.close.Label = "Close"
         yield
 
-    def prog(self, *a):
-        self._prog(*a)
-        return self.progflag
+    def OnRenderError(self, e):
+        """Stops the render when one of the flames fails."""
+        self.timer.Stop()
+        if isinstance(e, MemoryError):
+            msg = "Not enough memory for render. %s" % e
+        else:
+            msg = "Render failed: %s" % e
+        ErrorMessage(self, msg)
+        self.progflag = 1
+        self._gen.send(None)
 
-    @InMainFast
-    def _prog(self, str_name, py_object, fraction, stage, eta):
+    @Bind(wx.EVT_TIMER)
+    def OnTimer(self, e):
+        if self.channel is None:
+            return
+        str_name = self.progname
+        fraction, stage, eta = self.channel.poll()
         if stage == 0:
             h, m, s = eta / 3600, eta % 3600 / 60, eta % 60
             self.SetStatusText(
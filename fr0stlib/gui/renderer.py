@@ -19,10 +19,14 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import time, sys, traceback, wx
-
-from fr0stlib.decorators import Catches, Threaded
-from fr0stlib.render import render_funcs
+import time, sys, traceback, wx, numpy
+from functools import partial
+
+from fr0stlib.decorators import Threaded
+from fr0stlib.render import render_funcs, render_pool, flam3_render_strips
+from fr0stlib.render import default_renderer
+from fr0stlib.render import preview_qualities
+from fr0stlib.pyflam3 import BufferPool
 from fr0stlib.gui.config import config
 from fr0stlib.gui._events import InMainFast
 
@@ -36,7 +40,10 @@ class Renderer:
         self.bgqueue = []
         self.exitflag = 0
         self.previewflag = 0
-        self.bgflag = 0
+        self.previewchannel = None
+        self.bgchannel = None
+        self.buffers = BufferPool()
+        render_pool.processes = config["Render-Processes"]
         self.RenderLoop()
         self.bgRenderLoop()
 
@@ -46,7 +53,7 @@ class Renderer:
         # by the calling code.
         kwds["nthreads"] = 1
         kwds["fixed_seed"] = True
-        kwds["renderer"] = "flam3"
+        kwds["renderer"] = default_renderer
 
         self.thumbqueue.append((callback, args, kwds))
 
@@ -55,38 +62,71 @@ class Renderer:
         Cancels previous requests (assuming they are obsolete)."""
         kwds["nthreads"] = -1
         kwds["fixed_seed"] = True
-        kwds["renderer"] = "flam3"
-        self.previewflag = 1
+        kwds["renderer"] = default_renderer
+        self.CancelPreview()
 
         self.previewqueue = [(callback, args, kwds)]
 
     def LargePreviewRequest(self, callback, *args, **kwds):
-        """Makes a preview request with a progress function."""
-        prog_func = kwds["progress_func"]
-        kwds["progress_func"] = self.prog_wrapper(prog_func, "previewflag")
+        """Makes a preview request with a progress channel. The render is
+        cancelled through it when a newer preview comes in. If passes and
+        pass_func are given, pass_func gets the bitmap of each preview pass
+        before the last one."""
         kwds["renderer"] = kwds.get("renderer", config["renderer"])
-        self.previewflag = 1
+        self.CancelPreview()
 
         self.largepreviewqueue = [(callback, args, kwds)]
 
     def RenderRequest(self, callback, *args, **kwds):
         """Makes a render request run in a different thread than previews,
-        so it can be paused."""
-        prog_func = kwds["progress_func"]
-        kwds["progress_func"] = self.prog_wrapper(prog_func, "bgflag")
+        so it can be paused. Its progress channel is paused while previews
+        are rendering. Memory is checked before rendering, and if error_func
+        is given, it gets any exception raised by the render. Renders are
+        always done in a single pass."""
         kwds["renderer"] = kwds.get("renderer", config["renderer"])
+        kwds["check"] = True
+        kwds.pop("passes", None)
+        kwds.pop("pass_func", None)
 
         self.bgqueue.append((callback, args, kwds))
 
+    def StripRenderRequest(self, callback, *args, **kwds):
+        """Makes a render request that is rendered in strips and written
+        straight to a file, for renders that don't fit in memory. The
+        callback gets None instead of a bitmap. error_func works as in
+        RenderRequest."""
+        kwds["renderer"] = "strips"
+
+        self.bgqueue.append((callback, args, kwds))
+
+    def CancelPreview(self):
+        self.previewflag = 1
+        channel = self.previewchannel
+        if channel is not None:
+            channel.cancel()
+
+    def Exit(self):
+        """Stops both render threads, aborting any render in progress."""
+        self.exitflag = 1
+        for channel in (self.previewchannel, self.bgchannel):
+            if channel is not None:
+                channel.cancel()
+
     @Threaded
     def RenderLoop(self):
         while not self.exitflag:
             queue = self.previewqueue or self.thumbqueue or self.largepreviewqueue
             if queue:
-                self.bgflag = 2  # Pauses the other thread
+                callback, args, kwds = queue.pop(0)
+                bgchannel = self.bgchannel
+                if bgchannel is not None:
+                    bgchannel.pause("preview")  # Pauses the other thread
+                self.previewchannel = kwds.get("progress_func")
                 self.previewflag = 0
-                self.process(*queue.pop(0))
-                self.bgflag = 0
+                self.process(callback, args, kwds)
+                self.previewchannel = None
+                if bgchannel is not None:
+                    bgchannel.resume("preview")
             else:
                 time.sleep(0.01)  # Ideal interval needs to be tested
 
@@ -95,43 +135,94 @@ class Renderer:
         while not self.exitflag:
             queue = self.bgqueue
             if queue:
-                self.process(*queue.pop(0))
+                callback, args, kwds = queue.pop(0)
+                self.bgchannel = kwds.get("progress_func")
+                self.process(callback, args, kwds)
+                self.bgchannel = None
             else:
                 time.sleep(0.01)
 
     def process(self, callback, args, kwds):
         cancel_func = kwds.pop("cancel_func", None)
+        pass_func = kwds.pop("pass_func", None)
+        error_func = kwds.pop("error_func", None)
+        passes = kwds.pop("passes", 1)
         renderer = kwds.pop("renderer")
+        if renderer == "strips":
+            self.process_strips(callback, error_func, args, kwds)
+            return
         try:
             render = render_funcs[renderer]
         except KeyError as e:
             raise ValueError("Invalid renderer: %s" % e.args)
-        try:
-            output_buffer = render(*args, **kwds)
-        except Exception:
-            # Make sure render thread never crashes due to malformed flames.
-            traceback.print_exc()
+        if renderer == "flam4":
+            channels = 4
+        else:
+            channels = kwds.get("transparent", False) + 3
+        if pass_func is None:
+            passes = 1
+        if renderer == "numpy":
+            # The engine refines the same histogram over all passes.
+            kwds["passes"] = passes
+            kwds["pass_func"] = partial(self.OnPass, pass_func, args[1], channels)
+            passes = 1
+        qualities = preview_qualities(kwds["quality"], passes)
+        for i, quality in enumerate(qualities):
+            kwds["quality"] = quality
+            if renderer != "flam4":
+                # args[1] is always size...
+                dtype = kwds.get("dtype", numpy.uint8)
+                kwds["buffer"] = self.buffers.get(args[1], channels, dtype)
+            try:
+                output_buffer = render(*args, **kwds)
+            except Exception as e:
+                # Make sure render thread never crashes due to malformed flames.
+                self.OnError(error_func, e)
+                return
+
+            # HACK: If by the time the render finishes it has been obsoleted,
+            # don't return the buffer in case of a large preview.
+            if cancel_func is not None and (
+                self.previewflag or getattr(kwds.get("progress_func"), "cancelled", 0)
+            ):
+                self.buffers.put(output_buffer)
+                cancel_func()
+                return
+
+            if i == len(qualities) - 1:
+                self.OnImageReady(callback, args[1], output_buffer, channels)
+            else:
+                self.OnImageReady(pass_func, args[1], output_buffer, channels)
+
+    def OnPass(self, pass_func, size, channels, img):
+        if self.previewflag:
             return
+        # The engine overwrites img with the next pass, so it's copied.
+        buf = self.buffers.get(size, channels, img.dtype)
+        buf[...] = img
+        self.OnImageReady(pass_func, size, buf, channels)
 
-        # HACK: If by the time the render finishes it has been obsoleted,
-        # don't return the buffer in case of a large preview.
-        if cancel_func is not None and self.previewflag:
-            cancel_func()
+    def process_strips(self, callback, error_func, args, kwds):
+        try:
+            flam3_render_strips(*args, **kwds)
+        except Exception as e:
+            self.OnError(error_func, e)
             return
+        self.OnFileReady(callback)
 
-        if renderer == "flam4":
-            channels = 4
+    def OnError(self, error_func, e):
+        if error_func is None:
+            traceback.print_exc()
         else:
-            channels = kwds.get("transparent", False) + 3
-        # args[1] is always size...
-        self.OnImageReady(callback, args[1], output_buffer, channels)
+            self.OnErrorReady(error_func, e)
 
-    def prog_wrapper(self, f, flag):
-        @Catches(TypeError)
-        def prog_func(*args):
-            return self.exitflag or f(*args) or getattr(self, flag)
+    @InMainFast
+    def OnErrorReady(self, error_func, e):
+        error_func(e)
 
-        return prog_func
+    @InMainFast
+    def OnFileReady(self, callback):
+        callback(None)
 
     @InMainFast
     def OnImageReady(self, callback, xxx_todo_changeme, output_buffer, channels):
@@ -142,4 +233,8 @@ class Renderer:
             fun = wx.BitmapFromBufferRGBA
         else:
             raise ValueError("need 3 or 4 channels, not %s" % channels)
-        callback(fun(w, h, output_buffer))
+        bmp = fun(w, h, output_buffer)
+        # The bitmap holds its own copy of the image, so the buffer can be
+        # reused for the next render.
+        self.buffers.put(output_buffer)
+        callback(bmp)
@@ -0,0 +1,140 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Writes rendered images to disk without going through wx, so that images
+with more than 8 bits per channel can be saved too. Png files can be
+written a few rows at a time, for images which don't fit in memory."""
+import os, struct, zlib
+
+import numpy
+
+
+class PngWriter(object):
+    """Streams an 8 or 16-bit RGB or RGBA image to a png file. Rows are
+    passed to write as (rows, width, channels) arrays, from top to bottom,
+    and compressed straight into the file."""
+
+    def __init__(self, path, size, channels=3, depth=8, level=6):
+        if channels not in (3, 4):
+            raise ValueError("need 3 or 4 channels, not %s" % channels)
+        if depth not in (8, 16):
+            raise ValueError("need a depth of 8 or 16 bits, not %s" % depth)
+        self.width, self.height = size
+        self.channels = channels
+        # Png stores 16-bit samples in network byte order.
+        self._dtype = numpy.dtype(">u2" if depth == 16 else "u1")
+        self.rows = 0
+        self._compressor = zlib.compressobj(level)
+        self._file = open(path, "wb")
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 6 if channels == 4 else 2
+        header = struct.pack(
+            ">IIBBBBB", self.width, self.height, depth, color_type, 0, 0, 0
+        )
+        self._chunk(b"IHDR", header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+        elif not self._file.closed:
+            self.close()
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def write(self, rows):
+        rows = numpy.asarray(rows)
+        if rows.shape[1:] != (self.width, self.channels):
+            raise ValueError("Rows have shape %s." % (rows.shape,))
+        if self.rows + len(rows) > self.height:
+            raise ValueError("Too many rows for image.")
+        data = numpy.ascontiguousarray(rows, self._dtype).view(numpy.uint8)
+        # Each row starts with its filter type, which is always 0 (none).
+        stride = self.width * self.channels * self._dtype.itemsize + 1
+        scanlines = numpy.zeros((len(rows), stride), numpy.uint8)
+        scanlines[:, 1:] = data.reshape(len(rows), -1)
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows += len(rows)
+
+    def discard(self):
+        """Closes the file and removes it, leaving no half-written image."""
+        self._file.close()
+        os.remove(self._file.name)
+
+    def close(self):
+        if self.rows != self.height:
+            self._file.close()
+            raise ValueError("Image has %s rows, not %s." % (self.rows, self.height))
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+
+def write_png(path, image):
+    """Writes a (height, width, channels) uint8 or uint16 array to a png
+    file with the matching bit depth."""
+    image = numpy.asarray(image)
+    if image.dtype == numpy.uint8:
+        depth = 8
+    elif image.dtype == numpy.uint16:
+        depth = 16
+    else:
+        raise ValueError("Can't write %s data to a png file." % image.dtype)
+    height, width, channels = image.shape
+    with PngWriter(path, (width, height), channels, depth) as writer:
+        writer.write(image)
+
+
+def write_pfm(path, image):
+    """Writes a (height, width, 3) float array to a portable float map."""
+    image = numpy.asarray(image)
+    if image.dtype.kind != "f":
+        raise ValueError("Can't write %s data to a pfm file." % image.dtype)
+    height, width, channels = image.shape
+    if channels != 3:
+        raise ValueError("pfm files have no alpha channel, use npy instead.")
+    with open(path, "wb") as f:
+        # A negative scale marks the data as little endian.
+        f.write(b"PF\n%d %d\n-1.0\n" % (width, height))
+        # Rows are stored from bottom to top.
+        f.write(numpy.ascontiguousarray(image[::-1], "<f4").tobytes())
+
+
+def save_array(path, image):
+    """Writes an image array to a png, pfm or npy file, depending on the
+    extension of path."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png":
+        write_png(path, image)
+    elif ext == ".pfm":
+        write_pfm(path, image)
+    elif ext == ".npy":
+        numpy.save(path, image)
+    else:
+        raise ValueError("Can't write arrays to %s files." % ext)
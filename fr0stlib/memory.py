@@ -0,0 +1,241 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Works out how much memory a flam3 or numpy engine render needs, and what
+to change when there isn't enough of it."""
+import sys, os, math, collections, ctypes
+from ctypes import byref
+
+import numpy
+
+from fr0stlib.pyflam3 import flam3_render_memory_required
+from fr0stlib.engine import gaussian_filter
+from fr0stlib.engine.density import density_estimator
+
+# Buffer depths understood by flam3, from largest to smallest. 33 stands for
+# 32-bit float buckets.
+BUFFER_DEPTHS = 64, 33, 32
+
+# Support of the widest spatial filter (lanczos3), in filter radii.
+MAX_FILTER_SUPPORT = 3.0
+
+# Bytes per histogram bucket used by the numpy engine: the float64 rgba
+# bucket itself, up to one pending point per bucket (index, rgb and weight)
+# plus their concatenated copy, and the float64 copies made while tone
+# mapping.
+ENGINE_BUCKET_BYTES = 32 + 2 * 40 + 64
+
+
+class MemoryPlan(
+    collections.namedtuple("MemoryPlan", "required available buffer_depth strips")
+):
+    """required is the number of bytes the render needs as requested, and
+    available the number of bytes free (None if unknown). buffer_depth is a
+    smaller depth to render with instead (None keeps the requested one), and
+    strips the number of strips to split the render into. strips is None if
+    the render doesn't fit at all."""
+
+    @property
+    def fits(self):
+        return self.strips == 1 and self.buffer_depth is None
+
+
+def image_memory(frame, size, transparent=0, dtype=None):
+    """Returns the number of bytes taken by the output image of frame. If
+    the image is converted to another dtype afterwards, e.g. float32, the
+    converted copy is counted too."""
+    pixels = size[0] * size[1] * (transparent + 3)
+    nbytes = pixels * frame.bytes_per_channel
+    if dtype is not None and numpy.dtype(dtype).itemsize != frame.bytes_per_channel:
+        nbytes += pixels * numpy.dtype(dtype).itemsize
+    return nbytes
+
+
+def frame_memory(frame, size, transparent=0, dtype=None):
+    """Returns the number of bytes needed to render frame at size, counting
+    both flam3's buckets and the output image."""
+    genome = frame.genomes[0]
+    width, height = genome.width, genome.height
+    genome.width, genome.height = size
+    try:
+        buckets = flam3_render_memory_required(byref(frame))
+    finally:
+        genome.width, genome.height = width, height
+    return int(buckets) + image_memory(frame, size, transparent, dtype)
+
+
+def engine_memory(
+    size,
+    transparent=0,
+    dtype=None,
+    spatial_oversample=1,
+    filter_radius=1,
+    estimator=9,
+    estimator_curve=0.4,
+    estimator_minimum=0,
+    **kwds
+):
+    """Returns the number of bytes needed to render at size with the numpy
+    engine, counting its histogram and the output image. Takes the same
+    keywords as numpy_render; the ones that only make sense for flam3 are
+    ignored."""
+    oversample = int(spatial_oversample)
+    gutter = (len(gaussian_filter(filter_radius, oversample)) - oversample) // 2
+    if estimator > 0:
+        gutter += density_estimator(
+            estimator, estimator_minimum, estimator_curve, oversample
+        ).radius
+    width, height = size
+    buckets = (width * oversample + 2 * gutter) * (height * oversample + 2 * gutter)
+    pixels = width * height * (transparent + 3)
+    itemsize = numpy.dtype(numpy.uint8 if dtype is None else dtype).itemsize
+    return buckets * ENGINE_BUCKET_BYTES + pixels * itemsize
+
+
+def strip_margin(genome):
+    """Returns the number of rows each strip overlaps its neighbours by, so
+    that the spatial filter and density estimator see the same samples as
+    in a single render, and no seams show."""
+    return int(math.ceil(MAX_FILTER_SUPPORT * genome.spatial_filter_radius)) + int(
+        math.ceil(genome.estimator)
+    )
+
+
+def _meminfo():
+    with open("/proc/meminfo") as f:
+        info = dict(line.split(":", 1) for line in f if ":" in line)
+    kb = dict((k, int(v.split()[0])) for k, v in info.items())
+    if "MemAvailable" in kb:
+        return kb["MemAvailable"] * 1024
+    # Kernels older than 3.14 don't report MemAvailable.
+    return (kb["MemFree"] + kb.get("Buffers", 0) + kb.get("Cached", 0)) * 1024
+
+
+class _MemoryStatusEx(ctypes.Structure):
+    _fields_ = [
+        ("dwLength", ctypes.c_ulong),
+        ("dwMemoryLoad", ctypes.c_ulong),
+        ("ullTotalPhys", ctypes.c_ulonglong),
+        ("ullAvailPhys", ctypes.c_ulonglong),
+        ("ullTotalPageFile", ctypes.c_ulonglong),
+        ("ullAvailPageFile", ctypes.c_ulonglong),
+        ("ullTotalVirtual", ctypes.c_ulonglong),
+        ("ullAvailVirtual", ctypes.c_ulonglong),
+        ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+    ]
+
+
+def _memorystatus():
+    status = _MemoryStatusEx()
+    status.dwLength = ctypes.sizeof(status)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(byref(status)):
+        raise OSError("GlobalMemoryStatusEx failed")
+    return status.ullAvailPhys
+
+
+def _sysconf():
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def available_memory():
+    """Returns the number of bytes of physical memory available for a new
+    render, or None if it can't be determined on this platform."""
+    if sys.platform.startswith("linux"):
+        funcs = _meminfo, _sysconf
+    elif sys.platform == "win32":
+        funcs = (_memorystatus,)
+    else:
+        funcs = (_sysconf,)
+    for func in funcs:
+        try:
+            return func()
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+    return None
+
+
+def plan_render(frame, size, transparent=0, available=None, dtype=None, margin=None):
+    """Decides whether frame can be rendered at size as it is. If it can't,
+    a smaller buffer depth is tried first, and failing that the number of
+    strips needed at the requested depth is worked out. Strips are written
+    out as they're done, so only one of them is held in memory, together
+    with the margin it overlaps its neighbours by (worked out from the
+    genome if not given)."""
+    if available is None:
+        available = available_memory()
+    requested = frame.bits
+    required = frame_memory(frame, size, transparent, dtype)
+    if available is None or required <= available:
+        return MemoryPlan(required, available, None, 1)
+
+    try:
+        for depth in BUFFER_DEPTHS[BUFFER_DEPTHS.index(requested) + 1 :]:
+            frame.bits = depth
+            if frame_memory(frame, size, transparent, dtype) <= available:
+                return MemoryPlan(required, available, depth, 1)
+    except ValueError:
+        # Not one of the usual depths, so don't suggest another one.
+        pass
+    finally:
+        frame.bits = requested
+
+    if margin is None:
+        margin = strip_margin(frame.genomes[0])
+    width, height = size
+
+    def fits(rows):
+        rows = min(height, rows + 2 * margin)
+        return frame_memory(frame, (width, rows), transparent, dtype) <= available
+
+    if not fits(1):
+        return MemoryPlan(required, available, None, None)
+    # Find the tallest strip that fits.
+    low, high = 1, height
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return MemoryPlan(required, available, None, -(-height // low))
+
+
+def plan_engine_render(size, transparent=0, available=None, dtype=None, **kwds):
+    """Like plan_render, for the numpy engine. The engine can neither change
+    its buffer depth nor render in strips, so the plan either fits as it is
+    or not at all."""
+    if available is None:
+        available = available_memory()
+    required = engine_memory(size, transparent, dtype, **kwds)
+    if available is None or required <= available:
+        return MemoryPlan(required, available, None, 1)
+    return MemoryPlan(required, available, None, None)
+
+
+def check_memory(frame, size, transparent=0, dtype=None):
+    """Raises MemoryError if frame can't be rendered at size as it is, so
+    that flam3 doesn't run out of memory halfway through the render."""
+    plan = plan_render(frame, size, transparent, dtype=dtype)
+    if not plan.fits:
+        raise MemoryError(
+            "Render needs %.2f MB, but only %.2f MB are available."
+            % (plan.required / 1024.0**2, plan.available / 1024.0**2)
+        )
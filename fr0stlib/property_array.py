@@ -19,41 +19,128 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import collections, sys, numpy
+import weakref, numpy
 
 
 class _property_array(numpy.ndarray):
-    def __new__(cls, parent, instance, data):
-        obj = numpy.asarray(data).view(cls)
-
-        def callback():
-            parent.fset(instance, obj)
+    """Array returned by a property_array. Assigning to its items writes the
+    whole array back through the property setter. Views and arrays derived
+    from it write back the array they came from."""
 
-        obj.callback = callback
+    def __new__(cls, prop, instance, data):
+        obj = numpy.asarray(data).view(cls)
+        obj._prop = prop
+        obj._ref = weakref.ref(instance)
+        obj._root = None
         return obj
 
     def __array_finalize__(self, obj):
         if obj is None:
             return
-        self.callback = getattr(obj, "callback", None)
+        self._prop = getattr(obj, "_prop", None)
+        self._ref = getattr(obj, "_ref", None)
+        root = getattr(obj, "_root", None)
+        self._root = obj if root is None and self._prop is not None else root
+
+    def callback(self):
+        if self._prop is None:
+            return
+        instance = self._ref()
+        if instance is not None:
+            self._prop.fset(instance, self if self._root is None else self._root)
 
     def __setitem__(self, pos, val):
         numpy.ndarray.__setitem__(self, pos, val)
         self.callback()
 
+    def _uncache(self):
+        """Stops handing out this array, which no longer matches the
+        instance."""
+        root = self if self._root is None else self._root
+        instance = None if root._ref is None else root._ref()
+        entry = None if instance is None else _views.get(id(instance))
+        if entry is not None and entry[1].get(root._prop) is root:
+            del entry[1][root._prop]
+
     def __eq__(self, other):
-        return all(numpy.equal(self, other))
+        return bool(numpy.equal(self, other).all())
 
     def __ne__(self, other):
         return not self == other
 
 
+def _inplace(name):
+    op = getattr(numpy.ndarray, name)
+
+    def method(self, other):
+        self._uncache()
+        return op(self, other)
+
+    method.__name__ = name
+    return method
+
+
+# In place operators change the array without writing back.
+for _name in (
+    "__iadd__",
+    "__isub__",
+    "__imul__",
+    "__itruediv__",
+    "__ifloordiv__",
+    "__imod__",
+    "__ipow__",
+    "__imatmul__",
+    "__iand__",
+    "__ior__",
+    "__ixor__",
+    "__ilshift__",
+    "__irshift__",
+):
+    setattr(_property_array, _name, _inplace(_name))
+
+
 class property_array(property):
+    """A property whose getter returns a numpy array that writes changes back
+    to the instance.
+
+    The array is cached per instance and handed out again on later reads, so
+    they don't allocate. The owner class calls invalidate when it sets one of
+    the attributes the getter depends on. Changing the array with an in place
+    operator (e.g. +=) also drops it, as that doesn't write back. Instances
+    attached to an XformStore are never cached, since the store's arrays can
+    be changed directly."""
+
     def __init__(self, fget, fset=None, fdel=None, fdoc=None):
         if fdel is not None or fdoc is not None:
             raise ValueError("fdel and fdoc are not supported")
 
+        # property.setter passes our wrapper back in, so unwrap it.
+        fget = getattr(fget, "_fget", fget)
+
         def _fget(instance):
-            return _property_array(self, instance, fget(instance))
+            key = id(instance)
+            entry = _views.get(key)
+            if entry is not None:
+                arr = entry[1].get(self)
+                if arr is not None:
+                    return arr
+            arr = _property_array(self, instance, fget(instance))
+            if "_store" not in instance.__dict__:
+                if entry is None:
+                    ref = weakref.ref(instance, lambda r: _views.pop(key, None))
+                    entry = _views[key] = ref, {}
+                entry[1][self] = arr
+            return arr
 
+        _fget._fget = fget
         property.__init__(self, _fget, fset)
+
+
+# The cached arrays of each instance by property, keyed on the instance's
+# id. The weak reference removes the entry when the instance goes away.
+_views = {}
+
+
+def invalidate(instance):
+    """Drops the arrays cached for instance."""
+    _views.pop(id(instance), None)
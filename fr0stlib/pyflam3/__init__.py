@@ -19,7 +19,8 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import sys, os, marshal
+import sys, os, marshal, collections, hashlib, threading, weakref
+import numpy
 
 from ._flam3 import *
 
@@ -68,7 +69,13 @@ class Genome(BaseGenome):
             kwargs["earlyclip"] = True
 
         frame = Frame(**kwargs)
-        frame.genomes, frame.ngenomes = cls.from_string(flamestring)
+        # The genomes are modified below, so the frame gets its own copy.
+        if isinstance(flamestring, tuple):
+            # A (genomes, ngenomes) pair allocated with flam3_malloc, which
+            # the frame takes ownership of.
+            frame.genomes, frame.ngenomes = flamestring
+        else:
+            frame.genomes, frame.ngenomes = genome_cache.copy(flamestring)
 
         for i, genome in enumerate(frame.iter_genomes()):
             genome.interpolation = interpolation
@@ -122,10 +129,199 @@ class Genome(BaseGenome):
         return flam3_print_to_string(self)
 
 
+def free_genomes(address, ngenomes):
+    """Frees an array of genomes, including their xforms."""
+    genomes = cast(address, POINTER(BaseGenome))
+    for i in range(ngenomes):
+        clear_cp(byref(genomes[i]), flam3_defaults_on)
+    flam3_free(genomes)
+
+
+def copy_genomes(genomes, ngenomes):
+    """Returns a deep copy of an array of genomes. The caller owns the copy
+    and is responsible for freeing it with free_genomes."""
+    size = sizeof(BaseGenome) * ngenomes
+    ptr = flam3_malloc(size)
+    if not ptr:
+        raise MemoryError()
+    # flam3_copy clears the destination first, which is only safe if it
+    # doesn't point to garbage.
+    memset(ptr, 0, size)
+    result = cast(ptr, POINTER(BaseGenome))
+    for i in range(ngenomes):
+        flam3_copy(byref(result[i]), byref(genomes[i]))
+    return result
+
+
+CacheInfo = collections.namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+class GenomeCache(object):
+    """LRU cache of parsed genomes, keyed on a digest of the flame string.
+
+    Genomes returned by get are shared between all callers and must not be
+    modified. They stay valid for as long as the caller holds on to them,
+    even after being evicted: the memory is only freed once the pointer
+    (and any genome indexed from it) is garbage collected."""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, flamestring):
+        if isinstance(flamestring, str):
+            flamestring = flamestring.encode("utf-8")
+        return hashlib.blake2b(flamestring, digest_size=16).digest()
+
+    def get(self, flamestring):
+        """Returns a (genomes, ngenomes) tuple, parsing the string only if
+        it's not already cached."""
+        key = self._key(flamestring)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock, so render threads don't block the gui.
+        genomes, ngenomes = Genome.from_string(flamestring)
+        if not genomes:
+            raise ValueError("flam3 could not parse flame string.")
+        # Don't use cast here, it would make the pointer reference itself.
+        weakref.finalize(genomes, free_genomes, addressof(genomes.contents), ngenomes)
+        entry = genomes, ngenomes
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def copy(self, flamestring):
+        """Like get, but returns a private copy which the caller is free to
+        modify. It needs to be released with free_genomes, which Frame
+        takes care of."""
+        genomes, ngenomes = self.get(flamestring)
+        return copy_genomes(genomes, ngenomes), ngenomes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+genome_cache = GenomeCache()
+
+
+def interpolate_sequence(flames, times, stagger=0.0, **kwds):
+    """Interpolates between keyframes at each of the given times. flames
+    are Flame objects or xml strings, sorted by their time attribute. The
+    keyframes are parsed only once, and each interpolated genome goes
+    straight into a Frame, without printing and parsing it again. Yields
+    one Frame per time, set up with the same keywords as Genome.load and
+    ready to be rendered."""
+    strings = (f if isinstance(f, str) else f.to_string() for f in flames)
+    genomes, ngenomes = genome_cache.get("<flames>%s</flames>" % "".join(strings))
+    for time in times:
+        ptr = flam3_malloc(sizeof(BaseGenome))
+        if not ptr:
+            raise MemoryError()
+        # flam3_interpolate clears the result first, like flam3_copy.
+        memset(ptr, 0, sizeof(BaseGenome))
+        result = cast(ptr, POINTER(BaseGenome))
+        flam3_interpolate(genomes, ngenomes, time, stagger, result)
+        yield Genome.load((result, 1), **kwds)
+
+
+class ProgressState(Structure):
+    _fields_ = [
+        ("fraction", c_double),
+        ("stage", c_int),
+        ("eta", c_double),
+        ("updates", c_long),
+        ("command", c_int),
+    ]
+
+
+class ProgressChannel(object):
+    """Progress and control state shared between a render and the code that
+    requested it.
+
+    The flam3 callback does nothing but copy its arguments into a
+    ProgressState and hand back the current command (0: continue, 1: abort,
+    2: pause), so no gui code runs in the render thread. The caller polls
+    the state at whatever rate suits it instead of being called for each
+    update. Pauses are counted by key, so a render paused by the user stays
+    paused when the renderer resumes it, and vice versa."""
+
+    CONTINUE, ABORT, PAUSE = 0, 1, 2
+
+    def __init__(self):
+        self.state = ProgressState()
+        self.callback = ProgressFunction(self.__call__)
+        self.part, self.parts = 0, 1
+        self._pausers = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, param, fraction, stage, eta):
+        state = self.state
+        state.fraction = fraction
+        state.stage = stage
+        state.eta = eta
+        state.updates += 1
+        return state.command
+
+    def poll(self):
+        """Returns a (fraction, stage, eta) tuple. For renders made of
+        several parts, fraction covers all of them."""
+        state = self.state
+        fraction = (self.part * 100.0 + state.fraction) / self.parts
+        return fraction, state.stage, state.eta
+
+    def start_part(self, part, parts):
+        """Marks the start of part (counting from 0) out of parts, for
+        renders split up into several flam3 renders, such as strips."""
+        self.part, self.parts = part, parts
+        self.state.fraction = 0.0
+
+    def cancel(self):
+        with self._lock:
+            self.state.command = self.ABORT
+
+    def pause(self, key="user"):
+        with self._lock:
+            self._pausers.add(key)
+            if self.state.command != self.ABORT:
+                self.state.command = self.PAUSE
+
+    def resume(self, key="user"):
+        with self._lock:
+            self._pausers.discard(key)
+            if self.state.command == self.PAUSE and not self._pausers:
+                self.state.command = self.CONTINUE
+
+    @property
+    def cancelled(self):
+        return self.state.command == self.ABORT
+
+    @property
+    def paused(self):
+        return self.state.command == self.PAUSE
+
+
 class Frame(BaseFrame):
     def __del__(self):
-        # TODO: what if self.genomes is not set?
-        flam3_free(self.genomes)
+        # genomes can be NULL, or missing if __init__ failed.
+        if getattr(self, "genomes", None):
+            free_genomes(addressof(self.genomes.contents), self.ngenomes)
 
     def __init__(
         self,
@@ -149,7 +345,9 @@ class Frame(BaseFrame):
         self.earlyclip = earlyclip
         self.sub_batch_size = sub_batch_size
 
-        if callable(progress_func):
+        if isinstance(progress_func, ProgressChannel):
+            self.progress = progress_func.callback
+        elif callable(progress_func):
             self.progress = ProgressFunction(progress_func)
 
         if nthreads > 0:
@@ -162,7 +360,13 @@ class Frame(BaseFrame):
         for i in range(self.ngenomes):
             yield self.genomes[i]
 
-    def render(self, size, quality, transparent=0, time=0):
+    def render(self, size, quality, transparent=0, time=0, buffer=None):
+        """Renders the genome at the given time. Returns the image as a
+        (height, width, channels) array, together with the render stats.
+        The array holds uint8 values, or uint16 if the frame has 2 bytes
+        per channel. If buffer is given (any writable object supporting the
+        buffer protocol, e.g. from a BufferPool), the image is rendered
+        into it and the array is a view of it."""
         if not all(size):
             raise ZeroDivisionError("Size passed to render function is 0.")
 
@@ -175,15 +379,92 @@ class Frame(BaseFrame):
         genome.height = height
         genome.sample_density = quality
 
-        output_buffer = allocate_output_buffer(size, transparent + 3)
+        channels = transparent + 3
+        shape = height, width, channels
+        dtype = output_dtype(self.bytes_per_channel)
+        if buffer is None:
+            buffer = allocate_output_buffer(size, channels * dtype.itemsize)
+        if (
+            isinstance(buffer, numpy.ndarray)
+            and buffer.shape == shape
+            and buffer.dtype == dtype
+            and buffer.flags.c_contiguous
+        ):
+            # Return pooled arrays as they are, so they can be put back.
+            output = buffer
+        else:
+            output = numpy.frombuffer(
+                buffer, dtype=dtype, count=width * height * channels
+            ).reshape(shape)
+        if not output.flags.writeable:
+            raise ValueError("Output buffer is read-only.")
+
         stats = RenderStats()
         flam3_render(
             byref(self),
-            output_buffer,
+            cast(output.ctypes.data, POINTER(c_ubyte)),
             flam3_field_both,
-            transparent + 3,
+            channels,
             transparent,
             byref(stats),
         )
 
-        return output_buffer, stats
+        return output, stats
+
+
+def output_dtype(bytes_per_channel):
+    """Returns the numpy dtype of images rendered by flam3 with the given
+    number of bytes per channel."""
+    if bytes_per_channel not in (1, 2):
+        raise ValueError(
+            "flam3 renders 1 or 2 bytes per channel, not %s" % bytes_per_channel
+        )
+    return numpy.dtype("uint%d" % (8 * bytes_per_channel))
+
+
+class BufferPool(object):
+    """Keeps output buffers around for reuse, keyed on size, number of
+    channels and dtype, so that repeated renders at the same size don't
+    need to allocate a new image each time. Buffers handed out by get
+    should be returned with put once their contents have been copied
+    elsewhere."""
+
+    def __init__(self, maxbytes=64 * 1024**2):
+        self.maxbytes = maxbytes
+        self.currentbytes = 0
+        self._free = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, size, channels, dtype=numpy.uint8):
+        width, height = size
+        dtype = numpy.dtype(dtype)
+        key = height, width, channels, dtype.str
+        with self._lock:
+            lst = self._free.get(key)
+            if lst:
+                buf = lst.pop()
+                self.currentbytes -= buf.nbytes
+                self._free.move_to_end(key)
+                return buf
+        return numpy.empty(key[:3], dtype=dtype)
+
+    def put(self, buf):
+        if not isinstance(buf, numpy.ndarray) or buf.ndim != 3 or buf.base is not None:
+            # Only arrays handed out by get are kept, not views.
+            return
+        key = buf.shape + (buf.dtype.str,)
+        with self._lock:
+            self._free.setdefault(key, []).append(buf)
+            self._free.move_to_end(key)
+            self.currentbytes += buf.nbytes
+            # Drop the least recently used sizes first.
+            while self.currentbytes > self.maxbytes:
+                key, lst = next(iter(self._free.items()))
+                self.currentbytes -= lst.pop(0).nbytes
+                if not lst:
+                    del self._free[key]
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self.currentbytes = 0
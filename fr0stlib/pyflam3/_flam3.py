@@ -23,10 +23,16 @@ import itertools, sys, os
 from ctypes import *
 from fr0stlib.pyflam3.constants import *
 from fr0stlib.pyflam3.variations import *
-from fr0stlib.pyflam3.find_dll import find_dll
+from fr0stlib.pyflam3.find_dll import find_dll, MissingLibrary
 
 
-libflam3 = find_dll("libflam3")
+try:
+    libflam3 = find_dll("libflam3")
+except OSError as e:
+    # Everything that doesn't call into flam3, including the numpy render
+    # engine, keeps working without it.
+    libflam3 = MissingLibrary("libflam3", e)
+libflam3_loaded = not isinstance(libflam3, MissingLibrary)
 
 
 IteratorFunction = CFUNCTYPE(None, c_void_p, c_double)
@@ -250,6 +256,14 @@ flam3_malloc.restype = c_void_p
 flam3_free = libflam3.flam3_free
 flam3_free.argtypes = [c_void_p]
 
+# void clear_cp(flam3_genome *cp, int def_flag);
+libflam3.clear_cp.argtypes = [POINTER(BaseGenome), c_int]
+clear_cp = libflam3.clear_cp
+
+# void flam3_copy(flam3_genome *dest, flam3_genome *src);
+libflam3.flam3_copy.argtypes = [POINTER(BaseGenome), POINTER(BaseGenome)]
+flam3_copy = libflam3.flam3_copy
+
 # int flam3_estimate_bounding_box(flam3_genome *cp, double eps, int nsamples,
 #             double *bmin, double *bmax, randctx *rc)
 libflam3.flam3_estimate_bounding_box.argtypes = [
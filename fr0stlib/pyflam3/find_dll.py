@@ -3,6 +3,35 @@ import os
 import ctypes
 
 
+class MissingLibrary(object):
+    """Stands in for a shared library that couldn't be loaded. Functions can
+    still be looked up and have their argtypes set, so the bindings import
+    fine, but calling any of them raises the original error."""
+
+    def __init__(self, name, error):
+        self._name = name
+        self._error = error
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        func = _MissingFunction(self, attr)
+        setattr(self, attr, func)
+        return func
+
+
+class _MissingFunction(object):
+    def __init__(self, library, name):
+        self._library = library
+        self.__name__ = name
+
+    def __call__(self, *args, **kwds):
+        raise OSError(
+            "%s can't be called, %s is not available: %s"
+            % (self.__name__, self._library._name, self._library._error)
+        )
+
+
 def find_dll(name, omit_lib_in_windows=False, windows_uses_stdcall=False):
     if "win32" not in sys.platform:
         name += ".so"
@@ -27,7 +56,7 @@ def find_dll(name, omit_lib_in_windows=False, windows_uses_stdcall=False):
                 return dll_type(name)
         except WindowsError:
             print(
-                'ERROR: Unable to load "%s" from "%s"' % (dll_name, dll_dir),
+                'ERROR: Unable to load "%s" from "%s"' % (name, dll_dir),
                 file=sys.stderr,
             )
             raise
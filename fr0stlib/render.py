@@ -19,12 +19,16 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import wx, os
+import wx, os, atexit, numpy
 import xml.etree.cElementTree as etree
 
 import fr0stlib
 from fr0stlib import Flame
-from fr0stlib.pyflam3 import Genome
+from fr0stlib.pyflam3 import Genome, Frame, libflam3_loaded
+from fr0stlib.renderpool import RenderPool
+from fr0stlib.memory import check_memory, strip_margin
+from fr0stlib.imagewriter import PngWriter, save_array
+from fr0stlib.engine import numpy_render
 
 
 types = {
@@ -35,14 +39,18 @@ types = {
 
 
 def save_image(path, img, jpg_quality=95):
+    dirname = os.path.abspath(os.path.dirname(path))
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    if isinstance(img, numpy.ndarray):
+        # Arrays are written without wx, which only handles 8-bit images.
+        save_array(path, img)
+        return
     if isinstance(img, wx.Bitmap):
         img = wx.ImageFromBitmap(img)
     ty = types[os.path.splitext(path)[1]]
     if ty == wx.BITMAP_TYPE_JPEG:
         img.SetOptionInt(wx.IMAGE_OPTION_QUALITY, jpg_quality)
-    dirname = os.path.abspath(os.path.dirname(path))
-    if not os.path.exists(dirname):
-        os.makedirs(dirname)
     img.SaveFile(path, ty)
 
 
@@ -59,13 +67,143 @@ def to_string(flame):
     return flame.to_string()
 
 
-def flam3_render(flame, size, quality, transparent=0, **kwds):
-    """Passes render requests on to flam3."""
-    frame = Genome.load(to_string(flame), **kwds)
-    output_buffer, stats = frame.render(size, quality, transparent)
+def bytes_per_channel(dtype):
+    """Returns the number of bytes per channel flam3 needs to render an
+    image of the given dtype."""
+    dtype = numpy.dtype(dtype)
+    if dtype == numpy.uint8:
+        return 1
+    elif dtype in (numpy.uint16, numpy.float32):
+        return 2
+    raise ValueError("Can't render %s images." % dtype)
+
+
+def to_float(image, buffer=None):
+    """Converts a uint8 or uint16 image to float32 values from 0 to 1,
+    writing them into buffer if one is given."""
+    shape = image.shape
+    if (
+        isinstance(buffer, numpy.ndarray)
+        and buffer.shape == shape
+        and buffer.dtype == numpy.float32
+    ):
+        output = buffer
+    elif buffer is None:
+        output = numpy.empty(shape, numpy.float32)
+    else:
+        output = numpy.frombuffer(buffer, numpy.float32, count=image.size)
+        output = output.reshape(shape)
+    numpy.divide(image, float(numpy.iinfo(image.dtype).max), out=output)
+    return output
+
+
+def flam3_render(
+    flame,
+    size,
+    quality,
+    transparent=0,
+    buffer=None,
+    dtype=numpy.uint8,
+    check=False,
+    **kwds
+):
+    """Passes render requests on to flam3. The image is returned as a
+    (height, width, channels) array, rendered into buffer if one is given.
+    dtype can be uint8, uint16 or float32. Float images are rendered at 16
+    bits and scaled to the 0-1 range. A Frame, such as the ones from
+    pyflam3.interpolate_sequence, is rendered directly, and any other
+    keywords are ignored. If check is true, MemoryError is raised before
+    rendering if there doesn't seem to be enough memory, which is worth the
+    cost only for full renders."""
+    dtype = numpy.dtype(dtype)
+    if isinstance(flame, Frame):
+        frame = flame
+        frame.bytes_per_channel = bytes_per_channel(dtype)
+    else:
+        kwds["bytes_per_channel"] = bytes_per_channel(dtype)
+        frame = Genome.load(to_string(flame), **kwds)
+    if check:
+        check_memory(frame, size, transparent, dtype)
+    if dtype == numpy.float32:
+        output_buffer, stats = frame.render(size, quality, transparent)
+        return to_float(output_buffer, buffer)
+    output_buffer, stats = frame.render(size, quality, transparent, buffer=buffer)
     return output_buffer
 
 
+def preview_qualities(quality, passes, factor=4):
+    """Returns the qualities of the preview passes rendered with flam3 before
+    the final image, ending at quality. flam3 can't add samples to an
+    earlier render, so each pass starts over with factor times the samples
+    of the one before, and the passes before the last one add up to
+    1 / (factor - 1) to the render time. The numpy engine refines a single
+    histogram instead, see numpy_render."""
+    return [quality / float(factor**i) for i in reversed(range(passes))]
+
+
+def flam3_render_strips(
+    flame,
+    size,
+    quality,
+    path,
+    strips,
+    transparent=0,
+    progress_func=None,
+    dtype=numpy.uint8,
+    **kwds
+):
+    """Renders flame into a png file in horizontal strips, each written to
+    the file as soon as it's done, so that only one strip is held in memory
+    at a time. The strips are rendered by moving the center of the genome.
+    dtype is uint8 or uint16, for an 8 or 16-bit png. progress_func is a
+    ProgressChannel, which reports progress over the whole image. Returns
+    False if the render was aborted through it, in which case the file is
+    removed."""
+    dtype = numpy.dtype(dtype)
+    if dtype == numpy.float32:
+        raise ValueError("Can't render float images to a png file.")
+    kwds["bytes_per_channel"] = bytes_per_channel(dtype)
+    channel = kwds["progress_func"] = progress_func
+    frame = Genome.load(to_string(flame), **kwds)
+    genome = frame.genomes[0]
+    width, height = size
+    channels = transparent + 3
+    # Pixels per unit in the final image, the same way flam3 works it out.
+    scale = genome.pixels_per_unit * width / genome.width * 2**genome.zoom
+    center = genome._center[1]
+    margin = strip_margin(genome)
+    rows = -(-height // strips)
+
+    buffer = numpy.empty((min(height, rows + 2 * margin), width, channels), dtype)
+    with PngWriter(path, size, channels, dtype.itemsize * 8) as writer:
+        for i, top in enumerate(range(0, height, rows)):
+            if channel is not None:
+                channel.start_part(i, strips)
+            bottom = min(top + rows, height)
+            # No margin is needed at the edges of the image.
+            start, stop = max(0, top - margin), min(height, bottom + margin)
+            genome._center[1] = center + ((start + stop) / 2.0 - height / 2.0) / scale
+            output, stats = frame.render(
+                (width, stop - start), quality, transparent, buffer=buffer
+            )
+            if channel is not None and channel.cancelled:
+                writer.discard()
+                return False
+            writer.write(output[top - start : bottom - start])
+    return True
+
+
+def process_render(flame, size, quality, buffer=None, dtype=numpy.uint8, **kwds):
+    """Like flam3_render, but runs flam3 in a worker process, so a crash in
+    the library doesn't take the whole app down with it."""
+    dtype = numpy.dtype(dtype)
+    kwds["bytes_per_channel"] = bytes_per_channel(dtype)
+    if dtype == numpy.float32:
+        output_buffer = render_pool.render(to_string(flame), size, quality, **kwds)
+        return to_float(output_buffer, buffer)
+    return render_pool.render(to_string(flame), size, quality, buffer=buffer, **kwds)
+
+
 def flam4_render(flame, size, quality, **kwds):
     """Passes requests on to flam4. Works on windows only for now."""
     from fr0stlib.pyflam3 import _flam4
@@ -76,4 +214,15 @@ def flam4_render(flame, size, quality, **kwds):
     return output_buffer
 
 
-render_funcs = {"flam3": flam3_render, "flam4": flam4_render}
+render_pool = RenderPool()
+atexit.register(render_pool.close)
+
+render_funcs = {
+    "flam3": flam3_render,
+    "flam3-process": process_render,
+    "flam4": flam4_render,
+    "numpy": numpy_render,
+}
+
+# Thumbnails and previews are rendered with flam3, unless it's missing.
+default_renderer = "flam3" if libflam3_loaded else "numpy"
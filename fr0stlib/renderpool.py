@@ -0,0 +1,241 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Runs flam3 renders in a pool of worker processes.
+
+A crash inside libflam3 only takes down the worker process, which is
+replaced on the next render, and the render itself doesn't hold the gil of
+the gui process. Workers write the image straight into a shared memory
+segment, so the only copy made is the one into the caller's buffer."""
+import multiprocessing, threading, traceback
+from multiprocessing import shared_memory
+
+import numpy
+
+from fr0stlib.pyflam3 import output_dtype
+
+
+def render_job(job, output, progress_func):
+    """Renders a job inside a worker process."""
+    from fr0stlib.pyflam3 import Genome
+    from fr0stlib.memory import check_memory
+
+    string, size, quality, transparent, kwds = job
+    check = kwds.pop("check", False)
+    frame = Genome.load(string, progress_func=progress_func, **kwds)
+    if check:
+        check_memory(frame, size, transparent)
+    frame.render(size, quality, transparent, buffer=output)
+
+
+def _worker_loop(conn, progress, command, job_func):
+    def progress_func(py_object, fraction, stage, eta):
+        progress[0], progress[1], progress[2] = fraction, stage, eta
+        return command.value
+
+    shm = None
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        name, job = msg
+        if shm is None or shm.name != name:
+            if shm is not None:
+                shm.close()
+            # Workers share the resource tracker of the parent process, which
+            # owns the segment and unlinks it.
+            shm = shared_memory.SharedMemory(name=name)
+        (width, height), transparent, kwds = job[1], job[3], job[4]
+        shape = height, width, int(transparent) + 3
+        dtype = output_dtype(kwds.get("bytes_per_channel", 1))
+        output = numpy.ndarray(shape, dtype, shm.buf)
+        try:
+            job_func(job, output, progress_func)
+        except Exception:
+            conn.send(traceback.format_exc())
+        else:
+            conn.send(None)
+        finally:
+            # The segment can't be closed while a view is alive.
+            del output
+    if shm is not None:
+        shm.close()
+
+
+class _Worker(object):
+    def __init__(self, context, job_func):
+        self.progress = context.RawArray("d", 3)
+        self.command = context.RawValue("i", 0)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_loop,
+            args=(child_conn, self.progress, self.command, job_func),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.shm = None
+
+    def run(self, job, shape, dtype, progress_func, interval):
+        """Runs job in the worker process and returns a view of the output.
+        progress_func is polled from the calling thread, and its return
+        value is passed on to the worker as in a flam3 progress callback."""
+        nbytes = shape[0] * shape[1] * shape[2] * dtype.itemsize
+        if self.shm is None or self.shm.size < nbytes:
+            self.free_shm()
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.command.value = 0
+        self.progress[:] = [0.0, 0.0, 0.0]
+        self.conn.send((self.shm.name, job))
+
+        while not self.conn.poll(interval):
+            if progress_func is not None:
+                self.command.value = progress_func(None, *self.progress) or 0
+        try:
+            error = self.conn.recv()
+        except EOFError:
+            self.process.join(1)
+            raise RuntimeError(
+                "Render process died (exit code %s)" % self.process.exitcode
+            )
+        if error is not None:
+            raise RuntimeError("Render process failed:\n%s" % error)
+        return numpy.ndarray(shape, dtype, self.shm.buf)
+
+    def free_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.free_shm()
+
+
+class RenderPool(object):
+    """Dispatches renders to up to `processes` worker processes, which are
+    started on demand and kept around for the next render. A worker that
+    dies or is interrupted mid-render is discarded and replaced.
+
+    job_func must be a module level function, as it's passed on to the
+    workers."""
+
+    def __init__(self, processes=2, interval=0.05, job_func=render_job):
+        self.processes = processes
+        self.interval = interval
+        self.job_func = job_func
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._busy = 0
+        self._cond = threading.Condition()
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._busy >= self.processes:
+                self._cond.wait()
+            self._busy += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return _Worker(self._context, self.job_func)
+        except BaseException:
+            self._release(None)
+            raise
+
+    def _release(self, worker):
+        with self._cond:
+            self._busy -= 1
+            if worker is not None:
+                if len(self._idle) + self._busy < self.processes:
+                    self._idle.append(worker)
+                else:
+                    worker.close()
+            self._cond.notify()
+
+    def render(
+        self,
+        flame,
+        size,
+        quality,
+        transparent=0,
+        buffer=None,
+        progress_func=None,
+        **kwds
+    ):
+        """Renders flame (an xml string) in a worker process. Takes the same
+        arguments as flam3_render. progress_func is called from the calling
+        thread every `interval` seconds, and can abort or pause the render
+        through its return value as usual."""
+        width, height = size
+        shape = height, width, int(transparent) + 3
+        dtype = output_dtype(kwds.get("bytes_per_channel", 1))
+        job = flame, size, quality, transparent, kwds
+
+        worker = self._acquire()
+        try:
+            view = worker.run(job, shape, dtype, progress_func, self.interval)
+        except RuntimeError:
+            if not worker.process.is_alive():
+                worker.close(kill=True)
+                worker = None
+            raise
+        except BaseException:
+            # Interrupted mid-render, so the worker's state is unknown.
+            worker.close(kill=True)
+            worker = None
+            raise
+        else:
+            if (
+                isinstance(buffer, numpy.ndarray)
+                and buffer.shape == shape
+                and buffer.dtype == dtype
+            ):
+                output = buffer
+            elif buffer is None:
+                output = numpy.empty(shape, dtype)
+            else:
+                output = numpy.frombuffer(buffer, dtype=dtype, count=view.size)
+                output = output.reshape(shape)
+            output[...] = view
+            del view
+            return output
+        finally:
+            self._release(worker)
+
+    def close(self):
+        """Shuts down all idle workers."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
@@ -0,0 +1,71 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib.pyflam3 import BufferPool
+
+
+class TestBufferPool(TestCase):
+    def setUp(self):
+        self.pool = BufferPool(maxbytes=1000)
+
+    def test_get(self):
+        buf = self.pool.get((20, 10), 3)
+        self.assertEqual(buf.shape, (10, 20, 3))
+        self.assertEqual(buf.dtype, numpy.uint8)
+
+    def test_reuse(self):
+        buf = self.pool.get((10, 10), 3)
+        self.pool.put(buf)
+        self.assertIs(self.pool.get((10, 10), 3), buf)
+        self.assertIsNot(self.pool.get((10, 10), 3), buf)
+
+    def test_keyed_on_channels(self):
+        buf = self.pool.get((10, 10), 3)
+        self.pool.put(buf)
+        self.assertIsNot(self.pool.get((10, 10), 4), buf)
+        self.assertIs(self.pool.get((10, 10), 3), buf)
+
+    def test_keyed_on_dtype(self):
+        buf = self.pool.get((10, 10), 3)
+        self.pool.put(buf)
+        wide = self.pool.get((10, 10), 3, numpy.uint16)
+        self.assertIsNot(wide, buf)
+        self.assertEqual(wide.dtype, numpy.uint16)
+        self.assertIs(self.pool.get((10, 10), 3), buf)
+
+    def test_views_ignored(self):
+        buf = self.pool.get((10, 10), 3)
+        self.pool.put(buf[::2])
+        self.pool.put(bytearray(300))
+        self.assertEqual(self.pool.currentbytes, 0)
+
+    def test_limit(self):
+        old = self.pool.get((10, 10), 3)
+        self.pool.put(old)
+        for i in range(3):
+            self.pool.put(numpy.empty((10, 10, 4), numpy.uint8))
+        self.assertEqual(self.pool.currentbytes, 800)
+        # The least recently used size goes first.
+        self.assertIsNot(self.pool.get((10, 10), 3), old)
@@ -0,0 +1,136 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import math
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib.engine import density, log_scale
+from fr0stlib.engine.density import DensityEstimator, density_estimator
+
+
+def reference_de(buckets, k1, k2, max_radius, min_radius, curve):
+    """Density estimation one bucket at a time, written out the way flam3
+    does it."""
+    comp_max = max_radius + 1.0
+    comp_min = min_radius + 1.0
+    half = int(math.ceil(comp_max))
+    height, width = buckets.shape[:2]
+    out = numpy.zeros_like(buckets)
+    for y in range(height):
+        for x in range(width):
+            c = buckets[y, x]
+            if c[3] == 0:
+                continue
+            hits = c[3] / 255.0
+            if hits <= 100:
+                i = math.ceil(hits) - 1
+            else:
+                i = 100 + math.floor((hits - 100) ** curve)
+            if i >= 100:
+                i = (i - 100) ** (1.0 / curve) + 100
+            h = max(comp_max / (i + 1.0) ** curve, comp_min)
+            kernel = {}
+            for dy in range(-half, half + 1):
+                for dx in range(-half, half + 1):
+                    d = math.sqrt(dy * dy + dx * dx) / h
+                    if d <= 1:
+                        kernel[dy, dx] = math.exp(-2 * (1.5 * d) ** 2)
+            total = sum(kernel.values())
+            ls = k1 * math.log1p(c[3] * k2) / c[3]
+            for (dy, dx), k in kernel.items():
+                if 0 <= y + dy < height and 0 <= x + dx < width:
+                    out[y + dy, x + dx] += k / total * ls * c
+    return out
+
+
+def random_buckets(shape, seed=0):
+    rng = numpy.random.default_rng(seed)
+    buckets = numpy.zeros(shape + (4,))
+    hit = rng.random(shape) < 0.3
+    buckets[hit, 3] = rng.integers(1, 400, hit.sum()) * 255.0
+    buckets[hit, :3] = rng.random((hit.sum(), 3)) * buckets[hit, 3:]
+    return buckets
+
+
+class TestDensityEstimator(TestCase):
+    def test_kernels(self):
+        de = DensityEstimator(9, 0, 0.4)
+        self.assertEqual(de.radius, 10)
+        self.assertTrue((numpy.diff(de.widths) < 0).all())
+        self.assertEqual(de.widths[-1], 1.0)
+        numpy.testing.assert_allclose(de.kernels.sum(axis=1), 1)
+        # The narrowest kernel only covers the bucket and its neighbours.
+        self.assertEqual(numpy.count_nonzero(de.kernels[-1]), 5)
+
+    def test_select(self):
+        de = DensityEstimator(9, 0, 0.4)
+        index = de.select(numpy.array([0.5, 1, 1.5, 2, 1e6]))
+        self.assertEqual(list(index), [0, 0, 1, 1, len(de.widths) - 1])
+
+    def test_reference(self):
+        buckets = random_buckets((12, 14))
+        k1, k2 = 255.0, 1e-3
+        # The last one has kernels for densities past DE_THRESH.
+        for args in (3, 0.5, 0.4), (3, 0.5, 0.9), (12, 0, 0.3):
+            de = DensityEstimator(*args)
+            expected = reference_de(buckets, k1, k2, *args)
+            numpy.testing.assert_allclose(de.apply(buckets, k1, k2), expected)
+
+    def test_conserved(self):
+        # Away from the edges, the kernels only move brightness around.
+        buckets = numpy.zeros((30, 30, 4))
+        buckets[10:20, 10:20] = random_buckets((10, 10), 1)
+        de = DensityEstimator(5, 0, 0.4)
+        out = de.apply(buckets, 100.0, 1e-2)
+        expected = log_scale(buckets, 100.0, 1e-2)
+        numpy.testing.assert_allclose(out.sum((0, 1)), expected.sum((0, 1)))
+
+    def test_tiles(self):
+        buckets = random_buckets((20, 10))
+        de = DensityEstimator(4, 0, 0.4)
+        whole = de.apply(buckets, 1.0, 1.0)
+        tile_size = density.TILE_SIZE
+        density.TILE_SIZE = 25
+        try:
+            tiled = de.apply(buckets, 1.0, 1.0)
+        finally:
+            density.TILE_SIZE = tile_size
+        numpy.testing.assert_allclose(whole, tiled)
+
+    def test_oversample(self):
+        buckets = numpy.zeros((4, 4, 4))
+        buckets[1:3, 1:3, 3] = 255.0
+        de = DensityEstimator(2, 0, 0.4, oversample=2)
+        self.assertEqual(de.radius, 5)
+        counts = de.counts(buckets)
+        self.assertEqual(counts[1, 1], 4)
+        self.assertEqual(counts[2, 2], 1)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, DensityEstimator, 9, 0, 0)
+        self.assertRaises(ValueError, DensityEstimator, 1, 2, 0.4)
+
+    def test_cache(self):
+        de = density_estimator(9, 0, 0.4)
+        self.assertTrue(density_estimator(9.0, 0, 0.4) is de)
+        self.assertFalse(density_estimator(9, 1, 0.4) is de)
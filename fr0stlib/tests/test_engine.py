@@ -0,0 +1,222 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib import Flame
+from fr0stlib.engine import Accumulation, CompiledFlame, gaussian_filter
+from fr0stlib.engine import bounding_box, colorhist, numpy_render, xform_preview
+
+
+def sierpinski():
+    # f is negated on the way to flam3, so the triangle spans (0, 0), (2, 0)
+    # and (0, 2) in flam3's orientation.
+    flame = Flame()
+    flame.add_xform(coefs=(0.5, 0, 0, 0.5, 0, 0), linear=1, weight=1, color=0)
+    flame.add_xform(coefs=(0.5, 0, 0, 0.5, 1, 0), linear=1, weight=1, color=0.5)
+    flame.add_xform(coefs=(0.5, 0, 0, 0.5, 0, -1), linear=1, weight=1, color=1)
+    flame.gradient.data[:] = 255
+    flame.center = 0.5, 0.5
+    flame.scale = 50
+    return flame
+
+
+class TestEngine(TestCase):
+    def test_render(self):
+        # Density estimation would blur the edges of the triangle.
+        img = numpy_render(sierpinski(), (64, 48), 5, estimator=0, fixed_seed=True)
+        self.assertEqual(img.shape, (48, 64, 3))
+        self.assertEqual(img.dtype, numpy.uint8)
+        # The triangle covers the bottom right, the rest stays black.
+        self.assertEqual(img[:5].max(), 0)
+        self.assertEqual(img[:, :10].max(), 0)
+        self.assertTrue(img[10:, 20:].max() > 0)
+
+    def test_orientation(self):
+        # Written as f=-0.2 for flam3, so the attractor is the segment from
+        # (0, -0.4) to (0.2, -0.4), which flam3 draws near the top.
+        flame = Flame()
+        flame.add_xform(coefs=(0.5, 0, 0, 0.5, 0, 0.2), linear=1, weight=1)
+        flame.add_xform(coefs=(0.5, 0, 0, 0.5, 0.1, 0.2), linear=1, weight=1)
+        flame.gradient.data[:] = 255
+        flame.scale = 25
+        img = numpy_render(flame, (64, 64), 5, estimator=0, fixed_seed=True)
+        # 16 pixels per unit, with the center of the flame at row/column 32.
+        rows, cols = numpy.nonzero(img.max(axis=2))
+        self.assertTrue(abs(rows.mean() - (32 - 0.4 * 16)) < 1.5)
+        self.assertTrue(abs(cols.mean() - (32 + 0.1 * 16)) < 1.5)
+        # The post transform uses the same orientation. It moves the points
+        # up by another 0.2 each time, so they settle at y = -0.8.
+        for x in flame.xform:
+            x.post.coefs = 1, 0, 0, 1, 0, 0.2
+        img = numpy_render(flame, (64, 64), 5, estimator=0, fixed_seed=True)
+        rows, cols = numpy.nonzero(img.max(axis=2))
+        self.assertTrue(abs(rows.mean() - (32 - 0.8 * 16)) < 1.5)
+
+    def test_fixed_seed(self):
+        flame = sierpinski()
+        img = numpy_render(flame, (32, 24), 5, fixed_seed=True)
+        same = numpy_render(flame, (32, 24), 5, fixed_seed=True)
+        self.assertTrue((img == same).all())
+
+    def test_transparent(self):
+        img = numpy_render(
+            sierpinski(),
+            (32, 24),
+            5,
+            1,
+            dtype=numpy.float32,
+            spatial_oversample=2,
+            estimator=0,
+        )
+        self.assertEqual(img.shape, (24, 32, 4))
+        self.assertEqual(img[:2, :, 3].max(), 0)
+        self.assertTrue(0 < img[..., 3].max() <= 1)
+
+    def test_buffer(self):
+        buffer = numpy.zeros((24, 32, 3), numpy.uint16)
+        img = numpy_render(sierpinski(), (32, 24), 5, buffer=buffer, dtype="u2")
+        self.assertTrue(img is buffer)
+        self.assertTrue(buffer.max() > 255)
+
+    def test_abort(self):
+        # The buffer is cleared, not left with whatever it held before.
+        buffer = numpy.full((24, 32, 3), 255, numpy.uint8)
+        calls = []
+
+        def prog(py_object, fraction, stage, eta):
+            calls.append(fraction)
+            return 1
+
+        numpy_render(sierpinski(), (32, 24), 1000, buffer=buffer, progress_func=prog)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(buffer.max(), 0)
+
+    def test_passes(self):
+        images, fractions = [], []
+
+        def prog(py_object, fraction, stage, eta):
+            fractions.append(fraction)
+
+        img = numpy_render(
+            sierpinski(),
+            (32, 24),
+            16,
+            passes=3,
+            pass_func=lambda img: images.append(img.copy()),
+            progress_func=prog,
+            fixed_seed=True,
+        )
+        self.assertEqual(len(images), 2)
+        self.assertTrue(all(i.max() > 0 for i in images))
+        self.assertTrue(img.max() > 0)
+        # Progress covers all the passes together.
+        self.assertEqual(fractions, sorted(fractions))
+        self.assertEqual(fractions[-1], 100.0)
+
+    def test_abort_pass(self):
+        images = []
+
+        def prog(py_object, fraction, stage, eta):
+            return int(bool(images))
+
+        img = numpy_render(
+            sierpinski(),
+            (32, 24),
+            16,
+            passes=2,
+            pass_func=lambda img: images.append(img.copy()),
+            progress_func=prog,
+        )
+        # Aborting the last pass keeps the image of the first.
+        self.assertEqual(len(images), 1)
+        self.assertTrue(img.max() > 0)
+        self.assertTrue((img == images[0]).all())
+
+    def test_accumulation(self):
+        acc = Accumulation(sierpinski(), (32, 24), fixed_seed=True)
+        self.assertTrue(acc.iterate(1))
+        first = acc.hist.buckets[..., 3].sum()
+        self.assertTrue(acc.iterate(4))
+        self.assertEqual(acc.nsamples, acc.samples(4))
+        # The second pass adds to the same buckets.
+        self.assertTrue(acc.hist.buckets[..., 3].sum() > 3 * first)
+        self.assertEqual(acc.result().shape, (24, 32, 4))
+
+    def test_variations(self):
+        flame = sierpinski()
+        flame.xform[0].linear = 0
+        flame.xform[0].julian = 1
+        flame.xform[0].julian_power = 3
+        flame.xform[1].mobius = 0.5
+        flame.add_final(spherical=0.5)
+        img = numpy_render(flame, (32, 24), 5, fixed_seed=True)
+        self.assertTrue(img.max() > 0)
+
+    def test_chaos(self):
+        flame = sierpinski()
+        flame.xform[0].chaos[:] = 0, 1, 0
+        flame.xform[1].chaos[:] = 0, 0, 1
+        cflame = CompiledFlame(flame)
+        rng = numpy.random.default_rng(0)
+        prev = numpy.array([0, 0, 1, 1, 2, 2])
+        chosen = cflame.choose_xforms(prev, rng)
+        self.assertEqual(list(chosen[:4]), [1, 1, 2, 2])
+
+    def test_density_estimation(self):
+        flame = sierpinski()
+        flame.scale = 10
+        sharp = numpy_render(flame, (32, 24), 2, estimator=0, fixed_seed=True)
+        smooth = numpy_render(flame, (32, 24), 2, fixed_seed=True)
+        self.assertTrue((smooth > 0).sum() > (sharp > 0).sum())
+
+    def test_gaussian_filter(self):
+        for oversample in (1, 2, 3):
+            kernel = gaussian_filter(1, oversample)
+            self.assertAlmostEqual(kernel.sum(), 1)
+            self.assertEqual((len(kernel) - oversample) % 2, 0)
+
+    def test_colorhist(self):
+        hist = colorhist(sierpinski(), rng=numpy.random.default_rng(0))
+        self.assertEqual(hist.shape, (256,))
+        self.assertAlmostEqual(hist.sum(), 1)
+        # Colors are averaged towards the xforms' 0, 0.5 and 1.
+        self.assertTrue(hist[:16].sum() > 0)
+        self.assertTrue(hist[240:].sum() > 0)
+
+    def test_bounding_box(self):
+        low, high = bounding_box(sierpinski(), 0.01, rng=numpy.random.default_rng(0))
+        for value in low:
+            self.assertTrue(0 <= value < 0.1)
+        for value in high:
+            self.assertTrue(1.8 < value <= 2)
+
+    def test_xform_preview(self):
+        # Written as f=0.25 for flam3, so points move down by 0.25.
+        flame = Flame()
+        xform = flame.add_xform(coefs=(1, 0, 0, 1, 0.5, 0.25), linear=1)
+        points = xform_preview(xform, 1.0, 2, 1)
+        self.assertEqual(points.shape, (25, 2))
+        # flam3 steps through y first.
+        self.assertTrue(numpy.allclose(points[:2], [(-0.5, -1.25), (-0.5, -0.75)]))
+        self.assertTrue(numpy.allclose(points[-1], (1.5, 0.75)))
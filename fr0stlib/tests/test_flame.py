@@ -0,0 +1,182 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+from fr0stlib import Flame, Xform, Palette, Chaos, ParsingError
+
+
+def make_flame():
+    flame = Flame()
+    flame.name = "test flame"
+    flame.background = [0, 0.5, 1.0]
+    flame.gradient[:] = [(i, 255 - i, i // 2) for i in range(256)]
+    x1 = flame.add_xform(spherical=0.5, julian=0.25, julian_power=3, plotmode="on")
+    x1.coefs = 0.5, 0.1, -0.2, 0.75, 1, -1
+    x2 = flame.add_xform(weight=0.5, color=1.0)
+    x2.post.coefs = 1, 2, 3, 4, 5, 6
+    x1.chaos[1] = 0
+    x2.chaos[0] = 2.5
+    flame.add_final(swirl=1.0)
+    return flame
+
+
+class TestFlameBytes(TestCase):
+    def setUp(self):
+        self.flame = make_flame()
+
+    def test_roundtrip(self):
+        flame = Flame().from_bytes(self.flame.to_bytes())
+        self.assertEqual(flame.to_string(), self.flame.to_string())
+        self.assertEqual(list(flame.__dict__), list(self.flame.__dict__))
+        self.assertEqual(len(flame.xform), 2)
+        self.assertTrue(flame.final.isfinal())
+        for x in flame.iter_xforms():
+            self.assertIs(x._parent, flame)
+            self.assertIs(x.post._parent, x)
+            self.assertIs(x.chaos._parent, x)
+        self.assertEqual(list(flame.xform[0].chaos), [1.0, 0])
+        self.assertEqual(list(flame.xform[1].chaos), [2.5, 1.0])
+
+    def test_roundtrip_parsed(self):
+        flame = Flame(self.flame.to_string())
+        result = Flame().from_bytes(flame.to_bytes())
+        self.assertEqual(result.to_string(), flame.to_string())
+
+    def test_size(self):
+        self.assertLess(len(self.flame.to_bytes()), len(self.flame.to_string()) / 3)
+
+    def test_invalid(self):
+        self.assertRaises(ParsingError, Flame().from_bytes, b"<flame />")
+
+    def test_xform(self):
+        x = self.flame.xform[0]
+        new = self.flame.add_xform().from_bytes(x.to_bytes())
+        self.assertEqual(new.to_string(), x.to_string())
+        self.assertIs(new._parent, self.flame)
+
+    def test_palette(self):
+        palette = Palette().from_bytes(self.flame.gradient.to_bytes())
+        self.assertEqual(len(self.flame.gradient.to_bytes()), 768)
+        self.assertEqual(palette.to_string(), self.flame.gradient.to_string())
+
+    def test_chaos(self):
+        x1, x2 = self.flame.xform
+        chaos = Chaos(x2).from_bytes(x1.chaos.to_bytes())
+        self.assertEqual(list(chaos), list(x1.chaos))
+
+
+class TestFlameCopy(TestCase):
+    def setUp(self):
+        self.flame = make_flame()
+
+    def test_copy(self):
+        flame = self.flame.copy()
+        self.assertEqual(flame.to_string(), self.flame.to_string())
+        self.assertEqual(list(flame.__dict__), list(self.flame.__dict__))
+        self.assertIsNot(flame.gradient, self.flame.gradient)
+        self.assertIsNot(flame.background, self.flame.background)
+        for x, y in zip(flame.iter_xforms(), self.flame.iter_xforms()):
+            self.assertIsNot(x, y)
+            self.assertIs(x._parent, flame)
+            self.assertIs(x.post._parent, x)
+            self.assertEqual(list(x.coefs), list(y.coefs))
+            self.assertEqual(list(x.post.coefs), list(y.post.coefs))
+
+    def test_independent(self):
+        flame = self.flame.copy()
+        flame.xform[0].spherical = 2
+        flame.xform[1].post.c = 7
+        flame.gradient[0] = 1, 2, 3
+        flame.background[0] = 1
+        self.assertEqual(self.flame.xform[0].spherical, 0.5)
+        self.assertEqual(self.flame.xform[1].post.c, 5)
+        self.assertEqual(tuple(self.flame.gradient[0]), (0, 255, 0))
+        self.assertEqual(self.flame.background[0], 0)
+
+    def test_chaos(self):
+        flame = self.flame.copy()
+        self.assertEqual(list(flame.xform[0].chaos), [1.0, 0])
+        self.assertEqual(list(flame.xform[1].chaos), [2.5, 1.0])
+        for x in flame.xform:
+            self.assertTrue(all(k._parent is flame for k in x.chaos._dict))
+        flame.xform[0].chaos[1] = 3
+        self.assertEqual(self.flame.xform[0].chaos[1], 0)
+
+    def test_xform_copy(self):
+        x = self.flame.xform[0]
+        copy = x.copy()
+        self.assertIs(self.flame.xform[-1], copy)
+        self.assertEqual(copy.spherical, 0.5)
+        self.assertEqual(copy.plotmode, "on")
+        self.assertEqual(list(copy.coefs), list(x.coefs))
+        self.assertEqual(list(copy.chaos), [1.0, 0, 1.0])
+        self.assertEqual(list(self.flame.xform[1].chaos), [2.5, 1.0, 1.0])
+        self.assertIs(self.flame.final.copy(), self.flame.final)
+
+
+class TestFingerprint(TestCase):
+    def setUp(self):
+        self.flame = make_flame()
+        self.fp = self.flame.fingerprint()
+
+    def test_digest(self):
+        self.assertEqual(len(self.fp), 16)
+        self.assertEqual(self.fp, self.flame.fingerprint())
+
+    def test_roundtrip(self):
+        self.assertEqual(Flame(self.flame.to_string()).fingerprint(), self.fp)
+        self.assertEqual(self.flame.copy().fingerprint(), self.fp)
+
+    def test_canonical(self):
+        flame = make_flame()
+        del flame.name
+        flame.name = "test flame"
+        flame.xform[1].weight = 0
+        flame.xform[1].weight = 0.5
+        flame.xform[0].coefs = 0.5, 0.1, -0.2, 0.75, 1.0, -1.0
+        self.assertEqual(flame.fingerprint(), self.fp)
+
+    def test_unset_variation(self):
+        flame = make_flame()
+        flame.xform[1].swirl = 0
+        self.assertEqual(flame.fingerprint(), self.fp)
+
+    def test_cosmetic(self):
+        flame = make_flame()
+        flame.name = "other"
+        self.assertNotEqual(flame.fingerprint(), self.fp)
+        self.assertEqual(
+            flame.fingerprint(cosmetic=False), self.flame.fingerprint(cosmetic=False)
+        )
+
+    def test_changes(self):
+        def change(func):
+            flame = make_flame()
+            func(flame)
+            self.assertNotEqual(flame.fingerprint(), self.fp)
+
+        change(lambda f: setattr(f.xform[0], "c", -0.2000001))
+        change(lambda f: setattr(f.xform[1].post, "f", 6.5))
+        change(lambda f: f.xform[0].chaos.__setitem__(1, 0.5))
+        change(lambda f: f.gradient.__setitem__(5, (0, 0, 0)))
+        change(lambda f: setattr(f.final, "swirl", 0.5))
+        change(lambda f: setattr(f, "scale", 1.5))
@@ -0,0 +1,159 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+from io import BytesIO
+import os, shutil, tempfile
+import xml.etree.ElementTree as etree
+
+from fr0stlib import (
+    Flame,
+    save_flames,
+    split_flamestrings,
+    scan_flames,
+    iter_flamestrings,
+    iter_flames,
+    load_flamestrings,
+    load_flames,
+    FlameIndex,
+)
+
+
+def make_flames(n):
+    lst = []
+    for i in range(n):
+        flame = Flame()
+        flame.name = "flame %s" % i
+        flame.add_xform(weight=i + 1, spherical=0.5)
+        flame.gradient[i] = (i, 2 * i, 3 * i)
+        lst.append(flame)
+    return lst
+
+
+class TestFlameFile(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.flame")
+        self.flames = make_flames(5)
+        save_flames(self.path, *self.flames)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_scan_chunks(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        expected = split_flamestrings(data.decode())
+        # Use chunks small enough to split tags across chunk boundaries.
+        for chunksize in (1, 5, 7, 100, 1 << 16):
+            result = list(scan_flames(BytesIO(data), chunksize))
+            self.assertEqual([s.decode() for _, s in result], expected)
+            for offset, s in result:
+                self.assertEqual(data[offset : offset + len(s)], s)
+
+    def test_iter_flamestrings(self):
+        lst = list(iter_flamestrings(self.path))
+        self.assertEqual(lst, [f.to_string() for f in self.flames])
+        self.assertEqual(load_flamestrings(self.path), lst)
+
+    def test_iter_flames(self):
+        itr = iter_flames(self.path)
+        first = next(itr)
+        self.assertEqual(first.name, "flame 0")
+        rest = list(itr)
+        self.assertEqual(len(rest), 4)
+        expected = [Flame(f.to_string()).to_string() for f in self.flames]
+        self.assertEqual([f.to_string() for f in [first] + rest], expected)
+        self.assertEqual([f.to_string() for f in load_flames(self.path)], expected)
+
+    def test_empty(self):
+        with open(self.path, "w") as f:
+            f.write("<flames></flames>")
+        self.assertEqual(load_flamestrings(self.path), [])
+        self.assertEqual(load_flames(self.path), [])
+        open(self.path, "w").close()
+        self.assertEqual(load_flamestrings(self.path), [])
+        # Not valid xml, but it mustn't escape as a RuntimeError either.
+        self.assertRaises(etree.ParseError, load_flames, self.path)
+
+
+class TestFlameIndex(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.flame")
+        self.flames = make_flames(5)
+        self.strings = [f.to_string() for f in self.flames]
+        save_flames(self.path, *self.flames)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_build(self):
+        sidecar = FlameIndex.sidecar_path(self.path)
+        self.assertFalse(os.path.exists(sidecar))
+        index = FlameIndex(self.path)
+        self.assertTrue(os.path.exists(sidecar))
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.names(), [f.name for f in self.flames])
+        self.assertEqual(list(index), self.strings)
+        self.assertEqual(index[3], self.strings[3])
+        self.assertEqual(index[-1], self.strings[-1])
+        self.assertEqual(index.get("flame 2"), self.strings[2])
+        self.assertEqual(index.read(1, verify=True), self.strings[1])
+        self.assertEqual(index.flame(4).name, "flame 4")
+
+    def test_save_flames_updates_index(self):
+        FlameIndex(self.path)
+        flames = make_flames(3)
+        flames[1].name = "renamed"
+        save_flames(self.path, *flames)
+        index = FlameIndex(self.path)
+        # The sidecar written by save_flames must be valid as is.
+        self.assertIsNotNone(index._load())
+        self.assertEqual(index.names(), ["flame 0", "renamed", "flame 2"])
+        self.assertEqual(list(index), [f.to_string() for f in flames])
+        self.assertEqual(index.entries, FlameIndex(self.path, index._build()).entries)
+
+    def test_escaped_names(self):
+        string = self.strings[0].replace('"flame 0"', '"a &amp; &quot;b&quot;"')
+        with open(self.path, "w") as f:
+            f.write("<flames>%s</flames>" % string)
+        name = Flame(string).name
+        self.assertEqual(name, 'a & "b"')
+        self.assertEqual(FlameIndex(self.path).names(), [name])
+
+    def test_stale_index(self):
+        FlameIndex(self.path)
+        with open(self.path, "w") as f:
+            f.write("<flames>%s</flames>" % self.strings[0])
+        index = FlameIndex(self.path)
+        self.assertEqual(list(index), self.strings[:1])
+
+    def test_no_sidecar(self):
+        index = FlameIndex(self.path, save=False)
+        self.assertEqual(index.names(), [f.name for f in self.flames])
+        self.assertFalse(os.path.exists(FlameIndex.sidecar_path(self.path)))
+
+    def test_save_without_index(self):
+        save_flames(self.path, *self.flames, index=False)
+        self.assertFalse(os.path.exists(FlameIndex.sidecar_path(self.path)))
+        save_flames(self.path, *self.flames, index=True)
+        self.assertTrue(os.path.exists(FlameIndex.sidecar_path(self.path)))
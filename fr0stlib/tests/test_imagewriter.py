@@ -0,0 +1,121 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import os, struct, tempfile, zlib
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib.imagewriter import PngWriter, save_array
+
+
+def read_png(path):
+    """Minimal decoder for the unfiltered pngs written by PngWriter."""
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, chunks = 8, []
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+        kind = data[pos + 4 : pos + 8]
+        body = data[pos + 8 : pos + 8 + length]
+        (crc,) = struct.unpack(">I", data[pos + 8 + length : pos + 12 + length])
+        assert crc == zlib.crc32(kind + body)
+        chunks.append((kind, body))
+        pos += 12 + length
+    width, height, depth, color_type = struct.unpack(">IIBB", chunks[0][1][:10])
+    channels = 4 if color_type == 6 else 3
+    raw = zlib.decompress(b"".join(b for k, b in chunks if k == b"IDAT"))
+    rows = numpy.frombuffer(raw, numpy.uint8).reshape(height, -1)
+    assert not rows[:, 0].any()
+    kinds = [k for k, b in chunks]
+    dtype = ">u2" if depth == 16 else "u1"
+    pixels = numpy.frombuffer(rows[:, 1:].tobytes(), dtype)
+    return pixels.reshape(height, width, channels), kinds
+
+
+class TestImageWriter(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_write(self):
+        for channels in (3, 4):
+            img = numpy.random.randint(0, 256, (5, 7, channels)).astype(numpy.uint8)
+            with PngWriter(self.path, (7, 5), channels) as writer:
+                writer.write(img[:2])
+                writer.write(img[2:])
+            result, kinds = read_png(self.path)
+            self.assertTrue((result == img).all())
+            self.assertEqual(kinds[0], b"IHDR")
+            self.assertEqual(kinds[-1], b"IEND")
+
+    def test_rows(self):
+        writer = PngWriter(self.path, (7, 5))
+        self.assertRaises(ValueError, writer.write, numpy.zeros((6, 7, 3)))
+        self.assertRaises(ValueError, writer.write, numpy.zeros((2, 6, 3)))
+        writer.write(numpy.zeros((2, 7, 3)))
+        self.assertRaises(ValueError, writer.close)
+
+    def test_discard(self):
+        try:
+            with PngWriter(self.path, (7, 5)) as writer:
+                writer.write(numpy.zeros((2, 7, 3)))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_16bit(self):
+        img = numpy.random.randint(0, 65536, (5, 7, 4)).astype(numpy.uint16)
+        save_array(self.path, img)
+        result, kinds = read_png(self.path)
+        self.assertTrue((result == img).all())
+
+    def test_pfm(self):
+        path = self.path[:-4] + ".pfm"
+        img = numpy.random.random((5, 7, 3)).astype(numpy.float32)
+        save_array(path, img)
+        with open(path, "rb") as f:
+            data = f.read()
+        os.remove(path)
+        header = b"PF\n7 5\n-1.0\n"
+        self.assertTrue(data.startswith(header))
+        result = numpy.frombuffer(data[len(header) :], "<f4").reshape(5, 7, 3)
+        self.assertTrue((result[::-1] == img).all())
+
+    def test_npy(self):
+        path = self.path[:-4] + ".npy"
+        img = numpy.random.random((5, 7, 4)).astype(numpy.float32)
+        save_array(path, img)
+        result = numpy.load(path)
+        os.remove(path)
+        self.assertTrue((result == img).all())
+
+    def test_unsupported(self):
+        img = numpy.zeros((5, 7, 4), numpy.float32)
+        self.assertRaises(ValueError, save_array, self.path, img)
+        self.assertRaises(ValueError, save_array, self.path[:-4] + ".pfm", img)
+        self.assertRaises(ValueError, save_array, self.path[:-4] + ".jpg", img)
@@ -0,0 +1,112 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+from fr0stlib import memory
+from fr0stlib.memory import MemoryPlan, available_memory, plan_render
+from fr0stlib.memory import engine_memory, plan_engine_render
+
+
+class FakeFrame(object):
+    def __init__(self, bits, bytes_per_channel=1):
+        self.bits = bits
+        self.bytes_per_channel = bytes_per_channel
+
+
+def fake_frame_memory(frame, size, transparent=0, dtype=None):
+    """10 bytes per pixel for 64-bit buckets, 5 otherwise, plus the image."""
+    w, h = size
+    buckets = w * h * (10 if frame.bits == 64 else 5)
+    return buckets + memory.image_memory(frame, size, transparent, dtype)
+
+
+class TestMemory(TestCase):
+    def setUp(self):
+        self.frame_memory = memory.frame_memory
+        memory.frame_memory = fake_frame_memory
+
+    def tearDown(self):
+        memory.frame_memory = self.frame_memory
+
+    def test_available(self):
+        available = available_memory()
+        if available is not None:
+            self.assertTrue(available > 0)
+
+    def test_fits(self):
+        plan = plan_render(FakeFrame(64), (10, 10), available=1300)
+        self.assertEqual(plan, MemoryPlan(1300, 1300, None, 1))
+        self.assertTrue(plan.fits)
+
+    def test_query(self):
+        plan = plan_render(FakeFrame(64), (10, 10), available=None)
+        self.assertTrue(plan.fits)
+
+    def test_depth(self):
+        plan = plan_render(FakeFrame(64), (10, 10), available=800)
+        self.assertEqual(plan, MemoryPlan(1300, 800, 33, 1))
+        self.assertFalse(plan.fits)
+
+    def test_strips(self):
+        # 80 bytes per row, buckets and image, so strips of up to 6 rows fit.
+        frame = FakeFrame(33)
+        plan = plan_render(frame, (10, 10), available=500, margin=0)
+        self.assertEqual(plan, MemoryPlan(800, 500, None, 2))
+        self.assertEqual(frame.bits, 33)
+
+    def test_margin(self):
+        # The margin above and below leaves room for 2 rows per strip.
+        plan = plan_render(FakeFrame(33), (10, 10), available=500, margin=2)
+        self.assertEqual(plan.strips, 5)
+        plan = plan_render(FakeFrame(33), (10, 10), available=400, margin=2)
+        self.assertEqual(plan.strips, 10)
+
+    def test_impossible(self):
+        plan = plan_render(FakeFrame(32), (10, 10), available=79, margin=0)
+        self.assertEqual(plan.strips, None)
+        plan = plan_render(FakeFrame(32), (10, 10), available=80, margin=0)
+        self.assertEqual(plan.strips, 10)
+        plan = plan_render(FakeFrame(32), (10, 10), available=300, margin=2)
+        self.assertEqual(plan.strips, None)
+
+    def test_image_memory(self):
+        self.assertEqual(memory.image_memory(FakeFrame(64), (10, 10)), 300)
+        self.assertEqual(memory.image_memory(FakeFrame(64, 2), (10, 10), 1), 800)
+        nbytes = memory.image_memory(FakeFrame(64, 2), (10, 10), 0, "float32")
+        self.assertEqual(nbytes, 1800)
+
+    def test_float_strips(self):
+        plan = plan_render(
+            FakeFrame(33, 2), (10, 10), available=2000, dtype="f4", margin=0
+        )
+        self.assertEqual(plan, MemoryPlan(2300, 2000, None, 2))
+
+    def test_engine(self):
+        required = engine_memory((10, 10), estimator=0)
+        plan = plan_engine_render((10, 10), estimator=0, available=required)
+        self.assertEqual(plan, MemoryPlan(required, required, None, 1))
+        # The engine can't fall back on strips or a smaller buffer depth.
+        plan = plan_engine_render((10, 10), estimator=0, available=required - 1)
+        self.assertEqual(plan, MemoryPlan(required, required - 1, None, None))
+        # Oversampling and the image's channels add to the requirement.
+        self.assertTrue(engine_memory((10, 10), spatial_oversample=2) > required)
+        self.assertEqual(engine_memory((10, 10), 1, estimator=0) - required, 100)
@@ -0,0 +1,200 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+import colorsys
+import random
+
+import numpy
+
+from fr0stlib import (
+    Palette,
+    PaletteBatch,
+    rgb2hls,
+    hls2rgb,
+    rgb2hsv,
+    hsv2rgb,
+    pblend_color,
+    rgb2hls_array,
+    hls2rgb_array,
+    rgb2hsv_array,
+    hsv2rgb_array,
+)
+
+
+def make_palette(seed=0):
+    palette = Palette()
+    palette[:] = numpy.random.RandomState(seed).randint(0, 256, (256, 3))
+    # Include some grays, which take a separate path in the conversions.
+    palette[:16] = [(i * 16,) * 3 for i in range(16)]
+    return palette
+
+
+def blend_seeds(seeds, curve):
+    """Reference implementation of Palette.from_seeds, one entry at a time."""
+    ns = len(seeds)
+    d, r = divmod(256, ns)
+    gen = []
+    for i in range(ns):
+        ds = d + (i < r)
+        for j in range(ds):
+            gen.append(hsv2rgb(pblend_color(seeds[i - 1], seeds[i], j / ds, curve)))
+    return gen
+
+
+class TestColorArrays(TestCase):
+    def setUp(self):
+        self.rgb = make_palette().data
+
+    def test_rgb2hls(self):
+        expected = [rgb2hls(c) for c in self.rgb]
+        self.assertTrue(numpy.array_equal(rgb2hls_array(self.rgb), expected))
+
+    def test_rgb2hsv(self):
+        expected = [rgb2hsv(c) for c in self.rgb]
+        self.assertTrue(numpy.array_equal(rgb2hsv_array(self.rgb), expected))
+
+    def test_hls2rgb(self):
+        hls = numpy.random.RandomState(1).rand(256, 3)
+        hls[:8, 2] = 0
+        hls[8:16, 0] += 1
+        expected = [hls2rgb(c) for c in hls]
+        self.assertTrue(numpy.array_equal(hls2rgb_array(hls), expected))
+
+    def test_hsv2rgb(self):
+        hsv = numpy.random.RandomState(2).rand(256, 3)
+        hsv[:8, 1] = 0
+        hsv[8:16, 0] += 1
+        expected = [hsv2rgb(c) for c in hsv]
+        self.assertTrue(numpy.array_equal(hsv2rgb_array(hsv), expected))
+
+    def test_shape(self):
+        rgb = numpy.zeros((4, 5, 3), dtype=numpy.uint8)
+        self.assertEqual(rgb2hls_array(rgb).shape, (4, 5, 3))
+        self.assertEqual(hsv2rgb_array(rgb2hsv_array(rgb)).shape, (4, 5, 3))
+
+
+class TestPaletteOps(TestCase):
+    def check_adjust(self, method, value, index, scale):
+        palette = make_palette()
+        expected = []
+        for c in palette:
+            hls = list(rgb2hls(c))
+            hls[index] += value / scale
+            if index:
+                hls[index] = max(0, min(1, hls[index]))
+            else:
+                hls[index] %= 1
+            expected.append(hls2rgb(hls))
+        getattr(palette, method)(value)
+        self.assertEqual(palette.data.dtype, numpy.uint8)
+        self.assertTrue(numpy.array_equal(palette.data, expected))
+
+    def test_hue(self):
+        self.check_adjust("hue", 45, 0, 360.0)
+        self.check_adjust("hue", -200, 0, 360.0)
+
+    def test_saturation(self):
+        self.check_adjust("saturation", 20, 2, 100.0)
+        self.check_adjust("saturation", -35, 2, 100.0)
+
+    def test_brightness(self):
+        self.check_adjust("brightness", 15, 1, 100.0)
+        self.check_adjust("brightness", -50, 1, 100.0)
+
+    def test_rotate(self):
+        palette = make_palette()
+        data = list(map(tuple, palette))
+        palette.rotate(100)
+        self.assertEqual(list(map(tuple, palette)), data[-100:] + data[:-100])
+        palette.rotate(-100)
+        self.assertEqual(list(map(tuple, palette)), data)
+
+    def test_from_seeds(self):
+        rnd = random.Random(3)
+        for curve in ("linear", "cos", "cubic"):
+            for n in (1, 3, 5, 7, 12):
+                seeds = [tuple(rnd.random() for i in range(3)) for j in range(n)]
+                palette = Palette()
+                palette.from_seeds(seeds, curve)
+                self.assertTrue(
+                    numpy.array_equal(palette.data, blend_seeds(seeds, curve)),
+                    (curve, n),
+                )
+
+    def test_random(self):
+        palette = Palette()
+        palette.random(nodes=(4, 6))
+        self.assertEqual(palette.data.shape, (256, 3))
+        self.assertEqual(palette.data.dtype, numpy.uint8)
+
+
+class TestPaletteBatch(TestCase):
+    def setUp(self):
+        self.palettes = [make_palette(i) for i in range(5)]
+        self.batch = PaletteBatch(self.palettes)
+
+    def check_same(self, method, *args):
+        getattr(self.batch, method)(*args)
+        for palette, item in zip(self.palettes, self.batch):
+            getattr(palette, method)(*args)
+            self.assertTrue(numpy.array_equal(palette.data, item.data), method)
+
+    def test_init(self):
+        self.assertEqual(self.batch.data.shape, (5, 256, 3))
+        self.assertEqual(len(PaletteBatch(n=3)), 3)
+        self.assertEqual(len(PaletteBatch()), 0)
+
+    def test_ops(self):
+        self.check_same("hue", 30)
+        self.check_same("saturation", -10)
+        self.check_same("brightness", 5)
+        self.check_same("invert")
+        self.check_same("rotate", 7)
+        self.check_same("reverse")
+
+    def test_item_view(self):
+        palette = self.batch[2]
+        palette[0] = 1, 2, 3
+        self.assertEqual(tuple(self.batch.data[2, 0]), (1, 2, 3))
+        self.batch[1] = self.palettes[4]
+        self.assertTrue(numpy.array_equal(self.batch.data[1], self.palettes[4].data))
+        self.assertEqual(len(self.batch[1:3]), 2)
+
+    def test_item_ops(self):
+        # Palettes taken from the batch keep sharing its memory when changed.
+        for method, args in (
+            ("reverse", ()),
+            ("rotate", (7,)),
+            ("invert", ()),
+            ("from_seeds", ([(0, 1, 1), (0.5, 1, 1)],)),
+        ):
+            palette = self.batch[3]
+            getattr(palette, method)(*args)
+            self.assertTrue(palette.data.base is not None, method)
+            self.assertTrue(numpy.array_equal(self.batch.data[3], palette.data), method)
+
+    def test_random(self):
+        batch = PaletteBatch(n=50)
+        batch.random(hue=(0.8, 0.2), value=(0.25, 1), nodes=(2, 8))
+        self.assertEqual(batch.data.shape, (50, 256, 3))
+        self.assertEqual(batch.data.dtype, numpy.uint8)
+        self.assertTrue(batch.data.any())
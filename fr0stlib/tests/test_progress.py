@@ -0,0 +1,75 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+from fr0stlib.pyflam3 import ProgressChannel
+
+
+class TestProgressChannel(TestCase):
+    def setUp(self):
+        self.channel = ProgressChannel()
+
+    def test_poll(self):
+        self.assertEqual(self.channel.poll(), (0, 0, 0))
+        ret = self.channel.callback(None, 42.5, 0, 12.0)
+        self.assertEqual(ret, ProgressChannel.CONTINUE)
+        self.assertEqual(self.channel.poll(), (42.5, 0, 12.0))
+        self.channel(None, 99.0, 1, 0.0)
+        self.assertEqual(self.channel.poll(), (99.0, 1, 0.0))
+        self.assertEqual(self.channel.state.updates, 2)
+
+    def test_parts(self):
+        self.channel(None, 50.0, 0, 1.0)
+        self.channel.start_part(1, 4)
+        self.assertEqual(self.channel.poll(), (25.0, 0, 1.0))
+        self.channel(None, 50.0, 0, 1.0)
+        self.assertEqual(self.channel.poll(), (37.5, 0, 1.0))
+
+    def test_cancel(self):
+        self.channel.cancel()
+        self.assertTrue(self.channel.cancelled)
+        ret = self.channel.callback(None, 1.0, 0, 0.0)
+        self.assertEqual(ret, ProgressChannel.ABORT)
+
+    def test_pause(self):
+        self.channel.pause()
+        self.assertTrue(self.channel.paused)
+        self.assertEqual(self.channel.callback(None, 1.0, 0, 0.0), 2)
+        self.channel.resume()
+        self.assertFalse(self.channel.paused)
+        self.assertEqual(self.channel.callback(None, 1.0, 0, 0.0), 0)
+
+    def test_pause_keys(self):
+        self.channel.pause()
+        self.channel.pause("preview")
+        self.channel.resume("preview")
+        self.assertTrue(self.channel.paused)
+        self.channel.resume()
+        self.assertFalse(self.channel.paused)
+
+    def test_cancel_paused(self):
+        self.channel.pause()
+        self.channel.cancel()
+        self.channel.resume()
+        self.assertTrue(self.channel.cancelled)
+        self.channel.pause("preview")
+        self.assertTrue(self.channel.cancelled)
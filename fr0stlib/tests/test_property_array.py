@@ -0,0 +1,129 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+from fr0stlib import Flame, XformStore
+from fr0stlib.property_array import property_array, invalidate
+
+
+class Pair(object):
+    reads = 0
+
+    def __init__(self):
+        self.a, self.b = 1.0, 2.0
+
+    @property_array
+    def pair(self):
+        self.reads += 1
+        return self.a, self.b
+
+
+class TestPropertyArray(TestCase):
+    def setUp(self):
+        self.flame = Flame()
+        self.xform = self.flame.add_xform()
+        self.xform.coefs = 0.5, 0.25, -0.25, 0.75, 1.0, -1.0
+
+    def test_cached(self):
+        x = self.xform
+        self.assertIs(x.coefs, x.coefs)
+        self.assertIs(x.points, x.points)
+        self.assertIsNot(x.coefs, self.flame.add_xform().coefs)
+
+    def test_invalidate(self):
+        x = self.xform
+        coefs = x.coefs
+        x.a = 2.0
+        self.assertIsNot(x.coefs, coefs)
+        self.assertEqual(coefs[0], 0.5)
+        self.assertEqual(x.coefs[0], 2.0)
+        coefs = x.coefs
+        del x.a
+        self.assertIsNot(x.coefs, coefs)
+        self.assertEqual(x.coefs[0], 0.0)
+        post = x.post.coefs
+        x.post.c = 1.0
+        self.assertEqual(post[4], 0.0)
+        self.assertEqual(x.post.coefs[4], 1.0)
+
+    def test_other_attributes(self):
+        # Only the coefficients the arrays are made from drop them.
+        x = self.xform
+        coefs = x.coefs
+        x.linear = 0.5
+        x.color = 0.25
+        del x.linear
+        self.assertIs(x.coefs, coefs)
+
+    def test_inplace_change(self):
+        x = self.xform
+        coefs = x.coefs
+        coefs += 1
+        self.assertEqual(x.a, 0.5)
+        self.assertEqual(x.coefs[0], 0.5)
+        points = x.points
+        points[0] *= 2
+        self.assertEqual(x.points[0][0], 3.0)
+
+    def test_no_reads(self):
+        # Cached arrays are handed out without calling the getter again.
+        p = Pair()
+        pair = p.pair
+        self.assertIs(p.pair, pair)
+        self.assertEqual(p.reads, 1)
+        invalidate(p)
+        self.assertIsNot(p.pair, pair)
+        self.assertEqual(p.reads, 2)
+
+    def test_flame(self):
+        size = self.flame.size
+        self.assertIs(self.flame.size, size)
+        self.flame.width = 100
+        self.assertEqual(list(self.flame.size), [100, 480])
+        center = self.flame.center
+        self.flame.x_offset = 2
+        self.assertEqual(self.flame.center[0], 2)
+        self.assertEqual(center[0], 0)
+
+    def test_store(self):
+        x = self.xform
+        coefs = x.coefs
+        with XformStore(self.flame) as store:
+            store.scale(2)
+            self.assertEqual(x.coefs[0], 1.0)
+        self.assertIsNot(x.coefs, coefs)
+        self.assertEqual(x.coefs[0], 1.0)
+
+    def test_write_through(self):
+        x = self.xform
+        x.coefs[0] = 3.0
+        self.assertEqual(x.a, 3.0)
+        x.points[2][1] = 5.0
+        self.assertEqual(x.f, 5.0)
+        self.flame.size[0] = 100
+        self.assertEqual(self.flame.width, 100)
+
+    def test_eq(self):
+        x = self.xform
+        self.assertTrue(x.coefs == (0.5, 0.25, -0.25, 0.75, 1.0, -1.0))
+        self.assertTrue(x.points == ((0.5 + 1, 0.25 - 1), (0.75, -0.25), (1, -1)))
+        self.assertTrue(x.points != ((0, 0), (0, 0), (0, 0)))
@@ -0,0 +1,105 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import os, time, threading
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib.renderpool import RenderPool
+
+
+def fill_job(job, output, progress_func):
+    """Stands in for flam3. The flame string says what to do."""
+    flame = job[0]
+    if flame == "crash":
+        os._exit(1)
+    elif flame == "error":
+        raise ValueError(flame)
+    elif flame == "wait":
+        while progress_func(None, 50.0, 0, 1.0) != 1:
+            time.sleep(0.01)
+    output[...] = job[2]
+
+
+class TestRenderPool(TestCase):
+    def setUp(self):
+        self.pool = RenderPool(processes=1, interval=0.01, job_func=fill_job)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_render(self):
+        output = self.pool.render("fill", (4, 3), 7, transparent=1)
+        self.assertEqual(output.shape, (3, 4, 4))
+        self.assertTrue((output == 7).all())
+
+    def test_buffer(self):
+        buf = numpy.zeros((3, 4, 3), numpy.uint8)
+        output = self.pool.render("fill", (4, 3), 5, buffer=buf)
+        self.assertTrue(output is buf)
+        self.assertTrue((buf == 5).all())
+
+        raw = bytearray(36)
+        output = self.pool.render("fill", (4, 3), 6, buffer=raw)
+        self.assertEqual(raw, bytearray([6]) * 36)
+
+    def test_cancel(self):
+        calls = []
+
+        def progress_func(py_object, fraction, stage, eta):
+            calls.append(fraction)
+            return 1 if 50.0 in calls else 0
+
+        self.pool.render("wait", (4, 3), 1, progress_func=progress_func)
+        self.assertEqual(calls[-1], 50.0)
+
+    def test_error(self):
+        self.assertRaises(RuntimeError, self.pool.render, "error", (4, 3), 1)
+        pid = self.pool._idle[0].process.pid
+        self.pool.render("fill", (4, 3), 1)
+        self.assertEqual(self.pool._idle[0].process.pid, pid)
+
+    def test_crash(self):
+        self.assertRaises(RuntimeError, self.pool.render, "crash", (4, 3), 1)
+        self.assertEqual(self.pool._idle, [])
+        output = self.pool.render("fill", (4, 3), 2)
+        self.assertTrue((output == 2).all())
+
+    def test_uint16(self):
+        output = self.pool.render("fill", (4, 3), 1000, bytes_per_channel=2)
+        self.assertEqual(output.dtype, numpy.uint16)
+        self.assertTrue((output == 1000).all())
+
+    def test_threads(self):
+        results = {}
+
+        def run(i):
+            results[i] = self.pool.render("fill", (8, 8), i)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(3):
+            self.assertTrue((results[i] == i).all())
+        self.assertEqual(len(self.pool._idle), 1)
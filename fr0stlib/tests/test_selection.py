@@ -0,0 +1,79 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib import Flame
+from fr0stlib.engine.selection import TransitionTable, transition_table
+
+
+def make_flame(*weights):
+    flame = Flame()
+    for w in weights:
+        flame.add_xform(weight=w)
+    return flame
+
+
+class TestTransitionTable(TestCase):
+    def test_weights(self):
+        table = TransitionTable([1, 3])
+        rng = numpy.random.default_rng(0)
+        chosen = table.choose(numpy.full(100000, table.start), rng)
+        self.assertAlmostEqual(chosen.mean(), 0.75, 2)
+
+    def test_chaos(self):
+        chaos = [[0, 1, 0], [0, 0, 1], [1, 1, 0]]
+        table = TransitionTable([1, 1, 2], chaos)
+        rng = numpy.random.default_rng(0)
+        prev = numpy.repeat([0, 1, 2, table.start], 10000)
+        chosen = table.choose(prev, rng).reshape(4, -1)
+        self.assertTrue((chosen[0] == 1).all())
+        self.assertTrue((chosen[1] == 2).all())
+        self.assertFalse((chosen[2] == 2).any())
+        self.assertAlmostEqual((chosen[2] == 0).mean(), 0.5, 1)
+        self.assertAlmostEqual((chosen[3] == 2).mean(), 0.5, 1)
+
+    def test_zero_weight(self):
+        table = TransitionTable([0, 1, 0], [[1, 1, 1]] * 3)
+        chosen = table.choose(numpy.zeros(1000, int), numpy.random.default_rng(0))
+        self.assertTrue((chosen == 1).all())
+
+    def test_no_way_out(self):
+        # When chaos rules out everything, the weights are used instead.
+        table = TransitionTable([1, 1], [[0, 0], [1, 1]])
+        numpy.testing.assert_allclose(table.cdf[0], [0.5, 1])
+
+    def test_no_weight(self):
+        self.assertRaises(ValueError, TransitionTable, [0, 0])
+
+    def test_cache(self):
+        flame = make_flame(1, 2)
+        table = transition_table(flame)
+        self.assertTrue(transition_table(flame) is table)
+        self.assertTrue(transition_table(make_flame(1, 2)) is table)
+        flame.xform[0].chaos[1] = 0
+        changed = transition_table(flame)
+        self.assertFalse(changed is table)
+        self.assertTrue(changed.chaos)
+        flame.xform[1].weight = 3
+        self.assertFalse(transition_table(flame) is changed)
@@ -0,0 +1,127 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import colorsys
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib import Flame
+from fr0stlib.engine import accumulate, tonemap
+from fr0stlib.engine.tonemap import calc_newrgb, tone_map
+
+
+def reference_newrgb(rgb, ls, highpow):
+    """flam3's calc_newrgb, one pixel at a time."""
+    maxc = max(rgb)
+    if ls * maxc > 255 and highpow >= 0:
+        newls = 255.0 / maxc
+        lsratio = (newls / ls) ** highpow
+        h, s, v = colorsys.rgb_to_hsv(*(newls * c / 255.0 for c in rgb))
+        return [c * 255.0 for c in colorsys.hsv_to_rgb(h, s * lsratio, v)]
+    if ls * maxc > 255:
+        adjhlp = min(1.0, -highpow)
+        return [((1.0 - adjhlp) * 255.0 / maxc + adjhlp * ls) * c for c in rgb]
+    return [ls * c for c in rgb]
+
+
+def random_accum(shape, seed=0):
+    rng = numpy.random.default_rng(seed)
+    accum = rng.random(shape + (4,)) * 300
+    accum[..., :3] *= rng.random(shape + (3,))
+    accum[0, 0] = 0
+    return accum
+
+
+class TestToneMap(TestCase):
+    def test_highlight_power(self):
+        rng = numpy.random.default_rng(0)
+        rgb = rng.random((200, 3))
+        ls = rng.random(200) * 1000
+        for highpow in (-2, -1, -0.5, 0, 0.5, 1, 3):
+            out = calc_newrgb(rgb, ls, highpow)
+            for i in range(len(rgb)):
+                expected = reference_newrgb(rgb[i], ls[i], highpow)
+                numpy.testing.assert_allclose(out[i], expected, atol=1e-9)
+
+    def test_negative_highlight_power(self):
+        # Halfway between the scale that makes red white and ls.
+        rgb = numpy.array([[1.0, 0.5, 0.25], [0.2, 0.1, 0.0]])
+        out = calc_newrgb(rgb, numpy.array([510.0, 510.0]), -0.5)
+        numpy.testing.assert_allclose(out[0], [382.5, 191.25, 95.625])
+        # Colors that stay below white are just scaled by ls.
+        numpy.testing.assert_allclose(out[1], [102.0, 51.0, 0.0])
+
+    def test_output(self):
+        accum = random_accum((7, 5))
+        flame = Flame()
+        img = tone_map(accum, flame)
+        self.assertEqual(img.shape, (7, 5, 3))
+        self.assertEqual(img.dtype, numpy.uint8)
+        self.assertEqual(img[0, 0].max(), 0)
+        img16 = tone_map(accum, flame, 1, dtype=numpy.uint16)
+        self.assertEqual(img16.shape, (7, 5, 4))
+        self.assertTrue(img16.max() > 255)
+        buffer = numpy.zeros((7, 5, 3), numpy.float32)
+        self.assertTrue(tone_map(accum, flame, output=buffer) is buffer)
+        self.assertTrue(0 < buffer.max() <= 1)
+
+    def test_background(self):
+        flame = Flame()
+        flame.background = 1, 0, 0
+        img = tone_map(numpy.zeros((2, 2, 4)), flame)
+        self.assertTrue((img == (255, 0, 0)).all())
+
+    def test_chunks(self):
+        accum = random_accum((40, 30))
+        flame = Flame()
+        flame.highlight_power = 1
+        flame.vibrancy = 0.5
+        whole = tone_map(accum, flame, 1, dtype=numpy.float32)
+        chunk_size = tonemap.CHUNK_SIZE
+        tonemap.CHUNK_SIZE = 100
+        try:
+            chunked = tone_map(accum, flame, 1, dtype=numpy.float32)
+        finally:
+            tonemap.CHUNK_SIZE = chunk_size
+        numpy.testing.assert_array_equal(whole, chunked)
+
+    def test_brightness(self):
+        # Brightness only scales the buffer.
+        accum = random_accum((6, 6))
+        flame = Flame()
+        flame.brightness = 3
+        img = tone_map(accum, flame, dtype=numpy.float32)
+        flame.brightness = 1
+        scaled = tone_map(accum * 3, flame, dtype=numpy.float32)
+        numpy.testing.assert_allclose(img, scaled, rtol=1e-6)
+
+    def test_retone(self):
+        flame = Flame()
+        flame.add_xform(coefs=(0.5, 0, 0, 0.5, 0, 0), linear=1, weight=1)
+        flame.add_xform(coefs=(0.5, 0, 0, 0.5, 0.5, 0.5), linear=1, weight=1)
+        flame.gradient.data[:] = 255
+        accum = accumulate(flame, (32, 24), 5, fixed_seed=True)
+        dark = tone_map(accum, flame)
+        flame.brightness *= 4
+        flame.gamma = 2
+        bright = tone_map(accum, flame)
+        self.assertTrue(bright.sum() > dark.sum())
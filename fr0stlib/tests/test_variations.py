@@ -0,0 +1,173 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import ctypes, random
+from unittest import TestCase, skipUnless
+
+import numpy
+
+from fr0stlib import Flame, pyflam3
+from fr0stlib.pyflam3 import variation_list, variables
+from fr0stlib.engine.variations import compose, flam3_coefs, kernels
+from fr0stlib.engine.variations import variable_names
+
+# Variations that don't use random numbers, so they can be compared
+# point by point.
+DETERMINISTIC = [
+    "linear", "sinusoidal", "spherical", "swirl", "horseshoe", "polar",
+    "handkerchief", "heart", "disc", "spiral", "hyperbolic", "diamond", "ex",
+    "bent", "waves", "fisheye", "popcorn", "exponential", "power", "cosine",
+    "rings", "fan", "blob", "pdj", "fan2", "rings2", "eyefish", "bubble",
+    "cylinder", "perspective", "ngon", "curl", "rectangles", "tangent",
+    "cross", "disc2", "bent2", "bipolar", "butterfly", "cell", "curve",
+    "edisc", "elliptic", "escher", "foci", "lazysusan", "loonie", "modulus",
+    "oscilloscope", "polar2", "popcorn2", "scry", "separation", "split",
+    "splits", "stripes", "wedge", "wedge_sph", "whorl", "waves2", "exp",
+    "log", "sin", "cos", "tan", "sec", "csc", "cot", "sinh", "cosh", "tanh",
+    "sech", "csch", "coth", "auger", "flux", "mobius",
+]  # fmt: skip
+
+
+def make_xform(name, weight=1.0, seed=0):
+    flame = Flame()
+    # b, d and f are all nonzero and b != d, so orientation mistakes show.
+    x = flame.add_xform(linear=0, coefs=(0.9, 0.15, -0.25, 0.8, 0.3, -0.4))
+    setattr(x, name, weight)
+    rnd = random.Random(seed)
+    for var in variable_names(name):
+        setattr(x, "%s_%s" % (name, var), rnd.uniform(0.5, 2))
+    return x
+
+
+def grid(n=21, extent=2.0):
+    ticks = numpy.linspace(-extent, extent, n)
+    x, y = numpy.meshgrid(ticks, ticks)
+    return x.ravel() + 0.013, y.ravel() - 0.007
+
+
+class TestVariations(TestCase):
+    def test_registry(self):
+        self.assertEqual(set(kernels), set(variation_list))
+
+    def test_variable_names(self):
+        self.assertEqual(variable_names("julian"), ["power", "dist"])
+        self.assertEqual(variable_names("wedge"), ["angle", "hole", "count", "swirl"])
+        self.assertEqual(len(variable_names("mobius")), 8)
+        for name in variation_list:
+            if name != "mobius":
+                self.assertEqual(
+                    variable_names(name), [v for v, _ in variables.get(name, ())]
+                )
+
+    def test_all(self):
+        x, y = grid()
+        rng = numpy.random.default_rng(0)
+        with numpy.errstate(all="ignore"):
+            for name in variation_list:
+                out = compose(make_xform(name))(x, y, rng)
+                self.assertEqual(out.shape, (len(x), 2))
+                finite = numpy.isfinite(out).all(axis=1).mean()
+                self.assertTrue(finite > 0.5, name)
+
+    def test_values(self):
+        x, y = numpy.array([1.0, 0.0]), numpy.array([1.0, 2.0])
+        expected = {
+            "spherical": [(0.5, 0.5), (0, 0.5)],
+            "polar": [(0.25, 2**0.5 - 1), (0, 1)],
+            "bubble": [(1 / 1.5, 1 / 1.5), (0, 1)],
+            "cylinder": [(numpy.sin(1), 1), (0, 2)],
+            "bent": [(1, 1), (0, 2)],
+        }
+        for name, values in expected.items():
+            out = compose(make_xform(name))(x, y)
+            numpy.testing.assert_allclose(out, values, atol=1e-9, err_msg=name)
+
+    def test_coefs(self):
+        # waves reads b, c, e and f in flam3's orientation.
+        x, y = numpy.array([0.3, -0.7]), numpy.array([0.5, 0.2])
+        xform = make_xform("waves")
+        self.assertEqual(flam3_coefs(xform), (0.9, 0.25, 0.3, -0.15, 0.8, 0.4))
+        b, c, e, f = 0.25, 0.3, 0.8, 0.4
+        expected = numpy.c_[
+            x + b * numpy.sin(y / (c * c)), y + e * numpy.sin(x / (f * f))
+        ]
+        numpy.testing.assert_allclose(compose(xform)(x, y), expected)
+
+    def test_fused(self):
+        x, y = grid()
+        rng = numpy.random.default_rng(0)
+        swirl = compose(make_xform("swirl", 0.3))(x, y, rng)
+        julian = compose(make_xform("julian", 0.7))(x, y, numpy.random.default_rng(1))
+        xform = make_xform("swirl", 0.3)
+        xform.julian = 0.7
+        for var in variable_names("julian"):
+            attr = "julian_%s" % var
+            setattr(xform, attr, getattr(make_xform("julian"), attr))
+        fused = compose(xform)(x, y, numpy.random.default_rng(1))
+        numpy.testing.assert_allclose(fused, swirl + julian)
+
+    def test_linear(self):
+        x, y = grid()
+        xform = make_xform("linear", 0.5)
+        variations = compose(xform)
+        self.assertEqual(variations.linear, 0.5)
+        numpy.testing.assert_allclose(variations(x, y), numpy.c_[x, y] * 0.5)
+
+    def test_zero_weight(self):
+        xform = make_xform("spherical")
+        xform.swirl = 0
+        self.assertEqual(len(compose(xform).terms), 1)
+
+
+@skipUnless(
+    isinstance(getattr(pyflam3.libflam3, "_handle", None), int),
+    "Needs libflam3 as a reference.",
+)
+class TestAgainstFlam3(TestCase):
+    def reference(self, xform, extent, numvals):
+        """Applies the xform to a grid of points with flam3."""
+        genomes, ngenomes = pyflam3.genome_cache.get(xform._parent.to_string())
+        result = (ctypes.c_double * (2 * (2 * numvals + 1) ** 2))()
+        pyflam3.flam3_xform_preview(
+            genomes, 0, extent, numvals, 1, result, pyflam3.RandomContext()
+        )
+        return numpy.array(result).reshape(-1, 2)
+
+    def test_deterministic(self):
+        extent, numvals = 1.5, 10
+        incr = extent / numvals
+        # Same loop as flam3_xform_preview, so the points match exactly.
+        xs = []
+        xx = -extent
+        while xx <= extent:
+            xs.append(xx)
+            xx += incr
+        x, y = (i.ravel() for i in numpy.meshgrid(xs, xs, indexing="ij"))
+        for name in DETERMINISTIC:
+            xform = make_xform(name)
+            expected = self.reference(xform, extent, numvals)[: len(x)]
+            a, b, c, d, e, f = flam3_coefs(xform)
+            with numpy.errstate(all="ignore"):
+                out = compose(xform)(a * x + b * y + c, d * x + e * y + f)
+            ok = numpy.isfinite(expected).all(axis=1) & (abs(expected) < 1e6).all(1)
+            numpy.testing.assert_allclose(
+                out[ok], expected[ok], rtol=1e-6, atol=1e-6, err_msg=name
+            )
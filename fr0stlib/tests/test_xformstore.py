@@ -0,0 +1,126 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+import numpy
+
+from fr0stlib import Flame, Xform, PostXform, XformStore
+
+
+def make_flame():
+    flame = Flame()
+    x1 = flame.add_xform(spherical=0.5, julian=0.25, julian_power=3.0)
+    x1.coefs = 0.5, 0.1, -0.2, 0.75, 1.0, -1.0
+    x2 = flame.add_xform(weight=3.0, color=1.0, animate=0.0)
+    x2.post.coefs = 1.0, 2.0, 3.0, 4.0, 5.0, 6.0
+    flame.add_final(swirl=1.0)
+    return Flame(flame.to_string())
+
+
+class TestXformStore(TestCase):
+    def setUp(self):
+        self.flame = make_flame()
+        self.string = self.flame.to_string()
+        self.store = XformStore(self.flame)
+
+    def tearDown(self):
+        self.store.detach()
+
+    def test_arrays(self):
+        store = self.store
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.coefs.shape, (3, 6))
+        self.assertEqual(list(store.final), [False, False, True])
+        self.assertEqual(list(store.coefs[0]), list(self.flame.xform[0].coefs))
+        self.assertEqual(list(store.post[1]), [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(list(store.weight), [1.0, 3.0, 0.0])
+
+    def test_views(self):
+        x = self.flame.xform[0]
+        self.assertEqual(x.spherical, 0.5)
+        self.assertEqual(x.julian_power, 3.0)
+        self.store.coefs[0, 0] = 7.0
+        self.assertEqual(x.a, 7.0)
+        x.linear = 0.25
+        x.post.c = 2.0
+        self.assertEqual(self.store.post[0, 4], 2.0)
+        self.assertEqual(x.linear, self.store.variations[0, 0])
+
+    def test_defaults(self):
+        x = self.flame.xform[1]
+        self.assertEqual(x.spherical, 0.0)
+        self.assertRaises(AttributeError, getattr, x, "julian_power")
+        del self.flame.xform[0].spherical
+        self.assertEqual(self.flame.xform[0].spherical, 0.0)
+        self.assertNotIn("spherical", self.flame.xform[0].list_variations())
+
+    def test_serialization(self):
+        self.assertEqual(self.flame.to_string(), self.string)
+        flame = Flame().from_bytes(self.flame.to_bytes())
+        self.assertEqual(flame.to_string(), self.string)
+
+    def test_detach(self):
+        self.store.variations[0, 0] = 0.5
+        self.store.detach()
+        for x in self.flame.iter_xforms():
+            self.assertIs(type(x), Xform)
+            self.assertIs(type(x.post), PostXform)
+            self.assertNotIn("_store", x.__dict__)
+        self.assertEqual(self.flame.xform[0].linear, 0.5)
+        self.assertEqual(self.flame.xform[0].__dict__["spherical"], 0.5)
+
+    def test_lazy_post(self):
+        x0, x1 = self.flame.xform
+        # Only the xform that had a post before gets it attached.
+        self.assertIs(x0._post, None)
+        self.assertEqual(list(self.store.post[0]), [1.0, 0.0, 0.0, 1.0, 0.0, 0.0])
+        self.store.post[0, 4] = 2.0
+        self.assertEqual(x0.post.c, 2.0)
+        x0.post.f = 3.0
+        self.assertEqual(self.store.post[0, 5], 3.0)
+        # Posts only changed through the array are created on detach.
+        self.store.post[2, 4] = 4.0
+        self.store.detach()
+        self.assertIs(type(x0.post), PostXform)
+        self.assertEqual((x0.post.c, x0.post.f), (2.0, 3.0))
+        self.assertEqual(self.flame.final.post.c, 4.0)
+
+    def test_rotate(self):
+        ref = Flame(self.string)
+        for x in ref.xform:
+            if x.animate:
+                x.rotate(30)
+        self.store.rotate(30, (self.store.animate != 0) & ~self.store.final)
+        for x, y in zip(self.flame.iter_xforms(), ref.iter_xforms()):
+            self.assertTrue(numpy.allclose(x.coefs, y.coefs))
+
+    def test_scale(self):
+        self.store.scale(2.0)
+        self.store.move_pos((1.0, -1.0), self.store.final)
+        self.assertEqual(self.flame.xform[0].a, 1.0)
+        self.assertEqual(self.flame.final.c, 1.0)
+        self.assertEqual(self.flame.final.f, -1.0)
+
+    def test_normalize_weights(self):
+        self.store.normalize_weights(2.0)
+        self.assertEqual([x.weight for x in self.flame.xform], [0.5, 1.5])
+        self.assertEqual(self.flame.final.weight, 0.0)
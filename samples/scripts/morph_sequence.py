@@ -1,19 +1,17 @@
-from fr0stlib.render import to_string
-from fr0stlib.pyflam3 import Genome, byref, flam3_interpolate
+from fr0stlib.pyflam3 import interpolate_sequence
 
 from utils import animation_preview
 
 
-def interpolate(flames):
-    s = "<flames>%s</flames>" % "".join(map(to_string, flames))
-    genomes, ngenomes = Genome.from_string(s)
-
-    target = Genome()
-    for i in range(int(flames[0].time), int(flames[-1].time + 1)):
-        flam3_interpolate(genomes, ngenomes, i, 0, byref(target))
-        flame = Flame(target.to_string())
-        flame.name = "morphed_%04d" % i
-        yield flame
+def interpolate(flames, parse=True):
+    """Yields the morphed flames, as Flame objects if parse is set, or
+    else as xml strings that can be saved without parsing them."""
+    times = range(int(flames[0].time), int(flames[-1].time + 1))
+    for i, frame in zip(times, interpolate_sequence(flames, times)):
+        genome = frame.genomes[0]
+        genome.name = b"morphed_%04d" % i
+        s = genome.to_string().decode()
+        yield Flame(s) if parse else s
 
 
 def getinput():
@@ -54,8 +52,8 @@ else:
 if len(set(f.time for f in flames)) != len(flames):
     raise ValueError("2 or more flames have the same time value.")
 
-flame_gen = interpolate(flames)
 if preview_only:
-    animation_preview(flame_gen)
+    animation_preview(interpolate(flames))
 else:
+    flame_gen = interpolate(flames, parse=False)
     save_flames("parameters/morph_sequence.flame", *tuple(flame_gen), confirm=False)
@@ -1,12 +1,15 @@
+from fr0stlib import XformStore
+
+
 def sheep_loop(flame, nframes):
     name = flame.name + " %03d"
     lst = []
-    for i in range(nframes):
-        for x in flame.xform:
-            if x.animate:
-                x.rotate(-360.0 / nframes)
-        flame.name = name % i
-        lst.append(flame.copy())
+    with XformStore(flame) as store:
+        animated = (store.animate != 0) & ~store.final
+        for i in range(nframes):
+            store.rotate(-360.0 / nframes, animated)
+            flame.name = name % i
+            lst.append(flame.copy())
     return lst
 
 